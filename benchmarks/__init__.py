@@ -0,0 +1,10 @@
+"""
+CGM Butler Benchmarks
+
+Scale benchmarks for the database layer, the pattern detectors and the
+dashboard endpoints on synthetic data. Results are written as JSON so runs
+can be compared:
+
+    python -m benchmarks.run --users 50 --days 30 --output results.json
+    python -m benchmarks.run --users 50 --days 30 --compare results.json
+"""
@@ -0,0 +1,119 @@
+"""
+Synthetic benchmark datasets.
+
+Builds a CGM Butler database with users x days of readings using the glucose
+curves of database.synthetic. Readings are bulk inserted before the schema
+bootstrap runs, so the rollups and episodes are back-filled in one scan
+instead of row by row through the triggers.
+"""
+
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, List, Sequence
+
+from database.connection_pool import close_all_pools
+from database.setup_database import create_tables
+from database.schema import ensure_schema
+from database.synthetic import PROFILES, generate_readings
+
+# Rows per executemany while loading
+LOAD_CHUNK_SIZE = 50000
+
+
+def user_ids(users: int) -> List[str]:
+    """Benchmark user identifiers."""
+    return [f'bench_{index:05d}' for index in range(users)]
+
+
+def build_database(
+    db_path: str,
+    users: int = 10,
+    days: int = 7,
+    profiles: Sequence[str] = ('default',),
+    gap_probability: float = 0.0,
+    seed: int = 42
+) -> Dict:
+    """
+    Create a fresh benchmark database ending at the current time.
+
+    Args:
+        db_path: Database file to create (an existing file is replaced)
+        users: Number of users
+        days: Days of readings per user
+        profiles: Glucose profiles assigned to users round-robin (see database.synthetic.PROFILES)
+        gap_probability: Probability of a sensor gap after each reading
+        seed: Random seed, so the same arguments produce the same readings
+
+    Returns:
+        Description of the dataset (users, days, readings, build time)
+    """
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        raise ValueError(f"unknown profiles: {', '.join(sorted(unknown))}")
+
+    close_all_pools()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    start = datetime.now().replace(microsecond=0) - timedelta(days=days)
+    created_at = datetime.now().isoformat()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        create_tables(conn.cursor())
+
+        ids = user_ids(users)
+        conn.executemany(
+            'INSERT INTO users (user_id, name, conditions, cgm_device_type, enrolled_at) VALUES (?, ?, ?, ?, ?)',
+            [
+                (user_id, f'Benchmark User {index}', profiles[index % len(profiles)], 'synthetic', created_at)
+                for index, user_id in enumerate(ids)
+            ]
+        )
+
+        readings = 0
+        for index, user_id in enumerate(ids):
+            rows = generate_readings(
+                user_id, start, days,
+                profile=profiles[index % len(profiles)],
+                gap_probability=gap_probability,
+                rng=rng
+            )
+            while True:
+                chunk = list(islice(rows, LOAD_CHUNK_SIZE))
+                if not chunk:
+                    break
+                conn.executemany(
+                    'INSERT INTO cgm_readings (user_id, timestamp, timestamp_epoch, glucose_value) VALUES (?, ?, ?, ?)',
+                    chunk
+                )
+                readings += len(chunk)
+        conn.commit()
+        loaded = time.perf_counter()
+
+        ensure_schema(conn)
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+
+    finished = time.perf_counter()
+    return {
+        'users': users,
+        'days': days,
+        'profiles': list(profiles),
+        'gap_probability': gap_probability,
+        'seed': seed,
+        'readings': readings,
+        'load_seconds': round(loaded - started, 3),
+        'schema_seconds': round(finished - loaded, 3),
+    }
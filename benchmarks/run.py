@@ -0,0 +1,398 @@
+"""
+Benchmark runner.
+
+Builds a synthetic dataset, times the database queries, the pattern detectors,
+the all-users pattern run and the dashboard endpoints, and writes the results
+as JSON. With --compare, median times are compared against an earlier results
+file.
+
+Usage:
+    python -m benchmarks.run --users 50 --days 30 --profiles default,type2 --output results.json
+    python -m benchmarks.run --users 50 --days 30 --compare results.json --fail-on-regression
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from database import CGMDatabase, close_all_pools
+from pattern_identification import CGMPatternIdentifier
+from pattern_identification import vectorized
+
+from .data import build_database, user_ids
+
+SCENARIO_GROUPS = ('database', 'patterns', 'sweep', 'dashboard')
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), 'cgm_butler_benchmark.db')
+
+# Users sampled by the per-user scenarios (calls cycle through them)
+SAMPLE_USERS = 10
+
+
+def measure(name: str, function: Callable[[int], object], repeat: int, warmup: int = 1, **params) -> Dict:
+    """
+    Time a scenario.
+
+    Args:
+        name: Scenario name
+        function: Called with the iteration number (warm-up iterations included)
+        repeat: Number of timed iterations
+        warmup: Untimed iterations run first
+        params: Scenario parameters, stored with the result
+
+    Returns:
+        Result dict with min/median/mean/p95/max in milliseconds
+    """
+    for iteration in range(warmup):
+        function(iteration)
+
+    timings = []
+    for iteration in range(warmup, warmup + repeat):
+        started = time.perf_counter()
+        function(iteration)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    result = {
+        'name': name,
+        'params': params,
+        'repeat': repeat,
+        'min_ms': round(timings[0], 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'mean_ms': round(statistics.mean(timings), 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 4),
+        'max_ms': round(timings[-1], 4),
+    }
+    print(f"  {name:<40} {json.dumps(params):<40} median {result['median_ms']:>10.3f} ms")
+    return result
+
+
+# ============================================================
+# Scenarios
+# ============================================================
+
+def database_scenarios(db_path: str, users: List[str], days: int, repeat: int) -> List[Dict]:
+    """CGMDatabase statistics, summaries and latest-reading queries."""
+    results = []
+    now = datetime.now()
+    today = now.date()
+
+    with CGMDatabase(db_path) as db:
+        def user(iteration: int) -> str:
+            return users[iteration % len(users)]
+
+        for window_days in sorted({1, 7, 30, days}):
+            if window_days > days:
+                continue
+            start_time = (now - timedelta(days=window_days)).isoformat()
+            end_time = now.isoformat()
+            results.append(measure(
+                'get_glucose_statistics',
+                lambda i: db.get_glucose_statistics(user(i), start_time, end_time),
+                repeat, window_days=window_days
+            ))
+            results.append(measure(
+                'get_window_statistics',
+                lambda i: db.get_window_statistics(user(i), start_time, end_time),
+                repeat, window_days=window_days
+            ))
+
+        start_time = (now - timedelta(days=min(days, 7))).isoformat()
+        results.append(measure(
+            'get_time_in_range',
+            lambda i: db.get_time_in_range(user(i), 70, 180, start_time, now.isoformat()),
+            repeat, window_days=min(days, 7), low=70, high=180
+        ))
+
+        yesterday = (today - timedelta(days=1)).isoformat()
+        results.append(measure(
+            'get_daily_summary',
+            lambda i: db.get_daily_summary(user(i), yesterday),
+            repeat
+        ))
+
+        first_day = (today - timedelta(days=days)).isoformat()
+        results.append(measure(
+            'get_daily_summaries',
+            lambda i: db.get_daily_summaries(user(i), first_day, today.isoformat()),
+            repeat, days=days
+        ))
+
+        results.append(measure(
+            'get_recent_readings',
+            lambda i: db.get_recent_readings(user(i), limit=20),
+            repeat, limit=20
+        ))
+
+        # Keyset pages: newest page, an empty delta poll, and a page halfway back in history
+        newest = {}
+        middle = {}
+        for sample_user in users:
+            page = db.get_cgm_readings_page(sample_user, limit=100)
+            newest[sample_user] = page['after']
+            count = db.conn.execute(
+                'SELECT COUNT(*) FROM cgm_readings WHERE user_id = ?', (sample_user,)
+            ).fetchone()[0]
+            for _ in range(count // 200):
+                page = db.get_cgm_readings_page(sample_user, before=page['before'], limit=100)
+            middle[sample_user] = page['before']
+
+        results.append(measure(
+            'get_cgm_readings_page',
+            lambda i: db.get_cgm_readings_page(user(i), limit=100),
+            repeat, mode='newest', limit=100
+        ))
+        results.append(measure(
+            'get_cgm_readings_page',
+            lambda i: db.get_cgm_readings_page(user(i), after=newest[user(i)], limit=100),
+            repeat, mode='delta', limit=100
+        ))
+        results.append(measure(
+            'get_cgm_readings_page',
+            lambda i: db.get_cgm_readings_page(user(i), before=middle[user(i)], limit=100),
+            repeat, mode='middle', limit=100
+        ))
+
+    return results
+
+
+def pattern_scenarios(db_path: str, users: List[str], repeat: int) -> List[Dict]:
+    """identify_patterns for one user per call, for each available engine."""
+    results = []
+    engines = ['python'] + (['numpy', 'grid'] if vectorized.is_available() else [])
+    for engine in engines:
+        identifier = CGMPatternIdentifier(db_path=db_path, engine=engine)
+
+        def run(iteration: int) -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                identifier.identify_patterns(users[iteration % len(users)])
+
+        results.append(measure('identify_patterns', run, repeat, engine=engine))
+    return results
+
+
+def sweep_scenarios(db_path: str, workers: int, repeat: int) -> List[Dict]:
+    """run_pattern_identification_for_all_users, sequential and in a process pool."""
+    results = []
+    engine = 'numpy' if vectorized.is_available() else 'python'
+    for worker_count in sorted({1, workers}):
+        identifier = CGMPatternIdentifier(db_path=db_path, engine=engine)
+
+        def run(iteration: int) -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                identifier.run_pattern_identification_for_all_users(workers=worker_count)
+
+        results.append(measure(
+            'run_pattern_identification_for_all_users', run,
+            repeat, warmup=0, engine=engine, workers=worker_count
+        ))
+    return results
+
+
+def dashboard_scenarios(db_path: str, users: List[str], repeat: int) -> List[Dict]:
+    """Dashboard JSON endpoints through the Flask test client."""
+    os.environ['CGM_DB_PATH'] = db_path
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            from dashboard.app import app
+    except ImportError as e:
+        print(f"  dashboard scenarios skipped: {e}")
+        return []
+
+    client = app.test_client()
+    endpoints = [
+        '/api/glucose/{user}',
+        '/api/recent/{user}/20',
+        '/api/stats/{user}',
+        '/api/daily-summary/{user}',
+        '/api/patterns/{user}',
+        '/api/episodes/{user}',
+        '/api/dashboard/{user}',
+    ]
+
+    results = []
+    for endpoint in endpoints:
+        def request(iteration: int, endpoint: str = endpoint) -> None:
+            response = client.get(endpoint.format(user=users[iteration % len(users)]))
+            if response.status_code != 200:
+                raise RuntimeError(f"{endpoint} returned {response.status_code}")
+
+        results.append(measure('dashboard', request, repeat, endpoint=endpoint))
+
+    # Polling revalidation: If-None-Match with the current ETag, answered with 304
+    for endpoint in endpoints:
+        etags = {}
+        for user in users:
+            etag = client.get(endpoint.format(user=user)).headers.get('ETag')
+            if etag is None:
+                break
+            etags[user] = etag
+        else:
+            def revalidate(iteration: int, endpoint: str = endpoint, etags: Dict = etags) -> None:
+                user = users[iteration % len(users)]
+                response = client.get(endpoint.format(user=user), headers={'If-None-Match': etags[user]})
+                if response.status_code != 304:
+                    raise RuntimeError(f"{endpoint} returned {response.status_code}")
+
+            results.append(measure('dashboard_revalidate', revalidate, repeat, endpoint=endpoint))
+    return results
+
+
+# ============================================================
+# Results
+# ============================================================
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict:
+    """Machine and library versions recorded with the results."""
+    numpy_version = None
+    if vectorized.is_available():
+        numpy_version = vectorized.np.__version__
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'numpy': numpy_version,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'git_revision': _git_revision(),
+    }
+
+
+def _result_key(result: Dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[Dict]:
+    """
+    Compare median times against a baseline run.
+
+    Args:
+        results: Results of this run
+        baseline: Results of the earlier run
+        threshold: Ratio (this run / baseline) above which a scenario counts as a regression
+
+    Returns:
+        Comparison rows; 'regression' is True for scenarios slower than the threshold
+    """
+    previous = {_result_key(result): result for result in baseline}
+    rows = []
+    print(f"\n{'scenario':<82} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for result in results:
+        key = _result_key(result)
+        old = previous.get(key)
+        if old is None or not old['median_ms']:
+            continue
+        ratio = result['median_ms'] / old['median_ms']
+        row = {
+            'scenario': key,
+            'baseline_ms': old['median_ms'],
+            'current_ms': result['median_ms'],
+            'ratio': round(ratio, 3),
+            'regression': ratio > threshold,
+        }
+        rows.append(row)
+        marker = '  <-- slower' if row['regression'] else ''
+        print(f"{key:<82} {old['median_ms']:>10.3f} {result['median_ms']:>10.3f} {ratio:>7.2f}{marker}")
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='CGM Butler scale benchmarks')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Benchmark database path (recreated)')
+    parser.add_argument('--users', type=int, default=10, help='Number of synthetic users')
+    parser.add_argument('--days', type=int, default=7, help='Days of readings per user')
+    parser.add_argument('--profiles', default='default',
+                        help='Comma-separated glucose profiles assigned round-robin (default, type2, hypo_prone, variable)')
+    parser.add_argument('--gap-probability', type=float, default=0.0,
+                        help='Probability of a sensor gap after each reading')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the dataset')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed iterations per scenario')
+    parser.add_argument('--sweep-repeat', type=int, default=1, help='Timed iterations of the all-users run')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes for the parallel all-users run')
+    parser.add_argument('--scenarios', default=','.join(SCENARIO_GROUPS),
+                        help=f"Comma-separated scenario groups ({', '.join(SCENARIO_GROUPS)})")
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier results JSON to compare median times against')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='Slowdown ratio reported as a regression when comparing')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Exit with status 1 if any scenario regressed')
+    args = parser.parse_args(argv)
+
+    groups = [group.strip() for group in args.scenarios.split(',') if group.strip()]
+    unknown = set(groups) - set(SCENARIO_GROUPS)
+    if unknown:
+        parser.error(f"unknown scenario groups: {', '.join(sorted(unknown))}")
+
+    print(f"Building dataset: {args.users} users x {args.days} days -> {args.db}")
+    dataset = build_database(
+        args.db,
+        users=args.users,
+        days=args.days,
+        profiles=[profile.strip() for profile in args.profiles.split(',')],
+        gap_probability=args.gap_probability,
+        seed=args.seed
+    )
+    print(f"  {dataset['readings']} readings, loaded in {dataset['load_seconds']}s, "
+          f"schema bootstrap {dataset['schema_seconds']}s\n")
+
+    sample = user_ids(args.users)[:SAMPLE_USERS]
+    results = []
+    if 'database' in groups:
+        results += database_scenarios(args.db, sample, args.days, args.repeat)
+    if 'patterns' in groups:
+        results += pattern_scenarios(args.db, sample, args.repeat)
+    if 'sweep' in groups:
+        results += sweep_scenarios(args.db, args.workers, args.sweep_repeat)
+    if 'dashboard' in groups:
+        results += dashboard_scenarios(args.db, sample, args.repeat)
+    close_all_pools()
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'environment': environment(),
+        'dataset': dataset,
+        'results': results,
+    }
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['comparison'] = compare(results, baseline['results'], args.threshold)
+        if args.fail_on_regression and any(row['regression'] for row in report['comparison']):
+            status = 1
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
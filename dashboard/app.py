@@ -6,15 +6,19 @@ CGM Butler Web Dashboard
 """
 
 from flask import Flask, render_template, jsonify, request
+from datetime import datetime, timedelta
 import sys
 import os
 from flask_cors import CORS
 
 # 添加父目录到路径以便导入模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import CGMDatabase
+from database import CGMDatabase, get_pool, get_hot_tail, get_prefix_cache
+from database import events
 from pattern_identification import CGMPatternIdentifier
 from digital_avatar.api import avatar_bp, init_avatar_api
+from dashboard.cache import ResponseCache, cached, conditional
+from dashboard.stream import StreamHub
 
 app = Flask(__name__)
 CORS(app)
@@ -29,6 +33,38 @@ DB_PATH = os.getenv(
     os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'cgm_butler.db'),
 )
 
+# 进程启动时创建共享连接池并完成一次性结构引导, 各路由复用池中的长连接
+get_pool(DB_PATH)
+
+# 轮询接口的响应缓存: 本进程写入读数/日志/模式/用户信息时按用户精确失效, 其他进程的写入由数据版本号发现
+response_cache = ResponseCache()
+events.subscribe(response_cache.on_change(DB_PATH))
+
+
+def data_versions(user_id):
+    """读取用户数据版本号 (条件请求据此计算 ETag; user_id 为 None 时读取全局数据的版本号)"""
+    with CGMDatabase(DB_PATH) as db:
+        return db.get_data_versions(user_id)
+
+
+def stats_payload(db, user_id):
+    """统计信息 (/api/stats 与推送通道的 stats 事件共用)"""
+    stats = db.get_glucose_statistics(user_id)
+    tir = db.get_time_in_range(user_id, 70, 140)
+    return {
+        'stats': stats,
+        'time_in_range': round(tir, 1)
+    }
+
+
+# 仪表板推送通道: 新读数后推送统计, 模式/用户信息变化时推送最新内容
+stream_hub = StreamHub(DB_PATH, snapshots={
+    'readings': ('stats', stats_payload),
+    'patterns': ('patterns', lambda db, user_id: db.get_user_patterns(user_id, limit=20) or []),
+    'user': ('user', lambda db, user_id: db.get_user(user_id)),
+})
+events.subscribe(stream_hub.on_change)
+
 
 @app.route('/')
 def index():
@@ -57,6 +93,8 @@ def get_all_users():
 
 
 @app.route('/api/user/<user_id>')
+@conditional(data_versions, depends_on=('user',))
+@cached(response_cache, depends_on=('user',), versions=data_versions)
 def get_user(user_id):
     """获取用户信息 API"""
     with CGMDatabase(DB_PATH) as db:
@@ -65,16 +103,12 @@ def get_user(user_id):
 
 
 @app.route('/api/stats/<user_id>')
+@conditional(data_versions, depends_on=('readings',))
+@cached(response_cache, depends_on=('readings',), versions=data_versions)
 def get_stats(user_id):
     """获取统计信息 API"""
     with CGMDatabase(DB_PATH) as db:
-        stats = db.get_glucose_statistics(user_id)
-        tir = db.get_time_in_range(user_id, 70, 140)
-        
-        return jsonify({
-            'stats': stats,
-            'time_in_range': round(tir, 1)
-        })
+        return jsonify(stats_payload(db, user_id))
 
 
 @app.route('/api/readings/<user_id>')
@@ -86,42 +120,94 @@ def get_readings(user_id):
         return jsonify(readings)
 
 
+@app.route('/api/readings/<user_id>/page')
+@conditional(data_versions, depends_on=('readings',))
+def get_readings_page(user_id):
+    """
+    键集分页读取 CGM 读数 (不使用 OFFSET)
+    Query: ?after=<cursor> 返回更新的读数 (从旧到新) | ?before=<cursor> 返回更早的读数 (从新到旧); &limit=100
+    不带游标时返回最新一页; 响应 {"readings": [...], "after": "...", "before": "...", "has_more": false},
+    增量同步时用返回的 after 发起下一次请求, 没有新读数时返回空列表 (或 304)
+    """
+    limit = request.args.get('limit', 100, type=int)
+    with CGMDatabase(DB_PATH) as db:
+        try:
+            page = db.get_cgm_readings_page(
+                user_id,
+                after=request.args.get('after'),
+                before=request.args.get('before'),
+                limit=limit
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(page)
+
+
+@app.route('/api/readings/batch', methods=['POST'])
+def ingest_readings_batch():
+    """
+    批量上传 CGM 读数 (设备一次请求同步全部数据)
+    Input: {"user_id": "user_001", "readings": [{"timestamp": "...", "glucose_value": 120}, ...],
+            "on_conflict": "ignore" | "update"}
+    """
+    payload = request.get_json(silent=True) or {}
+    user_id = payload.get('userId') or payload.get('user_id')
+    readings = payload.get('readings')
+    on_conflict = payload.get('onConflict') or payload.get('on_conflict') or 'ignore'
+
+    if not user_id:
+        return jsonify({'error': 'userId is required'}), 400
+    if not isinstance(readings, list):
+        return jsonify({'error': 'readings must be a list'}), 400
+    if on_conflict not in {'ignore', 'update'}:
+        return jsonify({'error': 'onConflict must be one of ignore, update'}), 400
+
+    with CGMDatabase(DB_PATH) as db:
+        result = db.add_cgm_readings_batch(readings, user_id=user_id, on_conflict=on_conflict)
+
+    result['user_id'] = user_id
+    return jsonify(result)
+
+
 @app.route('/api/recent/<user_id>/<int:limit>')
+@conditional(data_versions, depends_on=('readings',))
+@cached(response_cache, depends_on=('readings',), versions=data_versions)
 def get_recent_readings(user_id, limit):
     """获取指定数量的最近读数"""
     with CGMDatabase(DB_PATH) as db:
-        readings = db.get_cgm_readings(user_id, limit=limit)
+        readings = db.get_recent_readings(user_id, limit=limit)
         return jsonify(readings)
 
 
+def glucose_status(glucose):
+    """根据血糖值判断状态"""
+    if glucose < 70:
+        return 'Low'
+    elif glucose > 180:
+        return 'High'
+    elif glucose > 140:
+        return 'Elevated'
+    return 'Normal'
+
+
 @app.route('/api/glucose/<user_id>')
 def get_current_glucose(user_id):
     """获取用户最新的血糖值"""
     with CGMDatabase(DB_PATH) as db:
-        readings = db.get_cgm_readings(user_id, limit=1)
-        if readings and len(readings) > 0:
-            reading = readings[0]
+        reading = db.get_latest_reading(user_id)
+        if reading:
             glucose = reading['glucose_value']
-            
-            # 判断状态
-            status = 'Normal'
-            if glucose < 70:
-                status = 'Low'
-            elif glucose > 180:
-                status = 'High'
-            elif glucose > 140:
-                status = 'Elevated'
-            
             return jsonify({
                 'glucose': glucose,
                 'timestamp': reading['timestamp'],
-                'status': status
+                'status': glucose_status(glucose)
             })
         else:
             return jsonify({'error': 'No readings found', 'glucose': 0, 'status': 'Unknown'}), 404
 
 
 @app.route('/api/actions')
+@conditional(data_versions, depends_on=('pattern_actions',))
 def get_actions():
     """获取所有 Pattern-Action 建议"""
     with CGMDatabase(DB_PATH) as db:
@@ -130,6 +216,7 @@ def get_actions():
 
 
 @app.route('/api/actions/<category>')
+@conditional(data_versions, depends_on=('pattern_actions',))
 def get_actions_by_category(category):
     """获取指定类别的建议"""
     with CGMDatabase(DB_PATH) as db:
@@ -189,12 +276,69 @@ def create_activity_log():
 @app.route('/api/daily_summary/<user_id>/<date>')
 def get_daily_summary(user_id, date):
     """获取每日总结"""
+    try:
+        with CGMDatabase(DB_PATH) as db:
+            summary = db.get_daily_summary(user_id, date)
+    except ValueError:
+        return jsonify({'error': 'date must be in YYYY-MM-DD format'}), 400
+    return jsonify(summary)
+
+
+@app.route('/api/daily-summary/<user_id>')
+def get_daily_summaries(user_id):
+    """
+    获取日期范围内每天的总结 (日历/热力图)
+    Query: ?from=YYYY-MM-DD&to=YYYY-MM-DD, 默认最近 30 天
+    """
+    today = datetime.utcnow().date()
+    end_date = request.args.get('to') or today.isoformat()
+    start_date = request.args.get('from') or (today - timedelta(days=29)).isoformat()
+
+    try:
+        with CGMDatabase(DB_PATH) as db:
+            summaries = db.get_daily_summaries(user_id, start_date, end_date)
+    except ValueError:
+        return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format'}), 400
+
+    return jsonify({
+        'user_id': user_id,
+        'from': start_date,
+        'to': end_date,
+        'days': summaries
+    })
+
+
+@app.route('/api/episodes/<user_id>')
+def get_glucose_episodes(user_id):
+    """
+    获取最近的低血糖/高血糖事件及汇总 (例如 "昨晚 3 次低血糖, 共 40 分钟")
+    Query: ?hours=24
+    """
+    hours = request.args.get('hours', 24, type=int)
     with CGMDatabase(DB_PATH) as db:
-        summary = db.get_daily_summary(user_id, date)
-        return jsonify(summary)
+        return jsonify(db.get_episode_summary(user_id, hours=hours))
+
+
+@app.route('/api/alerts/<user_id>')
+def get_alerts(user_id):
+    """
+    获取最近的实时警报 (紧急低血糖 / 低血糖 / 预测低血糖 / 快速下降), 写入读数时即时生成
+    Query: ?hours=24&type=urgent_low&limit=100
+    """
+    hours = request.args.get('hours', 24, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    alert_type = request.args.get('type')
+    with CGMDatabase(DB_PATH) as db:
+        try:
+            alerts = db.get_alerts(user_id, hours=hours, alert_type=alert_type, limit=limit)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(alerts)
 
 
 @app.route('/api/patterns/<user_id>')
+@conditional(data_versions, depends_on=('patterns',))
+@cached(response_cache, depends_on=('patterns',), versions=data_versions)
 def get_user_patterns(user_id):
     """获取用户的识别模式 API"""
     with CGMDatabase(DB_PATH) as db:
@@ -218,6 +362,120 @@ def get_pattern_summary(user_id):
         return jsonify(summary)
 
 
+# 聚合接口可选的字段 -> 依赖的数据类型 (用于 ETag)
+DASHBOARD_FIELDS = {
+    'user': 'user',
+    'stats': 'readings',
+    'latest': 'readings',
+    'readings': 'readings',
+    'alerts': 'alerts',
+    'patterns': 'patterns',
+    'actions': 'pattern_actions',
+}
+DASHBOARD_MAX_READINGS = 2016  # 7 天
+
+# alerts 是滚动时间窗口: 旧警报移出窗口时 alerts 版本号不变, 另以窗口内的警报数作为版本
+DASHBOARD_ALERTS_WINDOW = 'alerts_window'
+
+
+def dashboard_fields():
+    """解析 ?fields=user,stats,...; 缺省时返回全部字段, 含未知字段时抛出 ValueError"""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(DASHBOARD_FIELDS)
+    fields = list(dict.fromkeys(field.strip() for field in raw.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in DASHBOARD_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"fields must be a comma-separated subset of {', '.join(DASHBOARD_FIELDS)}")
+    return fields
+
+
+def dashboard_versions(user_id):
+    """聚合接口的版本号: 用户数据 + 全局的 Pattern-Action 映射 (+ 请求 alerts 时窗口内的警报数)"""
+    with CGMDatabase(DB_PATH) as db:
+        versions = {**db.get_data_versions(None), **db.get_data_versions(user_id)}
+        if DASHBOARD_ALERTS_WINDOW in dashboard_depends_on():
+            alert_hours = request.args.get('alert_hours', 24, type=int)
+            versions[DASHBOARD_ALERTS_WINDOW] = db.count_alerts(user_id, hours=alert_hours)
+        return versions
+
+
+def dashboard_depends_on():
+    """聚合接口本次请求的字段依赖的数据类型 (ETag 与响应缓存共用)"""
+    try:
+        fields = dashboard_fields()
+    except ValueError:
+        return []
+    kinds = {DASHBOARD_FIELDS[field] for field in fields}
+    if 'alerts' in fields:
+        kinds.add(DASHBOARD_ALERTS_WINDOW)
+    return sorted(kinds)
+
+
+@app.route('/api/dashboard/<user_id>')
+@conditional(dashboard_versions, depends_on=dashboard_depends_on)
+@cached(response_cache, depends_on=dashboard_depends_on, versions=dashboard_versions)
+def get_dashboard(user_id):
+    """
+    仪表板聚合接口: 一次请求、一个数据库连接返回页面需要的全部数据
+    Query: ?fields=user,stats,latest,readings,alerts,patterns,actions&limit=288&alert_hours=24
+      fields: 需要的字段 (缺省为全部)
+      limit: readings 的读数条数 (从新到旧)
+      alert_hours: alerts 的时间范围 (小时)
+    """
+    try:
+        fields = dashboard_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = request.args.get('limit', 288, type=int)
+    alert_hours = request.args.get('alert_hours', 24, type=int)
+    if not 1 <= limit <= DASHBOARD_MAX_READINGS:
+        return jsonify({'error': f'limit must be between 1 and {DASHBOARD_MAX_READINGS}'}), 400
+
+    result = {'user_id': user_id}
+    with CGMDatabase(DB_PATH) as db:
+        if 'user' in fields:
+            result['user'] = db.get_user(user_id)
+            if result['user'] is None:
+                return jsonify({'error': 'User not found'}), 404
+        if 'stats' in fields:
+            result['stats'] = stats_payload(db, user_id)
+        if 'readings' in fields:
+            result['readings'] = db.get_recent_readings(user_id, limit=limit)
+        if 'latest' in fields:
+            # 最新读数直接取自 readings, 不再单独查询
+            recent = result['readings'] if 'readings' in fields else db.get_recent_readings(user_id, limit=1)
+            result['latest'] = recent[0] if recent else None
+        if 'alerts' in fields:
+            result['alerts'] = db.get_alerts(user_id, hours=alert_hours)
+        if 'patterns' in fields:
+            result['patterns'] = db.get_user_patterns(user_id, limit=20) or []
+        if 'actions' in fields:
+            result['actions'] = db.get_pattern_actions()
+    return jsonify(result)
+
+
+@app.route('/api/stream/<user_id>')
+def stream_user(user_id):
+    """
+    仪表板推送通道 (Server-Sent Events)
+    事件: ready (新连接), readings (新读数), stats, patterns, user, alerts (新警报), reload (需重新加载读数);
+    空闲时每 15 秒发送心跳注释, 断线重连时按 Last-Event-ID 补发
+    """
+    return stream_hub.response(user_id, request.headers.get('Last-Event-ID'))
+
+
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """响应缓存与进程内数据缓存的命中统计, 以及推送通道的连接数"""
+    return jsonify({
+        'responses': response_cache.stats(),
+        'hot_tail': get_hot_tail(DB_PATH).stats(),
+        'prefix_index': get_prefix_cache(DB_PATH).stats(),
+        'streams': stream_hub.stats(),
+    })
+
+
 # ============================================================
 # Tavus Tools API Endpoints
 # ============================================================
@@ -238,7 +496,7 @@ def tavus_get_current_glucose():
         return jsonify({"error": "user_id is required"}), 400
     
     with CGMDatabase(DB_PATH) as db:
-        latest = db.get_latest_glucose(user_id)
+        latest = db.get_latest_reading(user_id)
         
         if not latest:
             return jsonify({
@@ -248,14 +506,19 @@ def tavus_get_current_glucose():
         
         response = {
             "user_id": user_id,
-            "current_glucose": latest['glucose'],
+            "current_glucose": latest['glucose_value'],
             "timestamp": latest['timestamp'],
-            "status": latest['status']
+            "status": glucose_status(latest['glucose_value'])
         }
         
         if include_trend:
             # 获取最近的趋势
-            stats = db.get_glucose_statistics(user_id, hours=24)
+            end_time = datetime.now()
+            stats = db.get_glucose_statistics(
+                user_id,
+                start_time=(end_time - timedelta(hours=24)).isoformat(),
+                end_time=end_time.isoformat()
+            )
             response["trend"] = {
                 "avg_24h": stats.get('avg_glucose'),
                 "min_24h": stats.get('min_glucose'),
@@ -280,9 +543,12 @@ def tavus_get_glucose_statistics():
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     
+    end_time = datetime.now()
+    start_time = end_time - timedelta(hours=hours)
+    
     with CGMDatabase(DB_PATH) as db:
-        stats = db.get_glucose_statistics(user_id, hours=hours)
-        tir = db.calculate_time_in_range(user_id, hours=hours)
+        stats = db.get_window_statistics(user_id, start_time.isoformat(), end_time.isoformat())
+        tir = stats['time_in_range_70_140'] or 0.0
         
         return jsonify({
             "user_id": user_id,
@@ -0,0 +1,289 @@
+# cache.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 仪表板响应缓存
+按 (接口, 用户, 参数) 缓存 JSON 响应, TTL 过期 + 容量上限的 LRU 淘汰;
+订阅 database.events, 某个用户的数据变更时只丢弃依赖该类数据的条目。
+其他进程 (如独立运行的模式识别调度器) 的写入收不到事件: 条目记录计算前的数据版本号,
+命中时版本号已变化即视为失效。
+另提供基于用户数据版本号的 ETag / If-None-Match 条件请求, 数据未变时返回 304
+"""
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Mapping, Optional, Set, Tuple, Union
+
+from flask import Response, current_app, g, make_response, request
+
+from database.events import DataChange
+
+
+DEFAULT_MAX_ENTRIES = int(os.getenv('CGM_RESPONSE_CACHE_SIZE', '2048'))  # 最多缓存的响应数
+DEFAULT_TTL = float(os.getenv('CGM_RESPONSE_CACHE_TTL', '30'))           # 响应有效期 (秒)
+
+
+# 数据版本号: ((数据类型, 版本号), ...), 按 depends_on 的顺序
+Versions = Tuple[Tuple[str, int], ...]
+
+
+class _Entry:
+    __slots__ = ('body', 'mimetype', 'user_id', 'depends_on', 'versions', 'expires_at')
+
+    def __init__(self, body: bytes, mimetype: str, user_id: Optional[str],
+                 depends_on: Tuple[str, ...], versions: Optional[Versions], expires_at: float):
+        self.body = body
+        self.mimetype = mimetype
+        self.user_id = user_id
+        self.depends_on = depends_on
+        self.versions = versions
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """接口响应缓存; 缓存序列化后的响应体, 每次命中构造新的 Response"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最多缓存的响应数, 超出后淘汰最久未访问的条目
+            ttl: 响应有效期 (秒)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._user_keys: Dict[Optional[str], Set[Hashable]] = {}
+        # 每个用户的失效次数; 计算响应期间发生失效时不写入缓存, 避免缓存旧数据
+        self._generations: Dict[Optional[str], int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, versions: Optional[Versions] = None) -> Optional[_Entry]:
+        """
+        读取未过期的缓存条目; 未命中返回 None
+
+        Args:
+            key: 缓存键
+            versions: 依赖数据的当前版本号; 与条目记录的不同时条目已过时 (其他进程写入过)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic() or entry.versions != versions:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def generation(self, user_id: Optional[str]) -> int:
+        """用户缓存的失效次数, 在计算响应之前读取, 写入缓存时传回"""
+        return self._generations.get(user_id, 0)
+
+    def set(self, key: Hashable, body: bytes, mimetype: str,
+            user_id: Optional[str], depends_on: Iterable[str], generation: int,
+            versions: Optional[Versions] = None) -> None:
+        """
+        写入缓存条目
+
+        Args:
+            key: 缓存键
+            body: 响应体
+            mimetype: 响应类型
+            user_id: 响应所属用户 (与用户无关的接口为 None)
+            depends_on: 响应依赖的数据变更类型 (见 database.events.EVENT_KINDS)
+            generation: 计算响应前读取的 generation(user_id); 之后发生过失效则不写入
+            versions: 计算响应前读取的依赖数据版本号, get 时据此判断条目是否过时
+        """
+        entry = _Entry(body, mimetype, user_id, tuple(depends_on), versions, time.monotonic() + self.ttl)
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        keys = self._user_keys.get(entry.user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[entry.user_id]
+
+    def invalidate_user(self, user_id: Optional[str], kind: Optional[str] = None) -> int:
+        """
+        丢弃某个用户的缓存条目
+
+        Args:
+            user_id: 用户ID
+            kind: 数据变更类型; 给出时只丢弃依赖该类数据的条目
+
+        Returns:
+            丢弃的条目数
+        """
+        with self._lock:
+            keys = [
+                key for key in self._user_keys.get(user_id, ())
+                if kind is None or kind in self._entries[key].depends_on
+            ]
+            for key in keys:
+                self._remove(key)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self._generations.clear()
+
+    def on_change(self, db_path: str) -> Callable[[DataChange], None]:
+        """
+        生成 database.events 的订阅回调: 只处理指定数据库的变更
+
+        Args:
+            db_path: 仪表板使用的数据库文件路径
+        """
+        target = os.path.abspath(db_path)
+
+        def handle(event: DataChange) -> None:
+            if event.db_path == target:
+                self.invalidate_user(event.user_id, event.kind)
+
+        return handle
+
+    def stats(self) -> Dict:
+        """缓存命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'users': len(self._user_keys),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions,
+        }
+
+
+def _request_versions(versions: Callable[[Optional[str]], Mapping[str, int]],
+                      user_id: Optional[str]) -> Mapping[str, int]:
+    """本次请求内只读取一次版本号 (conditional 与 cached 叠加时共用)"""
+    memo = g.setdefault('_data_versions', {})
+    key = (versions, user_id)
+    if key not in memo:
+        memo[key] = versions(user_id)
+    return memo[key]
+
+
+def cached(cache: ResponseCache, depends_on: Union[Iterable[str], Callable[[], Iterable[str]]],
+           versions: Optional[Callable[[Optional[str]], Mapping[str, int]]] = None):
+    """
+    缓存 GET 接口响应的装饰器; 只缓存 200 响应
+
+    缓存键为 (接口名, 路径参数, 查询参数), 路径参数中的 user_id 决定条目所属用户
+
+    Args:
+        cache: 响应缓存
+        depends_on: 响应依赖的数据变更类型, 例如 ('readings',); 也可以是按当前请求返回数据类型的函数
+        versions: user_id -> {数据类型: 版本号} (同 conditional); 给出时条目记录计算前的版本号,
+                  其他进程写入后版本号变化, 条目不再命中 (否则只能等 TTL 过期)
+    """
+    if not callable(depends_on):
+        depends_on = tuple(depends_on)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+            )
+            user_id = kwargs.get('user_id')
+            kinds = tuple(depends_on()) if callable(depends_on) else depends_on
+            current = None
+            if versions is not None:
+                found = _request_versions(versions, user_id)
+                current = tuple((kind, found.get(kind, 0)) for kind in kinds)
+            entry = cache.get(key, current)
+            if entry is not None:
+                return current_app.response_class(entry.body, mimetype=entry.mimetype)
+
+            generation = cache.generation(user_id)
+            response: Response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache.set(key, response.get_data(), response.mimetype, user_id, kinds, generation, current)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _etag(key: Tuple, versions: Iterable[Tuple[str, int]]) -> str:
+    """由接口、参数和依赖数据的版本号计算 ETag (不含引号)"""
+    digest = hashlib.blake2s(repr((key, tuple(versions))).encode('utf-8'), digest_size=12)
+    return digest.hexdigest()
+
+
+def conditional(versions: Callable[[Optional[str]], Mapping[str, int]],
+                depends_on: Union[Iterable[str], Callable[[], Iterable[str]]]):
+    """
+    ETag / If-None-Match 条件请求装饰器; 放在 cached 之外
+
+    ETag 由 (接口名, 路径参数, 查询参数, 依赖数据的版本号) 计算, 只需读取版本号;
+    请求携带的 If-None-Match 与之相同时直接返回 304, 不执行接口的查询。
+    版本号在执行接口之前读取, 计算期间发生写入时响应体只会比 ETag 新, 下次请求会重新返回 200
+
+    Args:
+        versions: user_id -> {数据类型: 版本号}; 与用户无关的接口传入 None
+        depends_on: 响应依赖的数据类型 (见 database.versions.DATA_KINDS), 例如 ('readings',);
+                    也可以是按当前请求 (例如 ?fields=) 返回数据类型的函数
+    """
+    if not callable(depends_on):
+        depends_on = tuple(depends_on)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            current = _request_versions(versions, kwargs.get('user_id'))
+            key = (
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.args.items(multi=True))),
+            )
+            kinds = depends_on() if callable(depends_on) else depends_on
+            etag = _etag(key, ((kind, current.get(kind, 0)) for kind in kinds))
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # 浏览器每次轮询都带 If-None-Match 重新验证, 不直接使用本地副本
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        return wrapper
+
+    return decorator
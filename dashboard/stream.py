@@ -0,0 +1,252 @@
+# stream.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 仪表板推送通道 (Server-Sent Events)
+每个打开的仪表板保持一条 /api/stream/<user_id> 长连接, 只在数据变化时推送:
+新读数、更新后的统计、模式识别结果、用户信息和新警报。
+本进程的写入通过 database.events 即时唤醒对应用户的连接; 其他进程 (调度器、导入脚本)
+的写入由定期比较数据版本号 (database.versions) 发现。
+每个推送事件带 id (已推送的最大读数/警报 id), 断线重连时浏览器回传 Last-Event-ID, 从断点继续推送
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from flask import Response
+
+from database import CGMDatabase
+from database.events import DataChange
+
+
+DEFAULT_POLL_SECONDS = float(os.getenv('CGM_STREAM_POLL_SECONDS', '5'))             # 检查其他进程写入的间隔 (秒)
+DEFAULT_HEARTBEAT_SECONDS = float(os.getenv('CGM_STREAM_HEARTBEAT_SECONDS', '15'))  # 无推送时发送心跳的间隔 (秒)
+DEFAULT_RETRY_MS = int(os.getenv('CGM_STREAM_RETRY_MS', '3000'))                    # 浏览器断线后重连的等待 (毫秒)
+
+# 一次推送的最多新读数 (24 小时); 超过时改为通知前端重新加载
+MAX_READINGS_PER_EVENT = 288
+
+# 快照型数据: 数据类型 -> (事件名, loader(db, user_id)), 版本号变化时推送完整的最新内容
+Snapshot = Tuple[str, Callable[[CGMDatabase, str], object]]
+
+
+def format_event(data: object = None, event: Optional[str] = None, event_id: Optional[str] = None,
+                 retry: Optional[int] = None, comment: Optional[str] = None) -> str:
+    """
+    序列化一条 SSE 消息
+
+    Args:
+        data: 事件数据 (序列化为单行 JSON)
+        event: 事件名, 缺省时为浏览器的 message 事件
+        event_id: 事件 id, 浏览器重连时作为 Last-Event-ID 回传
+        retry: 断线重连等待 (毫秒)
+        comment: 注释行 (浏览器忽略, 用作心跳)
+    """
+    lines = []
+    if comment is not None:
+        lines.append(f': {comment}')
+    if retry is not None:
+        lines.append(f'retry: {retry}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    if data is not None:
+        lines.append(f'data: {json.dumps(data, ensure_ascii=False, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class StreamCursor(NamedTuple):
+    """连接已推送到的位置: 最大读数 id 和最大警报 id"""
+    reading_id: int
+    alert_id: int
+
+    def encode(self) -> str:
+        return f'{self.reading_id}-{self.alert_id}'
+
+    @classmethod
+    def decode(cls, value: Optional[str]) -> Optional['StreamCursor']:
+        """解析 Last-Event-ID; 缺失或格式不对时返回 None (按新连接处理)"""
+        try:
+            reading_id, alert_id = (int(part) for part in (value or '').split('-'))
+        except ValueError:
+            return None
+        return cls(reading_id, alert_id)
+
+
+class StreamHub:
+    """管理本进程内的推送连接; 每个连接一个 threading.Event, 数据变更时唤醒该用户的连接"""
+
+    def __init__(self, db_path: str, snapshots: Mapping[str, Snapshot],
+                 poll_seconds: float = DEFAULT_POLL_SECONDS,
+                 heartbeat_seconds: float = DEFAULT_HEARTBEAT_SECONDS,
+                 retry_ms: int = DEFAULT_RETRY_MS):
+        """
+        初始化推送通道
+
+        Args:
+            db_path: 数据库文件路径
+            snapshots: 快照型数据, 例如 {'readings': ('stats', load_stats)};
+                       readings 的快照在新读数之后推送
+            poll_seconds: 检查其他进程写入 (数据版本号) 的间隔
+            heartbeat_seconds: 无推送时发送心跳的间隔, 也决定发现客户端断开的延迟
+            retry_ms: 告知浏览器的重连等待
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.snapshots = dict(snapshots)
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.retry_ms = retry_ms
+        # 版本号变化时需要推送的数据类型
+        self._kinds = tuple(dict.fromkeys(('readings', 'alerts', *self.snapshots)))
+        self._clients: Dict[str, Set[threading.Event]] = {}
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.events_sent = 0
+
+    def on_change(self, event: DataChange) -> None:
+        """database.events 订阅回调: 唤醒该用户的连接 (写入已提交, 版本号已更新)"""
+        if event.db_path != self.db_path:
+            return
+        with self._lock:
+            wakers = list(self._clients.get(event.user_id, ()))
+        for wake in wakers:
+            wake.set()
+
+    def _register(self, user_id: str) -> threading.Event:
+        wake = threading.Event()
+        with self._lock:
+            self._clients.setdefault(user_id, set()).add(wake)
+            self.connections += 1
+        return wake
+
+    def _unregister(self, user_id: str, wake: threading.Event) -> None:
+        with self._lock:
+            wakers = self._clients.get(user_id)
+            if wakers is not None:
+                wakers.discard(wake)
+                if not wakers:
+                    del self._clients[user_id]
+
+    def response(self, user_id: str, last_event_id: Optional[str] = None) -> Response:
+        """SSE 响应; 每条连接占用一个工作线程直到客户端断开"""
+        return Response(
+            self.stream(user_id, last_event_id),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    def stream(self, user_id: str, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """
+        生成一条连接的 SSE 消息
+
+        新连接 (无 Last-Event-ID) 先发送 ready 事件记下当前位置, 前端收到后再加载完整数据;
+        重连时推送断线期间的新读数、新警报和全部快照
+
+        Args:
+            user_id: 用户ID
+            last_event_id: 浏览器回传的 Last-Event-ID
+        """
+        wake = self._register(user_id)
+        try:
+            yield format_event(retry=self.retry_ms, comment='connected')
+            cursor = StreamCursor.decode(last_event_id)
+            with CGMDatabase(self.db_path) as db:
+                if cursor is None:
+                    # 先取位置再取版本号: 两者之间的写入前端会在收到 ready 后加载到
+                    cursor = self._latest_cursor(db)
+                    messages = [format_event({'user_id': user_id}, event='ready', event_id=cursor.encode())]
+                    versions = db.get_data_versions(user_id)
+                else:
+                    versions = db.get_data_versions(user_id)
+                    cursor, messages = self._collect(db, user_id, cursor, self._kinds, resumed=True)
+
+            last_sent = time.monotonic()
+            while True:
+                for message in messages:
+                    yield message
+                    self.events_sent += 1
+                    last_sent = time.monotonic()
+                if not messages and time.monotonic() - last_sent >= self.heartbeat_seconds:
+                    yield format_event(comment='heartbeat')
+                    last_sent = time.monotonic()
+
+                # 被本进程的写入唤醒, 或到期检查其他进程的写入
+                wake.wait(min(self.poll_seconds, self.heartbeat_seconds))
+                wake.clear()
+                with CGMDatabase(self.db_path) as db:
+                    current = db.get_data_versions(user_id)
+                    changed = [kind for kind in self._kinds if current.get(kind, 0) != versions.get(kind, 0)]
+                    versions = current
+                    messages = []
+                    if changed:
+                        cursor, messages = self._collect(db, user_id, cursor, changed)
+        finally:
+            self._unregister(user_id, wake)
+
+    @staticmethod
+    def _latest_cursor(db: CGMDatabase) -> StreamCursor:
+        """全表最大读数/警报 id: 此后该用户的新数据 id 一定更大"""
+        reading_id = db.conn.execute('SELECT MAX(id) FROM cgm_readings').fetchone()[0]
+        alert_id = db.conn.execute('SELECT MAX(id) FROM alerts').fetchone()[0]
+        return StreamCursor(reading_id or 0, alert_id or 0)
+
+    def _collect(self, db: CGMDatabase, user_id: str, cursor: StreamCursor,
+                 kinds: Iterable[str], resumed: bool = False) -> Tuple[StreamCursor, List[str]]:
+        """
+        读取变化的数据并生成 SSE 消息
+
+        Args:
+            db: 数据库
+            user_id: 用户ID
+            cursor: 已推送到的位置
+            kinds: 需要推送的数据类型
+            resumed: 断线重连后的补发; 此时没有新读数不代表有读数被修改
+
+        Returns:
+            (新的位置, 消息列表)
+        """
+        events = []
+        if 'readings' in kinds:
+            readings = db.get_readings_after_id(user_id, cursor.reading_id, MAX_READINGS_PER_EVENT + 1)
+            if readings:
+                cursor = cursor._replace(reading_id=readings[-1]['id'])
+            if len(readings) > MAX_READINGS_PER_EVENT:
+                # 大批补传: 游标移到最新, 由前端重新加载
+                cursor = cursor._replace(reading_id=self._latest_cursor(db).reading_id)
+                events.append(('reload', {'kind': 'readings'}))
+            elif readings:
+                readings.sort(key=lambda reading: reading['timestamp_epoch'])
+                events.append(('readings', {'readings': readings}))
+            elif not resumed:
+                # 版本号变了但没有新行: 已有读数被覆盖 (on_conflict='update')
+                events.append(('reload', {'kind': 'readings'}))
+
+        if 'alerts' in kinds:
+            alerts = db.get_alerts(user_id, after_id=cursor.alert_id)
+            if alerts:
+                cursor = cursor._replace(alert_id=max(alert['id'] for alert in alerts))
+                events.append(('alerts', {'alerts': alerts}))
+
+        for kind in kinds:
+            if kind in self.snapshots:
+                event, loader = self.snapshots[kind]
+                events.append((event, loader(db, user_id)))
+
+        event_id = cursor.encode()
+        return cursor, [format_event(data, event=event, event_id=event_id) for event, data in events]
+
+    def stats(self) -> Dict:
+        """连接统计"""
+        with self._lock:
+            open_connections = sum(len(wakers) for wakers in self._clients.values())
+            users = len(self._clients)
+        return {
+            'open_connections': open_connections,
+            'users': users,
+            'total_connections': self.connections,
+            'events_sent': self.events_sent,
+            'poll_seconds': self.poll_seconds,
+            'heartbeat_seconds': self.heartbeat_seconds,
+        }
@@ -6,7 +6,11 @@ CGM Butler 数据库模块
 """
 
 from .cgm_database import CGMDatabase
+from .connection_pool import ConnectionPool, PoolExhaustedError, get_pool, close_all_pools
+from .hot_tail import HotTailCache, get_hot_tail
+from .prefix_index import PrefixIndexCache, get_prefix_cache
 
-__all__ = ['CGMDatabase']
+__all__ = ['CGMDatabase', 'ConnectionPool', 'PoolExhaustedError', 'get_pool', 'close_all_pools', 'HotTailCache', 'get_hot_tail',
+           'PrefixIndexCache', 'get_prefix_cache']
 __version__ = '1.0.0'
 
@@ -0,0 +1,292 @@
+# alerts.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 实时血糖警报
+写入读数时在同一事务内逐条评估, 每个用户只需 O(1) 状态 (最近 15 分钟的读数、当前低血糖事件、
+各类警报上次触发时间), 发现紧急低血糖、低血糖、预测低血糖和快速下降时写入 alerts 表;
+同类警报在抑制窗口内不重复触发。夜间 (0-6 点) 的警报带 nocturnal 标记。
+状态每次评估时从数据库重建 (几次索引范围查询), 多个写入进程看到的是同一份读数和警报
+"""
+import calendar
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .episodes import MAX_EPISODE_GAP_SECONDS
+
+
+LOW_THRESHOLD = 70              # 低于该值为低血糖 (mg/dL)
+URGENT_LOW_THRESHOLD = 54       # 低于该值为紧急低血糖 (mg/dL)
+RAPID_FALL_RATE = -3.0          # 下降速率不低于 3 mg/dL/min 为快速下降
+PREDICTION_MINUTES = 20         # 按当前速率外推的时长 (分钟), 外推值低于 LOW_THRESHOLD 时预测低血糖
+
+RATE_WINDOW_SECONDS = 900       # 变化速率取最近 15 分钟内首末两条读数
+MIN_RATE_SPAN_SECONDS = 600     # 首末读数至少相隔 10 分钟才计算速率, 避免单点噪声
+NOCTURNAL_HOURS = range(0, 6)   # 夜间时段 (与夜间低血糖模式一致)
+
+MAX_ALERT_AGE_SECONDS = int(os.getenv('CGM_ALERT_MAX_AGE_MINUTES', '60')) * 60    # 只为该时长内的读数触发警报, 补传的历史数据不报警
+
+# 警报类型 -> 严重程度 / 抑制窗口 (分钟)
+ALERT_TYPES = {
+    'urgent_low': {'severity': 'high', 'suppress_minutes': 15},
+    'low': {'severity': 'medium', 'suppress_minutes': 30},
+    'predicted_low': {'severity': 'medium', 'suppress_minutes': 30},
+    'rapid_fall': {'severity': 'low', 'suppress_minutes': 30},
+}
+
+# 更严重的警报在抑制窗口内同样抑制这些警报 (已报紧急低血糖后不再报低血糖/预测低血糖)
+SUPPRESSED_BY = {
+    'low': ('urgent_low',),
+    'predicted_low': ('urgent_low', 'low'),
+}
+
+ALERT_COLUMNS = (
+    'user_id', 'alert_type', 'severity', 'reading_epoch', 'glucose_value',
+    'rate_per_minute', 'predicted_glucose', 'nocturnal', 'message', 'created_at'
+)
+
+
+def alert_cutoff_epoch() -> int:
+    """
+    可触发警报的最早读数时间
+    读数时间统一按 UTC 存储, 但无时区的时间戳来自设备本地时间;
+    取本地时间与 UTC 两种约定下较早的 "现在", 避免时区差导致实时读数被当作历史数据
+    """
+    local_now = calendar.timegm(datetime.now().timetuple())
+    return min(local_now, int(time.time())) - MAX_ALERT_AGE_SECONDS
+
+
+class _UserState:
+    """单个用户的评估状态"""
+
+    __slots__ = ('recent', 'low_since', 'nadir', 'last_alerts')
+
+    def __init__(self):
+        # 最近 RATE_WINDOW_SECONDS 内的 (timestamp_epoch, glucose); 1 分钟间隔的设备最多 16 条
+        self.recent: deque = deque(maxlen=RATE_WINDOW_SECONDS // 60 + 1)
+        self.low_since: Optional[int] = None    # 当前低血糖事件开始时间
+        self.nadir: Optional[int] = None        # 当前低血糖事件最低值
+        self.last_alerts: Dict[str, int] = {}   # 警报类型 -> 上次触发的读数时间
+
+    def last_epoch(self) -> Optional[int]:
+        return self.recent[-1][0] if self.recent else None
+
+    def push(self, epoch: int, glucose: int) -> None:
+        if self.recent and epoch - self.recent[-1][0] > MAX_EPISODE_GAP_SECONDS:
+            # 传感器断连, 低血糖事件中断 (与 glucose_episodes 一致)
+            self.low_since = self.nadir = None
+        self.recent.append((epoch, glucose))
+        while self.recent[0][0] < epoch - RATE_WINDOW_SECONDS:
+            self.recent.popleft()
+        if glucose < LOW_THRESHOLD:
+            if self.low_since is None:
+                self.low_since, self.nadir = epoch, glucose
+            else:
+                self.nadir = min(self.nadir, glucose)
+        else:
+            self.low_since = self.nadir = None
+
+    def rate(self) -> Optional[float]:
+        """最近 15 分钟的血糖变化速率 (mg/dL/min); 数据不足时返回 None"""
+        (first_epoch, first_glucose), (last_epoch, last_glucose) = self.recent[0], self.recent[-1]
+        span = last_epoch - first_epoch
+        if span < MIN_RATE_SPAN_SECONDS:
+            return None
+        return (last_glucose - first_glucose) * 60.0 / span
+
+    def suppressed(self, alert_type: str, epoch: int) -> bool:
+        window = ALERT_TYPES[alert_type]['suppress_minutes'] * 60
+        for blocking in (alert_type,) + SUPPRESSED_BY.get(alert_type, ()):
+            last = self.last_alerts.get(blocking)
+            if last is not None and epoch - last < window:
+                return True
+        return False
+
+
+def _alert_message(alert_type: str, glucose: int, rate: Optional[float],
+                   predicted: Optional[int], state: _UserState, epoch: int, nocturnal: bool) -> str:
+    if alert_type == 'urgent_low':
+        message = f'urgent low: {glucose} mg/dL'
+    elif alert_type == 'low':
+        minutes = (epoch - state.low_since) // 60
+        detail = f' (low for {minutes} min, lowest {state.nadir} mg/dL)' if minutes else ''
+        message = f'low glucose: {glucose} mg/dL{detail}'
+    elif alert_type == 'predicted_low':
+        message = (f'predicted low: {glucose} mg/dL falling {abs(rate):.1f} mg/dL/min, '
+                   f'expected {predicted} mg/dL in {PREDICTION_MINUTES} min')
+    else:
+        message = f'rapid fall: {abs(rate):.1f} mg/dL/min, now {glucose} mg/dL'
+    return f'Overnight {message}' if nocturnal else message[0].upper() + message[1:]
+
+
+class AlertEngine:
+    """
+    按用户的流式警报评估; 不在进程内保留状态, 每次评估从数据库最近的读数和警报重建,
+    其他进程写入的读数和触发的警报同样参与计算速率和抑制
+    """
+
+    def _load_state(self, conn: sqlite3.Connection, user_id: str, epoch: int) -> _UserState:
+        """
+        从数据库恢复 epoch 之前的读数状态 (最近 15 分钟的读数、当前低血糖事件),
+        以及抑制窗口内 (含 epoch 之后, 由其他进程或之前的写入触发) 的警报
+        """
+        state = _UserState()
+        rows = conn.execute(
+            """
+            SELECT timestamp_epoch, glucose_value FROM cgm_readings
+            WHERE user_id = ? AND timestamp_epoch >= ? AND timestamp_epoch < ?
+            ORDER BY timestamp_epoch
+            """,
+            (user_id, epoch - RATE_WINDOW_SECONDS, epoch)
+        )
+        for reading_epoch, glucose in rows:
+            state.push(reading_epoch, glucose)
+
+        # 低血糖事件可能早于读数窗口开始, 从事件表取开始时间和最低值
+        if state.low_since is not None:
+            episode = conn.execute(
+                """
+                SELECT start_epoch, extreme_glucose FROM glucose_episodes
+                WHERE user_id = ? AND episode_type = 'hypo' AND start_epoch <= ? AND end_epoch >= ?
+                ORDER BY start_epoch DESC LIMIT 1
+                """,
+                (user_id, state.low_since, state.last_epoch())
+            ).fetchone()
+            if episode:
+                state.low_since = episode[0]
+                state.nadir = min(state.nadir, episode[1])
+
+        longest = max(settings['suppress_minutes'] for settings in ALERT_TYPES.values()) * 60
+        state.last_alerts = dict(conn.execute(
+            """
+            SELECT alert_type, MAX(reading_epoch) FROM alerts
+            WHERE user_id = ? AND reading_epoch >= ?
+            GROUP BY alert_type
+            """,
+            (user_id, epoch - longest)
+        ).fetchall())
+        return state
+
+    def evaluate(
+        self,
+        conn: sqlite3.Connection,
+        user_id: str,
+        readings: Iterable[Tuple[int, int]],
+        cutoff_epoch: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        评估一个用户新写入的读数, 触发的警报写入 alerts 表 (在写入读数的同一事务内调用, 由调用方提交)
+
+        状态从数据库重建: 先恢复第一条新读数之前的状态, 再按时间重放数据库中此后的全部读数
+        (已包含本次写入的读数); 早于其他写入方已写入的读数的新读数 (乱序补传) 只计入状态不报警
+
+        Args:
+            conn: 数据库连接
+            user_id: 用户ID
+            readings: (timestamp_epoch, glucose_value), 按时间升序
+            cutoff_epoch: 早于该时间的读数不报警 (也无需评估), 默认见 alert_cutoff_epoch
+
+        Returns:
+            触发的警报列表
+        """
+        if cutoff_epoch is None:
+            cutoff_epoch = alert_cutoff_epoch()
+        new_epochs = {epoch for epoch, _ in readings if epoch >= cutoff_epoch}
+        if not new_epochs:
+            return []
+
+        first_epoch = min(new_epochs)
+        state = self._load_state(conn, user_id, first_epoch)
+        rows = conn.execute(
+            """
+            SELECT timestamp_epoch, glucose_value FROM cgm_readings
+            WHERE user_id = ? AND timestamp_epoch >= ?
+            ORDER BY timestamp_epoch
+            """,
+            (user_id, first_epoch)
+        ).fetchall()
+        # 其他写入方已写入的最新读数; 不晚于它的新读数是乱序补传
+        latest_existing = max((epoch for epoch, _ in rows if epoch not in new_epochs), default=None)
+
+        raised = []
+        for epoch, glucose in rows:
+            state.push(epoch, glucose)
+            if epoch in new_epochs and (latest_existing is None or epoch > latest_existing):
+                raised.extend(self._check(state, user_id, epoch, glucose))
+
+        if raised:
+            conn.executemany(
+                f"""
+                INSERT INTO alerts ({', '.join(ALERT_COLUMNS)})
+                VALUES ({', '.join('?' for _ in ALERT_COLUMNS)})
+                ON CONFLICT (user_id, alert_type, reading_epoch) DO NOTHING
+                """,
+                [tuple(alert[column] for column in ALERT_COLUMNS) for alert in raised]
+            )
+        return raised
+
+    @staticmethod
+    def _check(state: _UserState, user_id: str, epoch: int, glucose: int) -> List[Dict]:
+        """按最新读数判断应触发的警报 (已计入状态)"""
+        rate = state.rate()
+        predicted = round(glucose + rate * PREDICTION_MINUTES) if rate is not None else None
+
+        candidates = []
+        if glucose < URGENT_LOW_THRESHOLD:
+            candidates.append('urgent_low')
+        elif glucose < LOW_THRESHOLD:
+            candidates.append('low')
+        elif rate is not None and rate < 0 and predicted < LOW_THRESHOLD:
+            candidates.append('predicted_low')
+        if rate is not None and rate <= RAPID_FALL_RATE:
+            candidates.append('rapid_fall')
+
+        nocturnal = time.gmtime(epoch).tm_hour in NOCTURNAL_HOURS
+        alerts = []
+        for alert_type in candidates:
+            if state.suppressed(alert_type, epoch):
+                continue
+            state.last_alerts[alert_type] = epoch
+            alerts.append({
+                'user_id': user_id,
+                'alert_type': alert_type,
+                'severity': ALERT_TYPES[alert_type]['severity'],
+                'reading_epoch': epoch,
+                'glucose_value': glucose,
+                'rate_per_minute': round(rate, 2) if rate is not None else None,
+                'predicted_glucose': predicted,
+                'nocturnal': int(nocturnal),
+                'message': _alert_message(alert_type, glucose, rate, predicted, state, epoch, nocturnal),
+                'created_at': int(time.time()),
+            })
+        return alerts
+
+
+# ============================================================
+# 进程级引擎注册表
+# ============================================================
+
+_engines: Dict[str, AlertEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_alert_engine(db_path: str) -> AlertEngine:
+    """
+    获取数据库文件对应的进程级警报引擎
+
+    Args:
+        db_path: 数据库文件路径
+
+    Returns:
+        引擎实例
+    """
+    key = os.path.abspath(db_path)
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.setdefault(key, AlertEngine())
+    return engine
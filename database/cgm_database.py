@@ -5,11 +5,26 @@ CGM Butler 数据库工具类
 提供便捷的数据库操作接口
 """
 import sqlite3
+import base64
+import calendar
+import math
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Optional, Tuple
+from itertools import islice
+from typing import Any, Iterable, List, Dict, Optional, Tuple
 import sys
 import io
 import os
+import time
+
+from .alerts import ALERT_TYPES, alert_cutoff_epoch, get_alert_engine
+from .connection_pool import get_pool
+from .derived import catch_up_derived_tables, derived_tables_lag
+from .events import publish
+from .episodes import episode_duration_minutes, refresh_episodes, summarize_episodes
+from .hot_tail import READING_COLUMNS, get_hot_tail
+from .prefix_index import PREFIX_SUM_COLUMNS, get_prefix_cache, refresh_prefix_index, window_totals
+from .schema import ROLLUP_SUM_COLUMNS, severity_level_sql, severity_rank_sql
+from .versions import bump_data_versions, get_data_versions
 
 # 设置 Windows 控制台输出编码
 if sys.platform == 'win32':
@@ -18,6 +33,81 @@ if sys.platform == 'win32':
 
 DEFAULT_DB_PATH = os.getenv('CGM_DB_PATH', 'cgm_butler.db')
 
+# 批量写入时每次 executemany 的行数
+INGEST_CHUNK_SIZE = 1000
+
+# 可信的血糖读数范围 (mg/dL), 超出范围的读数在批量写入时被拒绝
+VALID_GLUCOSE_RANGE = (20, 600)
+
+# 写入读数时 (user_id, timestamp_epoch) 冲突的处理方式
+#   ignore: 保留已有读数, 重复同步是无操作
+#   update: 用新值覆盖已有读数 (设备校准后重新导出)
+CONFLICT_CLAUSES = {
+    'ignore': 'DO NOTHING',
+    'update': 'DO UPDATE SET glucose_value = excluded.glucose_value '
+              'WHERE glucose_value != excluded.glucose_value',
+}
+
+# 键集分页的默认/最大每页读数
+READINGS_PAGE_SIZE = 100
+MAX_READINGS_PAGE_SIZE = 1000
+
+# 汇总表中预计算的 Time In Range 区间 -> 计数列
+ROLLUP_RANGE_COLUMNS = {
+    (70, 140): 'in_70_140',
+    (70, 180): 'in_70_180',
+}
+
+
+def normalise_reading_timestamp(timestamp: Any) -> str:
+    """
+    将读数时间统一为存储格式: 不带时区的 ISO 8601 字符串
+    带时区的时间先转换为 UTC 再去掉时区
+    """
+    if isinstance(timestamp, datetime):
+        dt = timestamp
+    elif isinstance(timestamp, str) and timestamp:
+        dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    else:
+        raise ValueError("timestamp is required")
+
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+def timestamp_to_epoch(timestamp: Any) -> int:
+    """
+    将时间转换为 timestamp_epoch 列使用的整数秒
+    (不带时区的时间按 UTC 解释, 与 SQLite strftime('%s') 一致)
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(normalise_reading_timestamp(timestamp))
+    elif isinstance(timestamp, datetime) and timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return calendar.timegm(timestamp.timetuple())
+
+
+def epoch_to_timestamp(epoch: int) -> str:
+    """timestamp_to_epoch 的逆转换, 返回不带时区的 ISO 8601 字符串 (UTC)"""
+    return (datetime(1970, 1, 1) + timedelta(seconds=epoch)).isoformat()
+
+
+def encode_reading_cursor(timestamp_epoch: int, reading_id: int) -> str:
+    """将读数位置 (timestamp_epoch, id) 编码为不透明的分页游标"""
+    raw = f'{timestamp_epoch}:{reading_id}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_reading_cursor(cursor: str) -> Tuple[int, int]:
+    """encode_reading_cursor 的逆转换, 游标无效时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp_epoch, reading_id = raw.decode('ascii').split(':')
+        return int(timestamp_epoch), int(reading_id)
+    except ValueError:
+        raise ValueError(f"invalid cursor: {cursor}") from None
+
 
 class CGMDatabase:
     """CGM Butler 数据库操作类"""
@@ -31,18 +121,21 @@ class CGMDatabase:
         """
         self.db_path = db_path or DEFAULT_DB_PATH
         self.conn = None
+        self._pool = None
+        self._hot_tail = get_hot_tail(self.db_path)
+        self._prefix_cache = get_prefix_cache(self.db_path)
+        self._alert_engine = get_alert_engine(self.db_path)
     
     def connect(self):
-        """建立数据库连接"""
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.row_factory = sqlite3.Row  # 使查询结果可以通过列名访问
-        self._ensure_activity_logs_table()
+        """从进程级连接池借出数据库连接"""
+        self._pool = get_pool(self.db_path)
+        self.conn = self._pool.acquire()
         return self.conn
     
     def close(self):
-        """关闭数据库连接"""
+        """将数据库连接归还连接池"""
         if self.conn:
-            self.conn.close()
+            self._pool.release(self.conn)
             self.conn = None
     
     def __enter__(self):
@@ -58,34 +151,6 @@ class CGMDatabase:
     # 日志记录辅助
     # ============================================================
 
-    def _ensure_activity_logs_table(self):
-        """创建活动日志表(如不存在)"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS activity_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                category TEXT NOT NULL,
-                title TEXT NOT NULL,
-                note TEXT,
-                timestamp_utc TEXT NOT NULL,
-                day_utc TEXT NOT NULL,
-                minutes_of_day_utc INTEGER NOT NULL,
-                medication_name TEXT,
-                dose TEXT,
-                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
-        cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS idx_activity_logs_user_day
-            ON activity_logs (user_id, day_utc, timestamp_utc DESC)
-            """
-        )
-        self.conn.commit()
-
     @staticmethod
     def _normalise_timestamp_utc(timestamp_str: str) -> Tuple[str, str, int]:
         """将任意 ISO8601 字符串转换为标准 UTC 字段"""
@@ -146,7 +211,9 @@ class CGMDatabase:
                 user_data.get('conditions'),
                 user_data.get('cgm_device_type')
             ))
+            bump_data_versions(self.conn, [user_data.get('user_id')], 'user')
             self.conn.commit()
+            publish(self.db_path, user_data.get('user_id'), 'user')
             return True
         except sqlite3.Error as e:
             print(f"创建用户失败: {e}")
@@ -174,7 +241,9 @@ class CGMDatabase:
                 SET {set_clause}, updated_at = CURRENT_TIMESTAMP
                 WHERE user_id = ?
             ''', values)
+            bump_data_versions(self.conn, [user_id], 'user')
             self.conn.commit()
+            publish(self.db_path, user_id, 'user')
             return True
         except sqlite3.Error as e:
             print(f"更新用户失败: {e}")
@@ -184,7 +253,13 @@ class CGMDatabase:
     # CGM 读数相关操作
     # ============================================================
     
-    def add_cgm_reading(self, user_id: str, timestamp: str, glucose_value: int) -> bool:
+    def add_cgm_reading(
+        self,
+        user_id: str,
+        timestamp: str,
+        glucose_value: int,
+        on_conflict: str = 'ignore'
+    ) -> bool:
         """
         添加 CGM 读数
         
@@ -192,22 +267,227 @@ class CGMDatabase:
             user_id: 用户ID
             timestamp: 时间戳 (ISO 8601 格式)
             glucose_value: 血糖值 (mg/dL)
+            on_conflict: 同一时间戳已有读数时的处理方式 ('ignore' 或 'update')
             
         Returns:
-            添加成功返回 True,否则返回 False
+            添加成功 (包括重复读数被忽略) 返回 True,否则返回 False
         """
         try:
+            normalised = normalise_reading_timestamp(timestamp)
+            epoch = timestamp_to_epoch(normalised)
             cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO cgm_readings (user_id, timestamp, glucose_value)
-                VALUES (?, ?, ?)
-            ''', (user_id, timestamp, glucose_value))
+            cursor.execute(self._insert_reading_sql(on_conflict), (
+                user_id,
+                normalised,
+                epoch,
+                glucose_value
+            ))
+            inserted = cursor.rowcount > 0
+            alerts = []
+            oldest_epochs = {user_id: epoch}
+            if inserted:
+                refresh_episodes(self.conn, user_id, epoch)
+                refresh_prefix_index(self.conn, user_id, epoch)
+                oldest_epochs.update(catch_up_derived_tables(self.conn, oldest_epochs))
+                self._mark_patterns_dirty(oldest_epochs)
+                alerts = self._alert_engine.evaluate(self.conn, user_id, [(epoch, int(glucose_value))])
+                bump_data_versions(self.conn, oldest_epochs, 'readings')
+                if alerts:
+                    bump_data_versions(self.conn, [user_id], 'alerts')
             self.conn.commit()
+            self._hot_tail_after_write(oldest_epochs)
+            self._prefix_cache_after_write(oldest_epochs)
+            if inserted:
+                self._publish_reading_changes(oldest_epochs, {user_id: alerts})
             return True
-        except sqlite3.Error as e:
+        except (sqlite3.Error, ValueError) as e:
             print(f"添加 CGM 读数失败: {e}")
+            self.conn.rollback()
             return False
     
+    @staticmethod
+    def _insert_reading_sql(on_conflict: str) -> str:
+        """生成带冲突处理的读数插入语句"""
+        if on_conflict not in CONFLICT_CLAUSES:
+            raise ValueError(f"on_conflict must be one of {', '.join(CONFLICT_CLAUSES)}")
+        return f'''
+            INSERT INTO cgm_readings (user_id, timestamp, timestamp_epoch, glucose_value)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, timestamp_epoch) {CONFLICT_CLAUSES[on_conflict]}
+        '''
+    
+    @staticmethod
+    def _normalise_glucose_value(value: Any) -> int:
+        """校验血糖值并取整, 非数值或超出可信范围时抛出 ValueError"""
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError("glucose_value must be a number")
+        glucose = float(value)
+        low, high = VALID_GLUCOSE_RANGE
+        if not low <= glucose <= high:
+            raise ValueError(f"glucose_value out of range: {value}")
+        return int(round(glucose))
+
+    def add_cgm_readings_batch(
+        self,
+        readings: Iterable[Dict],
+        user_id: Optional[str] = None,
+        chunk_size: int = INGEST_CHUNK_SIZE,
+        on_conflict: str = 'ignore'
+    ) -> Dict[str, int]:
+        """
+        批量添加 CGM 读数
+        
+        所有读数在同一个事务内按块 executemany 写入, 只提交一次;
+        输入可以是任意可迭代对象, 按块消费, 内存占用与输入总量无关。
+        重复读数由 (user_id, timestamp_epoch) 唯一索引的 ON CONFLICT 子句处理
+        
+        Args:
+            readings: 读数字典的可迭代对象, 每项包含 timestamp 和 glucose_value;
+                      未给出参数 user_id 时每项必须带 user_id (内部多用户导入)
+            user_id: 全部读数所属的用户ID; 给出时读数中不同的 user_id 被拒绝,
+                     防止一次上传写入其他用户的数据
+            chunk_size: 每次 executemany 的行数
+            on_conflict: 同一时间戳已有读数时的处理方式 ('ignore' 或 'update')
+            
+        Returns:
+            统计字典: received (收到), inserted (写入; update 模式下包括被更新的读数),
+            duplicates (重复且未改变), rejected (无效)
+        """
+        result = {'received': 0, 'inserted': 0, 'duplicates': 0, 'rejected': 0}
+        insert_sql = self._insert_reading_sql(on_conflict)
+        cursor = self.conn.cursor()
+        iterator = iter(readings)
+        oldest_epochs: Dict[str, int] = {}
+        # 可触发警报的近期读数, 全部写入后按用户、按时间顺序评估
+        alert_cutoff = alert_cutoff_epoch()
+        alert_readings: Dict[str, List[Tuple[int, int]]] = {}
+        raised_alerts: Dict[str, List[Dict]] = {}
+
+        try:
+            while True:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                result['received'] += len(chunk)
+
+                # 校验并在块内去重
+                rows: Dict[Tuple[str, str], int] = {}
+                for reading in chunk:
+                    try:
+                        reading_user = reading.get('user_id')
+                        if user_id is not None:
+                            if reading_user and reading_user != user_id:
+                                raise ValueError("reading user_id does not match the batch user_id")
+                            reading_user = user_id
+                        elif not reading_user:
+                            raise ValueError("user_id is required")
+                        key = (reading_user, normalise_reading_timestamp(reading.get('timestamp')))
+                        glucose = self._normalise_glucose_value(reading.get('glucose_value'))
+                    except (AttributeError, TypeError, ValueError):
+                        result['rejected'] += 1
+                        continue
+                    if key in rows:
+                        result['duplicates'] += 1
+                        continue
+                    rows[key] = glucose
+
+                params = []
+                for (reading_user, timestamp), glucose in rows.items():
+                    epoch = timestamp_to_epoch(timestamp)
+                    if epoch < oldest_epochs.get(reading_user, epoch + 1):
+                        oldest_epochs[reading_user] = epoch
+                    if epoch >= alert_cutoff:
+                        alert_readings.setdefault(reading_user, []).append((epoch, glucose))
+                    params.append((reading_user, timestamp, epoch, glucose))
+
+                cursor.executemany(insert_sql, params)
+                written = max(cursor.rowcount, 0)
+                result['inserted'] += written
+                result['duplicates'] += len(rows) - written
+
+            if result['inserted']:
+                for reading_user, oldest in oldest_epochs.items():
+                    refresh_episodes(self.conn, reading_user, oldest)
+                    refresh_prefix_index(self.conn, reading_user, oldest)
+                oldest_epochs.update(catch_up_derived_tables(self.conn, oldest_epochs))
+                self._mark_patterns_dirty(oldest_epochs)
+                for reading_user, recent in alert_readings.items():
+                    recent.sort()
+                    raised_alerts[reading_user] = self._alert_engine.evaluate(
+                        self.conn, reading_user, recent, alert_cutoff
+                    )
+                bump_data_versions(self.conn, oldest_epochs, 'readings')
+                bump_data_versions(
+                    self.conn, [reading_user for reading_user, alerts in raised_alerts.items() if alerts], 'alerts'
+                )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"批量添加 CGM 读数失败: {e}")
+            self.conn.rollback()
+            raise
+
+        self._hot_tail_after_write(oldest_epochs)
+        self._prefix_cache_after_write(oldest_epochs)
+        if result['inserted']:
+            self._publish_reading_changes(oldest_epochs, raised_alerts)
+        return result
+    
+    def _publish_reading_changes(self, oldest_epochs: Dict[str, int], raised_alerts: Dict[str, List[Dict]]) -> None:
+        """
+        写入提交后发布读数与警报变更事件
+        
+        Args:
+            oldest_epochs: 本次写入涉及的用户 -> 最早读数的 timestamp_epoch
+            raised_alerts: 用户 -> 本次触发的警报
+        """
+        for user_id, oldest in oldest_epochs.items():
+            publish(self.db_path, user_id, 'readings', oldest)
+        for user_id, alerts in raised_alerts.items():
+            if alerts:
+                publish(self.db_path, user_id, 'alerts', alerts)
+    
+    def sync_derived_tables(self) -> Dict[str, int]:
+        """
+        补齐其他写入方 (初始化脚本、直接执行 SQL) 插入、尚未反映到事件表和前缀和索引的读数
+        (见 derived.py); 读取这两张表之前调用, 没有滞后时只有两次主键查找,
+        连接上有未提交的事务时跳过
+
+        补齐的用户视同写入了新读数: 更新版本号、标记模式识别并发布变更事件
+
+        Returns:
+            补齐的用户 -> 其新读数的最早 timestamp_epoch
+        """
+        if self.conn.in_transaction or not derived_tables_lag(self.conn):
+            return {}
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            caught_up = catch_up_derived_tables(self.conn)
+            if caught_up:
+                self._mark_patterns_dirty(caught_up)
+                bump_data_versions(self.conn, caught_up, 'readings')
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        self._hot_tail_after_write(caught_up)
+        self._prefix_cache_after_write(caught_up)
+        self._publish_reading_changes(caught_up, {})
+        return caught_up
+
+    def _mark_patterns_dirty(self, user_ids: Iterable[str]) -> None:
+        """
+        在写入读数的同一事务内标记用户需要重新识别模式 (由事件驱动调度器消费)
+        
+        Args:
+            user_ids: 有新读数的用户ID
+        """
+        now = int(time.time())
+        self.conn.executemany('''
+            INSERT INTO pattern_dirty_users (user_id, first_marked_at, last_marked_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET last_marked_at = excluded.last_marked_at
+        ''', [(user_id, now, now) for user_id in user_ids])
+    
     def get_cgm_readings(
         self, 
         user_id: str, 
@@ -233,14 +513,14 @@ class CGMDatabase:
         params = [user_id]
         
         if start_time:
-            query += ' AND timestamp >= ?'
-            params.append(start_time)
+            query += ' AND timestamp_epoch >= ?'
+            params.append(timestamp_to_epoch(start_time))
         
         if end_time:
-            query += ' AND timestamp <= ?'
-            params.append(end_time)
+            query += ' AND timestamp_epoch <= ?'
+            params.append(timestamp_to_epoch(end_time))
         
-        query += ' ORDER BY timestamp DESC'
+        query += ' ORDER BY timestamp_epoch DESC'
         
         if limit:
             query += ' LIMIT ?'
@@ -250,6 +530,95 @@ class CGMDatabase:
         rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
+    def get_cgm_readings_page(
+        self,
+        user_id: str,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: int = READINGS_PAGE_SIZE
+    ) -> Dict:
+        """
+        按 (timestamp_epoch, id) 键集分页获取 CGM 读数
+        
+        不使用 OFFSET: 每一页都是一次索引定位加顺序读取, 翻到多深的历史代价都相同。
+        after: 返回游标之后 (更新) 的读数, 按时间从旧到新, 用于增量同步 (图表直接追加);
+        before: 返回游标之前 (更早) 的读数, 按时间从新到旧, 用于向前翻阅历史;
+        都不给时返回最新的一页, 按时间从新到旧。
+        游标按读数时间定位, 事后补传的更早读数不会出现在 after 的增量中
+        
+        Args:
+            user_id: 用户ID
+            after: 上一页返回的 after 游标,可选
+            before: 上一页返回的 before 游标,可选
+            limit: 每页读数 (1 - MAX_READINGS_PAGE_SIZE)
+            
+        Returns:
+            {'readings': 读数列表, 'after': 取更新读数的游标, 'before': 取更早读数的游标,
+             'has_more': 请求方向上是否还有更多读数}; 空页沿用请求的游标
+            
+        Raises:
+            ValueError: 同时给出 after 和 before, 游标无效或 limit 超出范围
+        """
+        if after and before:
+            raise ValueError("after and before are mutually exclusive")
+        if not 1 <= limit <= MAX_READINGS_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_READINGS_PAGE_SIZE}")
+        
+        query = 'SELECT * FROM cgm_readings WHERE user_id = ?'
+        params: List[Any] = [user_id]
+        if after:
+            query += ' AND (timestamp_epoch, id) > (?, ?) ORDER BY timestamp_epoch, id'
+            params.extend(decode_reading_cursor(after))
+        else:
+            if before:
+                query += ' AND (timestamp_epoch, id) < (?, ?)'
+                params.extend(decode_reading_cursor(before))
+            query += ' ORDER BY timestamp_epoch DESC, id DESC'
+        # 多取一行判断是否还有下一页
+        query += ' LIMIT ?'
+        params.append(limit + 1)
+        
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        readings = [dict(row) for row in cursor.fetchall()]
+        has_more = len(readings) > limit
+        del readings[limit:]
+        
+        if not readings:
+            return {'readings': [], 'after': after, 'before': before, 'has_more': False}
+        oldest, newest = (readings[0], readings[-1]) if after else (readings[-1], readings[0])
+        return {
+            'readings': readings,
+            'after': encode_reading_cursor(newest['timestamp_epoch'], newest['id']),
+            'before': encode_reading_cursor(oldest['timestamp_epoch'], oldest['id']),
+            'has_more': has_more,
+        }
+
+    def get_readings_after_id(self, user_id: str, after_id: int, limit: Optional[int] = None) -> List[Dict]:
+        """
+        获取 id 大于 after_id 的读数 (即此后写入的, 包括补传的历史读数)
+
+        按 id 范围扫描, 只读取新写入的行, 适合推送通道反复查询增量
+        
+        Args:
+            user_id: 用户ID
+            after_id: 上次已读取的最大读数 id
+            limit: 返回记录数限制,可选
+            
+        Returns:
+            按写入顺序 (id 从小到大) 排列的读数列表
+        """
+        # +user_id: 不走 (user_id, ...) 索引, 让 SQLite 按 id (rowid) 范围只扫描新行
+        query = 'SELECT * FROM cgm_readings WHERE id > ? AND +user_id = ? ORDER BY id'
+        params: List[Any] = [after_id, user_id]
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+
     # ============================================================
     # 活动日志相关操作
     # ============================================================
@@ -299,9 +668,12 @@ class CGMDatabase:
                 dose,
             ),
         )
+        bump_data_versions(self.conn, [user_id], 'activity_logs')
         self.conn.commit()
         inserted_id = cursor.lastrowid
-        return self.get_activity_log_by_id(inserted_id)
+        log = self.get_activity_log_by_id(inserted_id)
+        publish(self.db_path, user_id, 'activity_logs', log)
+        return log
 
     def get_activity_log_by_id(self, log_id: int) -> Dict:
         cursor = self.conn.cursor()
@@ -351,9 +723,254 @@ class CGMDatabase:
         Returns:
             最新的 CGM 读数,如果没有返回 None
         """
-        readings = self.get_cgm_readings(user_id, limit=1)
+        readings = self.get_recent_readings(user_id, limit=1)
         return readings[0] if readings else None
+
+    def get_recent_readings(self, user_id: str, limit: int = 20) -> List[Dict]:
+        """
+        获取用户最近的 CGM 读数, 优先从进程内热尾缓存读取
+        
+        Args:
+            user_id: 用户ID
+            limit: 返回记录数
+            
+        Returns:
+            按时间从新到旧的 CGM 读数列表
+        """
+        if limit <= 0:
+            return []
+        if limit <= self._hot_tail.capacity:
+            if self._hot_tail.is_stale(user_id):
+                self._sync_hot_tail(user_id)
+            readings = self._hot_tail.get(user_id, limit)
+            if readings is not None:
+                return readings
+        return self.get_cgm_readings(user_id, limit=limit)
+
+    # ============================================================
+    # 最新读数热尾缓存
+    # ============================================================
+
+    def _sync_hot_tail(self, user_id: str) -> None:
+        """
+        读取前同步热尾: 已缓存且读数版本号未变时只刷新同步时间;
+        未缓存或版本号变化 (其他进程追加、补传或覆盖了读数) 时重新加载最近 capacity 条读数
+        """
+        version = get_data_versions(self.conn, user_id).get('readings', 0)
+        if self._hot_tail.revalidate(user_id, version):
+            return
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f'SELECT {", ".join(READING_COLUMNS)} FROM cgm_readings WHERE user_id = ? '
+            f'ORDER BY timestamp_epoch DESC LIMIT ?',
+            (user_id, self._hot_tail.capacity)
+        )
+        self._hot_tail.load(user_id, [dict(row) for row in cursor.fetchall()], version)
+
+    def _extend_hot_tail(self, user_id: str, last_epoch: int) -> None:
+        """向已缓存的热尾追加本进程刚写入的、晚于缓存的读数"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f'SELECT {", ".join(READING_COLUMNS)} FROM cgm_readings WHERE user_id = ? AND timestamp_epoch >= ? '
+            f'ORDER BY timestamp_epoch',
+            (user_id, last_epoch)
+        )
+        self._hot_tail.extend(user_id, [dict(row) for row in cursor.fetchall()])
+
+    def _hot_tail_after_write(self, oldest_epochs: Dict[str, int]) -> None:
+        """
+        写入提交后同步已缓存用户的热尾: 新读数都晚于缓存时直接追加,
+        乱序写入 (补传历史数据或覆盖已有读数) 则丢弃缓存, 下次读取时重新加载
+
+        Args:
+            oldest_epochs: 本次写入涉及的用户 -> 最早读数的 timestamp_epoch
+        """
+        for user_id, oldest in oldest_epochs.items():
+            if user_id not in self._hot_tail:
+                continue
+            last_epoch = self._hot_tail.last_epoch(user_id)
+            if last_epoch is None or oldest <= last_epoch:
+                self._hot_tail.invalidate(user_id)
+            else:
+                self._extend_hot_tail(user_id, last_epoch)
+
+    # ============================================================
+    # 前缀和索引缓存
+    # ============================================================
+
+    def _sync_prefix_cache(self, user_id: str) -> None:
+        """
+        未缓存时加载用户的全部索引条目; 已缓存且最后一个条目未被改写时只追加更新的条目,
+        否则 (其他进程补传了历史数据或覆盖了读数) 重新加载
+        """
+        columns = ', '.join(('timestamp_epoch', 'reading_id') + tuple(PREFIX_SUM_COLUMNS))
+        cursor = self.conn.cursor()
+        last = self._prefix_cache.last(user_id)
+
+        if last is not None:
+            cursor.execute(
+                f'SELECT {columns} FROM cgm_prefix_index '
+                f'WHERE user_id = ? AND timestamp_epoch = ? AND reading_id = ?',
+                (user_id, last[0], last[1])
+            )
+            row = cursor.fetchone()
+            if row is not None and tuple(row) == last:
+                cursor.execute(
+                    f'SELECT {columns} FROM cgm_prefix_index '
+                    f'WHERE user_id = ? AND (timestamp_epoch, reading_id) > (?, ?) '
+                    f'ORDER BY timestamp_epoch, reading_id',
+                    (user_id, last[0], last[1])
+                )
+                self._prefix_cache.extend(user_id, [tuple(row) for row in cursor.fetchall()])
+                return
+
+        cursor.execute(
+            f'SELECT {columns} FROM cgm_prefix_index WHERE user_id = ? ORDER BY timestamp_epoch, reading_id',
+            (user_id,)
+        )
+        self._prefix_cache.load(user_id, [tuple(row) for row in cursor.fetchall()])
+
+    def _prefix_cache_after_write(self, oldest_epochs: Dict[str, int]) -> None:
+        """
+        写入提交后同步已缓存用户的前缀和: 新读数都晚于缓存时直接追加,
+        乱序写入会改写其后的全部累计值, 丢弃缓存, 下次查询时重新加载
+
+        Args:
+            oldest_epochs: 本次写入涉及的用户 -> 最早读数的 timestamp_epoch
+        """
+        for user_id, oldest in oldest_epochs.items():
+            if user_id not in self._prefix_cache:
+                continue
+            last = self._prefix_cache.last(user_id)
+            if last is not None and oldest <= last[0]:
+                self._prefix_cache.invalidate(user_id)
+            else:
+                self._sync_prefix_cache(user_id)
     
+    def _window_fragments(
+        self,
+        start_epoch: Optional[int],
+        end_epoch: Optional[int]
+    ) -> List[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        把 [start_epoch, end_epoch) 窗口拆成 日汇总 / 小时汇总 / 原始读数 三类片段
+        整天的部分取日汇总, 剩余整小时取小时汇总, 不足一小时的边缘才扫描原始读数
+
+        Returns:
+            [(来源, 起点, 终点)] 列表, 起点/终点为 None 表示不限
+        """
+        def floor_to(value, size):
+            return None if value is None else value - value % size
+
+        def ceil_to(value, size):
+            return None if value is None else -((-value) // size) * size
+
+        def non_empty(lo, hi):
+            return lo is None or hi is None or lo < hi
+
+        fragments = []
+        hour_lo, hour_hi = ceil_to(start_epoch, 3600), floor_to(end_epoch, 3600)
+        if not non_empty(hour_lo, hour_hi):
+            return [('raw', start_epoch, end_epoch)]
+
+        if start_epoch is not None and start_epoch < hour_lo:
+            fragments.append(('raw', start_epoch, hour_lo))
+        if end_epoch is not None and hour_hi < end_epoch:
+            fragments.append(('raw', hour_hi, end_epoch))
+
+        day_lo, day_hi = ceil_to(hour_lo, 86400), floor_to(hour_hi, 86400)
+        if non_empty(day_lo, day_hi):
+            fragments.append(('cgm_rollups_daily', day_lo, day_hi))
+            if hour_lo is not None and hour_lo < day_lo:
+                fragments.append(('cgm_rollups_hourly', hour_lo, day_lo))
+            if hour_hi is not None and day_hi < hour_hi:
+                fragments.append(('cgm_rollups_hourly', day_hi, hour_hi))
+        else:
+            fragments.append(('cgm_rollups_hourly', hour_lo, hour_hi))
+        return fragments
+
+    def _window_union(
+        self,
+        user_id: str,
+        start_epoch: Optional[int],
+        end_epoch: Optional[int],
+        raw_select: str,
+        rollup_select: str
+    ) -> Tuple[str, List[Any]]:
+        """
+        生成覆盖 [start_epoch, end_epoch) 窗口的 UNION ALL 子查询, 每个片段一行
+
+        Args:
+            user_id: 用户ID
+            start_epoch: 窗口开始 (含), None 表示不限
+            end_epoch: 窗口结束 (不含), None 表示不限
+            raw_select: 原始读数片段的 SELECT 列表 (聚合表达式)
+            rollup_select: 汇总表片段的 SELECT 列表, 列名与 raw_select 一一对应
+
+        Returns:
+            (子查询 SQL, 参数列表)
+        """
+        parts = []
+        params: List[Any] = []
+        for source, lo, hi in self._window_fragments(start_epoch, end_epoch):
+            if source == 'raw':
+                key = 'timestamp_epoch'
+                sql = f"SELECT {raw_select} FROM cgm_readings WHERE user_id = ?"
+            else:
+                key = 'bucket_epoch'
+                sql = f"SELECT {rollup_select} FROM {source} WHERE user_id = ?"
+            params.append(user_id)
+            if lo is not None:
+                sql += f" AND {key} >= ?"
+                params.append(lo)
+            if hi is not None:
+                sql += f" AND {key} < ?"
+                params.append(hi)
+            parts.append(sql)
+        return ' UNION ALL '.join(parts), params
+
+    def _aggregate_window(
+        self,
+        user_id: str,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None
+    ) -> Dict:
+        """
+        在汇总表上聚合任意时间窗口 (起止时间均包含), 一次查询返回
+
+        Args:
+            user_id: 用户ID
+            start_time: 开始时间,可选
+            end_time: 结束时间,可选
+
+        Returns:
+            汇总列 (reading_count, glucose_sum, ..., glucose_min, glucose_max) 的合计
+        """
+        start_epoch = timestamp_to_epoch(start_time) if start_time else None
+        end_epoch = timestamp_to_epoch(end_time) + 1 if end_time else None
+
+        raw_columns = ', '.join(
+            f"SUM({expr.format(g='glucose_value')}) AS {column}"
+            for column, expr in ROLLUP_SUM_COLUMNS.items()
+        )
+        union, params = self._window_union(
+            user_id, start_epoch, end_epoch,
+            raw_select=f"{raw_columns}, MIN(glucose_value) AS glucose_min, MAX(glucose_value) AS glucose_max",
+            rollup_select=f"{', '.join(ROLLUP_SUM_COLUMNS)}, glucose_min, glucose_max"
+        )
+
+        totals = ', '.join(f"TOTAL({column}) AS {column}" for column in ROLLUP_SUM_COLUMNS)
+        query = (f"SELECT {totals}, MIN(glucose_min) AS glucose_min, MAX(glucose_max) AS glucose_max "
+                 f"FROM ({union})")
+
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        row = dict(cursor.fetchone())
+        # TOTAL() 返回浮点数, 计数与求和都是整数
+        for column in ROLLUP_SUM_COLUMNS:
+            row[column] = int(row[column])
+        return row
+
     def get_glucose_statistics(
         self, 
         user_id: str,
@@ -361,7 +978,7 @@ class CGMDatabase:
         end_time: Optional[str] = None
     ) -> Dict:
         """
-        获取血糖统计信息
+        获取血糖统计信息 (基于小时/日汇总表, 仅窗口边缘扫描原始读数)
         
         Args:
             user_id: 用户ID
@@ -369,32 +986,98 @@ class CGMDatabase:
             end_time: 结束时间,可选
             
         Returns:
-            统计信息字典 (min, max, avg, count)
+            统计信息字典 (min, max, avg, count, std_dev)
         """
+        totals = self._aggregate_window(user_id, start_time, end_time)
+        count = totals['reading_count']
+
+        return {
+            'min_glucose': totals['glucose_min'],
+            'max_glucose': totals['glucose_max'],
+            'avg_glucose': totals['glucose_sum'] / count if count else None,
+            'count': count,
+            'std_dev': self._sample_std_dev(count, totals['glucose_sum'], totals['glucose_sum_sq']),
+        }
+
+    @staticmethod
+    def _sample_std_dev(count: int, total: int, total_sq: int) -> Optional[float]:
+        """由计数、和、平方和计算样本标准差; 整数运算避免大样本下的精度损失"""
+        if count < 2:
+            return None
+        variance = (count * total_sq - total * total) / (count * (count - 1))
+        return math.sqrt(max(variance, 0.0))
+
+    def _window_extremes(
+        self,
+        user_id: str,
+        start_epoch: Optional[int],
+        end_epoch: Optional[int]
+    ) -> Tuple[Optional[int], Optional[int]]:
+        """[start_epoch, end_epoch) 窗口内的最低/最高血糖 (汇总表的最值列, 窗口边缘扫描原始读数)"""
+        union, params = self._window_union(
+            user_id, start_epoch, end_epoch,
+            raw_select="MIN(glucose_value) AS glucose_min, MAX(glucose_value) AS glucose_max",
+            rollup_select="glucose_min, glucose_max"
+        )
         cursor = self.conn.cursor()
-        
-        query = '''
-            SELECT 
-                MIN(glucose_value) as min_glucose,
-                MAX(glucose_value) as max_glucose,
-                AVG(glucose_value) as avg_glucose,
-                COUNT(*) as count
-            FROM cgm_readings
-            WHERE user_id = ?
-        '''
-        params = [user_id]
-        
-        if start_time:
-            query += ' AND timestamp >= ?'
-            params.append(start_time)
-        
-        if end_time:
-            query += ' AND timestamp <= ?'
-            params.append(end_time)
-        
-        cursor.execute(query, params)
-        row = cursor.fetchone()
-        return dict(row) if row else {}
+        cursor.execute(f"SELECT MIN(glucose_min), MAX(glucose_max) FROM ({union})", params)
+        return tuple(cursor.fetchone())
+
+    def get_window_statistics(
+        self,
+        user_id: str,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        include_extremes: bool = True
+    ) -> Dict:
+        """
+        获取 [start_time, end_time) 窗口的血糖统计 (均值、标准差、CV、TIR)
+        基于前缀和索引: 窗口两端各一次二分查找, 耗时与窗口长度无关
+
+        Args:
+            user_id: 用户ID
+            start_time: 开始时间 (含),可选
+            end_time: 结束时间 (不含),可选
+            include_extremes: 是否同时返回最低/最高血糖 (前缀和无法给出, 取自小时/日汇总表)
+
+        Returns:
+            统计信息字典: count, avg_glucose, std_dev, cv (%), time_in_range_70_140,
+            time_in_range_70_180, time_below_70, time_above_180 (%),
+            以及 include_extremes 时的 min_glucose, max_glucose
+        """
+        start_epoch = timestamp_to_epoch(start_time) if start_time else None
+        end_epoch = timestamp_to_epoch(end_time) if end_time else None
+
+        self.sync_derived_tables()
+        if self._prefix_cache.is_stale(user_id):
+            self._sync_prefix_cache(user_id)
+        totals = self._prefix_cache.totals(user_id, start_epoch, end_epoch)
+        if totals is None:
+            # 缓存刚被淘汰 (并发查询的用户数超过缓存上限) 时直接查持久化索引
+            totals = window_totals(self.conn, user_id, start_epoch, end_epoch)
+
+        count = totals['reading_count']
+        avg = totals['glucose_sum'] / count if count else None
+        std_dev = self._sample_std_dev(count, totals['glucose_sum'], totals['glucose_sum_sq'])
+
+        def percent(column: str) -> Optional[float]:
+            return totals[column] * 100.0 / count if count else None
+
+        stats = {
+            'count': count,
+            'avg_glucose': avg,
+            'std_dev': std_dev,
+            'cv': std_dev * 100.0 / avg if std_dev is not None and avg else None,
+            'time_in_range_70_140': percent('in_70_140'),
+            'time_in_range_70_180': percent('in_70_180'),
+            'time_below_70': percent('below_70'),
+            'time_above_180': percent('above_180'),
+        }
+        if include_extremes:
+            stats['min_glucose'], stats['max_glucose'] = (
+                self._window_extremes(user_id, start_epoch, end_epoch) if count else (None, None)
+            )
+        return stats
     
     def get_time_in_range(
         self,
@@ -406,6 +1089,7 @@ class CGMDatabase:
     ) -> float:
         """
         计算血糖在目标范围内的时间百分比 (Time In Range)
+        预计算的阈值 (70-140, 70-180) 走汇总表, 其他阈值扫描原始读数
         
         Args:
             user_id: 用户ID
@@ -417,6 +1101,13 @@ class CGMDatabase:
         Returns:
             在目标范围内的时间百分比 (0-100)
         """
+        rollup_column = ROLLUP_RANGE_COLUMNS.get((low_threshold, high_threshold))
+        if rollup_column:
+            totals = self._aggregate_window(user_id, start_time, end_time)
+            if not totals['reading_count']:
+                return 0.0
+            return totals[rollup_column] * 100.0 / totals['reading_count']
+
         cursor = self.conn.cursor()
         
         query = '''
@@ -428,12 +1119,12 @@ class CGMDatabase:
         params = [low_threshold, high_threshold, user_id]
         
         if start_time:
-            query += ' AND timestamp >= ?'
-            params.append(start_time)
+            query += ' AND timestamp_epoch >= ?'
+            params.append(timestamp_to_epoch(start_time))
         
         if end_time:
-            query += ' AND timestamp <= ?'
-            params.append(end_time)
+            query += ' AND timestamp_epoch <= ?'
+            params.append(timestamp_to_epoch(end_time))
         
         cursor.execute(query, params)
         row = cursor.fetchone()
@@ -536,14 +1227,14 @@ class CGMDatabase:
         cursor = self.conn.cursor()
         
         # 获取餐前血糖 (用餐前 15 分钟的平均值)
-        meal_dt = datetime.fromisoformat(meal_time)
-        pre_meal_start = (meal_dt - timedelta(minutes=15)).isoformat()
+        meal_epoch = timestamp_to_epoch(meal_time)
+        pre_meal_start = meal_epoch - 15 * 60
         
         cursor.execute('''
             SELECT AVG(glucose_value) as pre_meal_glucose
             FROM cgm_readings
-            WHERE user_id = ? AND timestamp BETWEEN ? AND ?
-        ''', (user_id, pre_meal_start, meal_time))
+            WHERE user_id = ? AND timestamp_epoch BETWEEN ? AND ?
+        ''', (user_id, pre_meal_start, meal_epoch))
         
         pre_meal_row = cursor.fetchone()
         pre_meal_glucose = pre_meal_row['pre_meal_glucose'] if pre_meal_row else None
@@ -552,13 +1243,13 @@ class CGMDatabase:
             return False, {'error': '无法获取餐前血糖'}
         
         # 获取餐后最高血糖
-        post_meal_end = (meal_dt + timedelta(hours=window_hours)).isoformat()
+        post_meal_end = meal_epoch + window_hours * 3600
         
         cursor.execute('''
             SELECT MAX(glucose_value) as peak_glucose, timestamp as peak_time
             FROM cgm_readings
-            WHERE user_id = ? AND timestamp BETWEEN ? AND ?
-        ''', (user_id, meal_time, post_meal_end))
+            WHERE user_id = ? AND timestamp_epoch BETWEEN ? AND ?
+        ''', (user_id, meal_epoch, post_meal_end))
         
         post_meal_row = cursor.fetchone()
         peak_glucose = post_meal_row['peak_glucose'] if post_meal_row else None
@@ -578,9 +1269,27 @@ class CGMDatabase:
             'threshold': spike_threshold
         }
     
+    @staticmethod
+    def _day_epoch(date: str) -> int:
+        """YYYY-MM-DD -> 当天零点的 timestamp_epoch (与日汇总表的桶对齐)"""
+        return timestamp_to_epoch(datetime.strptime(date, '%Y-%m-%d'))
+
+    @staticmethod
+    def _format_daily_summary(date: str, row: Optional[sqlite3.Row]) -> Dict:
+        """将日汇总行转换为日总结字典 (当天无读数时各统计为空)"""
+        count = row['reading_count'] if row else 0
+        return {
+            'date': date,
+            'reading_count': count,
+            'min_glucose': row['glucose_min'] if row else None,
+            'max_glucose': row['glucose_max'] if row else None,
+            'avg_glucose': row['glucose_sum'] / count if count else None,
+            'time_in_range': row['in_70_140'] * 100.0 / count if count else 0.0
+        }
+
     def get_daily_summary(self, user_id: str, date: str) -> Dict:
         """
-        获取指定日期的血糖总结
+        获取指定日期的血糖总结 (读取日汇总表的一行)
         
         Args:
             user_id: 用户ID
@@ -589,27 +1298,223 @@ class CGMDatabase:
         Returns:
             日总结字典
         """
-        start_time = f"{date} 00:00:00"
-        end_time = f"{date} 23:59:59"
+        cursor = self.conn.cursor()
+        cursor.execute(
+            '''
+            SELECT reading_count, glucose_sum, glucose_min, glucose_max, in_70_140
+            FROM cgm_rollups_daily
+            WHERE user_id = ? AND bucket_epoch = ?
+            ''',
+            (user_id, self._day_epoch(date))
+        )
+        return self._format_daily_summary(date, cursor.fetchone())
+
+    def get_daily_summaries(self, user_id: str, start_date: str, end_date: str) -> List[Dict]:
+        """
+        获取日期范围内每天的血糖总结 (日历/热力图视图)
+        
+        Args:
+            user_id: 用户ID
+            start_date: 开始日期 (YYYY-MM-DD 格式, 包含)
+            end_date: 结束日期 (YYYY-MM-DD 格式, 包含)
+            
+        Returns:
+            按日期升序的日总结列表, 仅包含有读数的日期
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            '''
+            SELECT bucket_epoch, reading_count, glucose_sum, glucose_min, glucose_max, in_70_140
+            FROM cgm_rollups_daily
+            WHERE user_id = ? AND bucket_epoch >= ? AND bucket_epoch <= ?
+            ORDER BY bucket_epoch
+            ''',
+            (user_id, self._day_epoch(start_date), self._day_epoch(end_date))
+        )
+        return [
+            self._format_daily_summary(
+                datetime.fromtimestamp(row['bucket_epoch'], tz=timezone.utc).strftime('%Y-%m-%d'),
+                row
+            )
+            for row in cursor.fetchall()
+        ]
+    
+    # ============================================================
+    # 低血糖/高血糖事件
+    # ============================================================
+    
+    def get_glucose_episodes(
+        self,
+        user_id: str,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        episode_type: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        获取时间范围内的低血糖/高血糖事件 (与范围有重叠的事件)
+        
+        Args:
+            user_id: 用户ID
+            start_time: 开始时间,可选
+            end_time: 结束时间,可选
+            episode_type: 'hypo' 或 'hyper',可选
+            
+        Returns:
+            按开始时间排列的事件列表
+        """
+        self.sync_derived_tables()
+        cursor = self.conn.cursor()
         
-        # 基本统计
-        stats = self.get_glucose_statistics(user_id, start_time, end_time)
+        query = '''
+            SELECT episode_type, start_epoch, end_epoch, extreme_glucose, reading_count, glucose_sum
+            FROM glucose_episodes
+            WHERE user_id = ?
+        '''
+        params: List[Any] = [user_id]
         
-        # Time In Range
-        tir = self.get_time_in_range(user_id, start_time=start_time, end_time=end_time)
+        if start_time:
+            query += ' AND end_epoch >= ?'
+            params.append(timestamp_to_epoch(start_time))
         
-        # 读数数量
-        readings = self.get_cgm_readings(user_id, start_time, end_time)
+        if end_time:
+            query += ' AND start_epoch <= ?'
+            params.append(timestamp_to_epoch(end_time))
+        
+        if episode_type:
+            query += ' AND episode_type = ?'
+            params.append(episode_type)
+        
+        query += ' ORDER BY start_epoch'
         
+        cursor.execute(query, params)
+        episodes = []
+        for row in cursor.fetchall():
+            episodes.append({
+                'episode_type': row['episode_type'],
+                'start_time': epoch_to_timestamp(row['start_epoch']),
+                'end_time': epoch_to_timestamp(row['end_epoch']),
+                'duration_minutes': episode_duration_minutes(row['start_epoch'], row['end_epoch']),
+                'extreme_glucose': row['extreme_glucose'],
+                'avg_glucose': round(row['glucose_sum'] / row['reading_count'], 1),
+                'reading_count': row['reading_count'],
+            })
+        return episodes
+    
+    def get_episode_summary(self, user_id: str, hours: int = 24) -> Dict:
+        """
+        获取最近一段时间的事件列表及按类型的汇总 (次数、总时长、最长时长、极值)
+        
+        Args:
+            user_id: 用户ID
+            hours: 时间范围 (小时)
+            
+        Returns:
+            {'episodes': [...], 'summary': {episode_type: {...}}}
+        """
+        start_time = (datetime.now() - timedelta(hours=hours)).isoformat()
+        episodes = self.get_glucose_episodes(user_id, start_time=start_time)
         return {
-            'date': date,
-            'reading_count': len(readings),
-            'min_glucose': stats.get('min_glucose'),
-            'max_glucose': stats.get('max_glucose'),
-            'avg_glucose': stats.get('avg_glucose'),
-            'time_in_range': tir
+            'user_id': user_id,
+            'hours': hours,
+            'episodes': episodes,
+            'summary': summarize_episodes(episodes),
         }
     
+    # ============================================================
+    # 实时警报
+    # ============================================================
+    
+    @staticmethod
+    def _alert_window_start(hours: int) -> int:
+        """最近 hours 小时警报窗口的起点 (读数时间)"""
+        return timestamp_to_epoch((datetime.now() - timedelta(hours=hours)).isoformat())
+
+    def count_alerts(self, user_id: str, hours: int = 24) -> int:
+        """
+        最近 hours 小时内的警报数 (与 get_alerts 的窗口一致)
+        警报随时间移出窗口时版本号不变, 仪表板据此区分滚动窗口的内容
+
+        Args:
+            user_id: 用户ID
+            hours: 时间范围 (小时, 按触发警报的读数时间)
+        """
+        row = self.conn.execute(
+            'SELECT COUNT(*) FROM alerts WHERE user_id = ? AND reading_epoch >= ?',
+            (user_id, self._alert_window_start(hours))
+        ).fetchone()
+        return row[0]
+
+    def get_alerts(
+        self,
+        user_id: str,
+        hours: int = 24,
+        alert_type: Optional[str] = None,
+        limit: int = 100,
+        after_id: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        获取最近的实时警报
+        
+        Args:
+            user_id: 用户ID
+            hours: 时间范围 (小时, 按触发警报的读数时间)
+            alert_type: 警报类型 (urgent_low / low / predicted_low / rapid_fall),可选
+            limit: 最多返回条数
+            after_id: 只返回 id 大于此值的警报 (即此后新触发的),可选
+            
+        Returns:
+            按读数时间从新到旧排列的警报列表
+        """
+        if alert_type and alert_type not in ALERT_TYPES:
+            raise ValueError(f"alert_type must be one of {', '.join(ALERT_TYPES)}")
+        
+        cursor = self.conn.cursor()
+        
+        query = '''
+            SELECT id, alert_type, severity, reading_epoch, glucose_value, rate_per_minute,
+                   predicted_glucose, nocturnal, message, created_at
+            FROM alerts
+            WHERE user_id = ? AND reading_epoch >= ?
+        '''
+        params: List[Any] = [user_id, self._alert_window_start(hours)]
+        
+        if alert_type:
+            query += ' AND alert_type = ?'
+            params.append(alert_type)
+        
+        if after_id is not None:
+            query += ' AND id > ?'
+            params.append(after_id)
+        
+        query += ' ORDER BY reading_epoch DESC, id DESC LIMIT ?'
+        params.append(limit)
+        
+        cursor.execute(query, params)
+        alerts = []
+        for row in cursor.fetchall():
+            alert = dict(row)
+            alert['timestamp'] = epoch_to_timestamp(alert.pop('reading_epoch'))
+            alert['nocturnal'] = bool(alert['nocturnal'])
+            alert['created_at'] = epoch_to_timestamp(alert['created_at'])
+            alerts.append(alert)
+        return alerts
+
+    # ============================================================
+    # 数据版本号
+    # ============================================================
+
+    def get_data_versions(self, user_id: Optional[str]) -> Dict[str, int]:
+        """
+        获取用户各类数据的当前版本号 (用于生成 ETag)
+
+        Args:
+            user_id: 用户ID; None 表示全局数据 (Pattern-Action 映射)
+
+        Returns:
+            {数据类型: 版本号}; 从未写入过的数据类型不在结果中
+        """
+        return get_data_versions(self.conn, user_id)
+
     # ============================================================
     # 模式识别相关操作
     # ============================================================
@@ -695,7 +1600,11 @@ class CGMDatabase:
         ''', (user_id, cutoff_time))
         
         deleted_count = cursor.rowcount
+        if deleted_count:
+            bump_data_versions(self.conn, [user_id], 'patterns')
         self.conn.commit()
+        if deleted_count:
+            publish(self.db_path, user_id, 'patterns')
         
         return deleted_count
     
@@ -714,14 +1623,14 @@ class CGMDatabase:
         
         cutoff_time = (datetime.now() - timedelta(days=days)).isoformat()
         
-        # 统计各类模式的数量
-        cursor.execute('''
+        # 统计各类模式的出现次数 (每行是一个持续出现区间, occurrence_count 为该区间内的出现次数)
+        cursor.execute(f'''
             SELECT 
                 pattern_type,
                 pattern_name,
-                COUNT(*) as count,
+                SUM(occurrence_count) as count,
                 AVG(confidence) as avg_confidence,
-                MAX(severity) as max_severity
+                {severity_level_sql(f"MAX({severity_rank_sql('severity')})")} as max_severity
             FROM user_patterns
             WHERE user_id = ? AND detected_at >= ?
             GROUP BY pattern_type, pattern_name
@@ -730,23 +1639,18 @@ class CGMDatabase:
         
         patterns = [dict(row) for row in cursor.fetchall()]
         
-        # 统计总数
+        # 统计总数及高严重性模式
         cursor.execute('''
-            SELECT COUNT(*) as total_patterns
+            SELECT 
+                TOTAL(occurrence_count) as total_patterns,
+                TOTAL(CASE WHEN severity = 'high' THEN occurrence_count END) as high_severity_count
             FROM user_patterns
             WHERE user_id = ? AND detected_at >= ?
         ''', (user_id, cutoff_time))
         
-        total = cursor.fetchone()['total_patterns']
-        
-        # 统计高严重性模式
-        cursor.execute('''
-            SELECT COUNT(*) as high_severity_count
-            FROM user_patterns
-            WHERE user_id = ? AND detected_at >= ? AND severity = 'high'
-        ''', (user_id, cutoff_time))
-        
-        high_severity = cursor.fetchone()['high_severity_count']
+        row = cursor.fetchone()
+        total = int(row['total_patterns'])
+        high_severity = int(row['high_severity_count'])
         
         return {
             'user_id': user_id,
@@ -756,6 +1660,47 @@ class CGMDatabase:
             'pattern_breakdown': patterns
         }
     
+    def get_detector_metrics(self, days: int = 7) -> List[Dict]:
+        """
+        汇总各模式检测器在最近调度运行中的耗时与命中率
+        
+        Args:
+            days: 统计天数
+            
+        Returns:
+            每个检测器一项, 按总耗时从高到低排列
+        """
+        cursor = self.conn.cursor()
+        
+        cutoff_time = (datetime.now() - timedelta(days=days)).isoformat()
+        
+        cursor.execute('''
+            SELECT 
+                detector,
+                COUNT(*) as runs,
+                SUM(calls) as calls,
+                SUM(skipped) as skipped,
+                SUM(hits) as hits,
+                SUM(errors) as errors,
+                SUM(total_seconds) as total_seconds,
+                MAX(max_seconds) as max_seconds,
+                SUM(input_readings) as input_readings,
+                MAX(CASE WHEN errors > 0 THEN run_at END) as last_error_at
+            FROM detector_metrics
+            WHERE run_at >= ?
+            GROUP BY detector
+            ORDER BY total_seconds DESC
+        ''', (cutoff_time,))
+        
+        metrics = []
+        for row in cursor.fetchall():
+            item = dict(row)
+            calls = item['calls']
+            item['hit_rate'] = item['hits'] / calls if calls else 0.0
+            item['avg_ms'] = item['total_seconds'] * 1000 / calls if calls else 0.0
+            metrics.append(item)
+        return metrics
+    
     def get_all_users(self) -> List[Dict]:
         """
         获取所有用户列表
@@ -0,0 +1,226 @@
+# connection_pool.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler SQLite 连接池
+进程内按数据库文件共享长连接, 避免每个请求重新建立连接和重复执行建表语句
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from urllib.request import pathname2url
+
+from .schema import ensure_schema
+
+
+DEFAULT_POOL_SIZE = int(os.getenv('CGM_DB_POOL_SIZE', '8'))
+DEFAULT_MAX_AGE = float(os.getenv('CGM_DB_POOL_MAX_AGE', '3600'))      # 连接最长存活秒数
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0                                    # 空闲超过该秒数的连接借出前先做健康检查
+DEFAULT_ACQUIRE_TIMEOUT = 30.0                                          # 等待空闲连接的最长秒数
+
+
+class PoolExhaustedError(RuntimeError):
+    """在超时时间内没有可用连接"""
+
+
+class ConnectionPool:
+    """单个 SQLite 数据库文件的有界连接池"""
+
+    def __init__(
+        self,
+        db_path: str,
+        max_size: int = DEFAULT_POOL_SIZE,
+        max_age: float = DEFAULT_MAX_AGE,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        initializer: Optional[Callable[[sqlite3.Connection], None]] = ensure_schema,
+        read_only: bool = False,
+    ):
+        """
+        初始化连接池
+
+        Args:
+            db_path: 数据库文件路径
+            max_size: 最大连接数
+            max_age: 连接最长存活时间 (秒), 超过后归还时关闭并在下次借出时重建
+            health_check_interval: 空闲超过该时间的连接借出前执行 SELECT 1 检查
+            acquire_timeout: 等待可用连接的超时时间 (秒)
+            initializer: 首次建立连接时执行一次的结构引导函数
+            read_only: 以只读模式打开数据库 (不执行结构引导, 写入会失败)
+        """
+        self.db_path = db_path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.read_only = read_only
+
+        self._idle: "queue.LifoQueue[Tuple[sqlite3.Connection, float]]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._created_at: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._initializer = initializer
+        self._initialized = False
+        self._closed = False
+
+    # ============================================================
+    # 连接生命周期
+    # ============================================================
+
+    def _new_connection(self) -> sqlite3.Connection:
+        """建立新连接; 连接只会被一个线程同时使用, 因此允许跨线程归还"""
+        if self.read_only:
+            conn = sqlite3.connect(f'file:{pathname2url(self.db_path)}?mode=ro', uri=True,
+                                   timeout=self.acquire_timeout, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.acquire_timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # 使查询结果可以通过列名访问
+        with self._lock:
+            if not self._initialized and not self.read_only:
+                try:
+                    # WAL 模式下读写互不阻塞, 是多线程共享同一文件的前提
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    if self._initializer:
+                        self._initializer(conn)
+                except BaseException:
+                    # 数据库被锁或迁移失败: 关闭新连接, 下次获取时重新初始化
+                    conn.close()
+                    raise
+                self._initialized = True
+            self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        """关闭并丢弃连接"""
+        with self._lock:
+            self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _is_expired(self, conn: sqlite3.Connection) -> bool:
+        created_at = self._created_at.get(id(conn))
+        return created_at is None or time.monotonic() - created_at > self.max_age
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        借出一个连接
+
+        Returns:
+            可用的数据库连接
+
+        Raises:
+            PoolExhaustedError: 超时仍无可用连接
+        """
+        if self._closed:
+            raise RuntimeError(f"连接池已关闭: {self.db_path}")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolExhaustedError(f"等待数据库连接超时: {self.db_path}")
+
+        try:
+            while True:
+                try:
+                    conn, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._new_connection()
+
+                if self._is_expired(conn):
+                    self._discard(conn)
+                    continue
+                if time.monotonic() - idle_since > self.health_check_interval and not self._is_healthy(conn):
+                    self._discard(conn)
+                    continue
+                return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """
+        归还连接; 未提交的事务会被回滚, 过期连接直接关闭
+
+        Args:
+            conn: 之前借出的连接
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed or self._is_expired(conn):
+                self._discard(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        except sqlite3.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """上下文管理器: 借出连接并在结束时归还"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        """关闭所有空闲连接; 借出中的连接会在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+# ============================================================
+# 进程级连接池注册表
+# ============================================================
+
+_pools: Dict[Tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str, read_only: bool = False) -> ConnectionPool:
+    """
+    获取数据库文件对应的进程级共享连接池 (首次调用时创建并引导数据库结构)
+
+    Args:
+        db_path: 数据库文件路径
+        read_only: 获取只读连接池 (例如模式识别的工作进程), 不执行结构引导
+
+    Returns:
+        连接池实例
+    """
+    key = (os.path.abspath(db_path), read_only)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(key[0], read_only=read_only)
+                # 立即建立并归还首个连接, 在进程启动时完成一次性结构引导
+                pool.release(pool.acquire())
+                _pools[key] = pool
+    return pool
+
+
+def close_all_pools() -> None:
+    """关闭所有连接池 (进程退出或测试时使用)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -11,6 +11,8 @@ import os
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
+from .connection_pool import get_pool
+
 
 class ConversationManager:
     """对话管理器 - 保存和查询所有对话记录"""
@@ -28,12 +30,15 @@ class ConversationManager:
         
         # 确保使用绝对路径
         self.db_path = os.path.abspath(db_path)
+        self._pool = get_pool(self.db_path)
     
     def _get_connection(self):
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """从共享连接池借出数据库连接 (用完后调用 _release_connection 归还)"""
+        return self._pool.acquire()
+    
+    def _release_connection(self, conn):
+        """归还数据库连接"""
+        self._pool.release(conn)
     
     # ============================================================
     # 对话保存方法
@@ -115,7 +120,7 @@ class ConversationManager:
             conn.rollback()
             raise
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     def save_gpt_conversation(
         self,
@@ -179,7 +184,7 @@ class ConversationManager:
             conn.rollback()
             raise
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     # ============================================================
     # 对话查询方法
@@ -211,7 +216,7 @@ class ConversationManager:
             return None
             
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     def get_user_conversations(
         self,
@@ -267,7 +272,7 @@ class ConversationManager:
             return results
             
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     def get_recent_conversations(self, user_id: str, days: int = 7, limit: int = 10) -> List[Dict]:
         """
@@ -307,7 +312,7 @@ class ConversationManager:
             return results
             
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     # ============================================================
     # 对话分析方法
@@ -384,7 +389,7 @@ class ConversationManager:
             conn.rollback()
             raise
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     def get_analysis(self, conversation_id: str) -> Optional[Dict]:
         """
@@ -418,7 +423,7 @@ class ConversationManager:
             return None
             
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     # ============================================================
     # 统计方法
@@ -480,7 +485,7 @@ class ConversationManager:
             }
             
         finally:
-            conn.close()
+            self._release_connection(conn)
 
 
 if __name__ == '__main__':
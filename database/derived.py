@@ -0,0 +1,78 @@
+# derived.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 读数派生表的高水位同步
+glucose_episodes 和 cgm_prefix_index 由 CGMDatabase 写入读数时在同一事务内增量维护;
+其他写入方 (初始化/合成数据脚本、直接执行 SQL 的旧代码) 插入的读数不经过这条路径。
+derived_sync_state 记录派生表已覆盖的最大读数 id (高水位), 写入读数或读取派生表前
+发现有更新的读数时, 按用户从这些读数中最早的时间起重算, 再推进高水位
+"""
+import sqlite3
+from typing import Dict, Mapping, Optional
+
+from .episodes import refresh_episodes
+from .prefix_index import refresh_prefix_index
+
+
+# derived_sync_state 中读数高水位的名称
+READINGS_MARK = 'cgm_readings'
+
+
+def set_readings_mark(conn: sqlite3.Connection) -> None:
+    """把高水位设为当前最大读数 id (派生表刚按全部读数重建之后调用)"""
+    conn.execute(
+        """
+        INSERT INTO derived_sync_state (name, reading_id)
+        VALUES (?, (SELECT COALESCE(MAX(id), 0) FROM cgm_readings))
+        ON CONFLICT (name) DO UPDATE SET reading_id = excluded.reading_id
+        """,
+        (READINGS_MARK,)
+    )
+
+
+def derived_tables_lag(conn: sqlite3.Connection) -> bool:
+    """是否有高水位之后插入的读数 (两次主键查找, 读取派生表前调用)"""
+    mark = conn.execute(
+        "SELECT reading_id FROM derived_sync_state WHERE name = ?", (READINGS_MARK,)
+    ).fetchone()
+    latest = conn.execute("SELECT MAX(id) FROM cgm_readings").fetchone()[0]
+    return latest is not None and (mark is None or latest > mark[0])
+
+
+def catch_up_derived_tables(
+    conn: sqlite3.Connection,
+    refreshed: Optional[Mapping[str, int]] = None
+) -> Dict[str, int]:
+    """
+    重算高水位之后插入的读数所影响的事件和前缀和, 并推进高水位
+    (在调用方的写事务内执行, 由调用方提交)
+
+    Args:
+        conn: 数据库连接 (已持有写锁)
+        refreshed: 本事务已重算过的用户 -> 重算起点, 起点不晚于新读数时跳过
+
+    Returns:
+        补齐的用户 -> 其新读数的最早 timestamp_epoch (不含 refreshed 中已覆盖的用户)
+    """
+    refreshed = refreshed or {}
+    mark = conn.execute(
+        "SELECT reading_id FROM derived_sync_state WHERE name = ?", (READINGS_MARK,)
+    ).fetchone()
+    rows = conn.execute(
+        """
+        SELECT user_id, MIN(timestamp_epoch) FROM cgm_readings
+        WHERE id > ? AND timestamp_epoch IS NOT NULL
+        GROUP BY user_id
+        """,
+        (mark[0] if mark else 0,)
+    ).fetchall()
+
+    caught_up = {}
+    for user_id, since_epoch in rows:
+        if user_id in refreshed and refreshed[user_id] <= since_epoch:
+            continue
+        refresh_episodes(conn, user_id, since_epoch)
+        refresh_prefix_index(conn, user_id, since_epoch)
+        caught_up[user_id] = since_epoch
+    set_readings_mark(conn)
+    return caught_up
@@ -0,0 +1,170 @@
+# episodes.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 低血糖/高血糖事件提取
+对按时间排序的读数做一次游程编码 (O(n)), 把连续处于低血糖或高血糖范围的读数合并为事件,
+结果存入 glucose_episodes 表, 写入读数时只重算受影响的尾部
+"""
+import sqlite3
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# 事件类型及判定条件 (mg/dL)
+HYPO_THRESHOLD = 70     # 低于该值为低血糖
+HYPER_THRESHOLD = 180   # 高于该值为高血糖
+
+# 相邻两条读数间隔超过该秒数时事件中断 (传感器断连, 与模式识别时间网格的插值上限一致)
+MAX_EPISODE_GAP_SECONDS = 900
+
+# 每条读数代表的时长 (秒), 事件时长 = 首末读数间隔 + 一个读数周期
+READING_INTERVAL_SECONDS = 300
+
+EPISODE_COLUMNS = (
+    'episode_type', 'start_epoch', 'end_epoch', 'extreme_glucose', 'reading_count', 'glucose_sum'
+)
+
+
+def classify_glucose(glucose: int) -> Optional[str]:
+    """读数所属的事件类型; 处于目标范围内返回 None"""
+    if glucose < HYPO_THRESHOLD:
+        return 'hypo'
+    if glucose > HYPER_THRESHOLD:
+        return 'hyper'
+    return None
+
+
+def extract_episodes(rows: Iterable[Tuple[int, int]]) -> Iterator[Tuple]:
+    """
+    从读数中提取事件
+
+    Args:
+        rows: (timestamp_epoch, glucose_value), 按时间升序
+
+    Yields:
+        (episode_type, start_epoch, end_epoch, extreme_glucose, reading_count, glucose_sum),
+        extreme_glucose 对低血糖为最低值, 对高血糖为最高值; 单条读数也构成一个事件
+    """
+    current = None
+    for epoch, glucose in rows:
+        episode_type = classify_glucose(glucose)
+        if current is not None and (
+                episode_type != current[0] or epoch - current[2] > MAX_EPISODE_GAP_SECONDS):
+            yield tuple(current)
+            current = None
+        if episode_type is None:
+            continue
+        if current is None:
+            current = [episode_type, epoch, epoch, glucose, 1, glucose]
+        else:
+            current[2] = epoch
+            current[3] = min(current[3], glucose) if episode_type == 'hypo' else max(current[3], glucose)
+            current[4] += 1
+            current[5] += glucose
+    if current is not None:
+        yield tuple(current)
+
+
+def _insert_episodes(conn: sqlite3.Connection, user_id: str, episodes: Iterable[Tuple]) -> None:
+    conn.executemany(
+        f"""
+        INSERT INTO glucose_episodes (user_id, {', '.join(EPISODE_COLUMNS)})
+        VALUES (?, {', '.join('?' for _ in EPISODE_COLUMNS)})
+        """,
+        [(user_id,) + episode for episode in episodes]
+    )
+
+
+def rebuild_all_episodes(conn: sqlite3.Connection) -> int:
+    """
+    按原始读数重建所有用户的事件 (建表时回填), 一次顺序扫描
+
+    Returns:
+        写入的事件数
+    """
+    conn.execute("DELETE FROM glucose_episodes")
+    cursor = conn.execute(
+        """
+        SELECT user_id, timestamp_epoch, glucose_value
+        FROM cgm_readings
+        WHERE timestamp_epoch IS NOT NULL
+        ORDER BY user_id, timestamp_epoch, id
+        """
+    )
+    total = 0
+    for user_id, group in groupby(cursor, key=itemgetter(0)):
+        episodes = list(extract_episodes((row[1], row[2]) for row in group))
+        _insert_episodes(conn, user_id, episodes)
+        total += len(episodes)
+    return total
+
+
+def refresh_episodes(conn: sqlite3.Connection, user_id: str, since_epoch: int) -> None:
+    """
+    写入读数后重算用户自 since_epoch 起受影响的事件 (在写入读数的同一事务内调用)
+
+    结束时间距 since_epoch 不超过中断间隔的事件可能被新读数延长、拆分或修改,
+    删除它们并从其中最早的开始时间起重新提取; 更早的事件不受影响。
+    按时间顺序追加读数时只需重算最后一个事件和新读数
+
+    Args:
+        conn: 数据库连接
+        user_id: 用户ID
+        since_epoch: 本次写入的最早读数时间
+    """
+    row = conn.execute(
+        """
+        SELECT MIN(start_epoch) FROM glucose_episodes
+        WHERE user_id = ? AND end_epoch >= ?
+        """,
+        (user_id, since_epoch - MAX_EPISODE_GAP_SECONDS)
+    ).fetchone()
+    start = min(since_epoch, row[0]) if row[0] is not None else since_epoch
+
+    conn.execute(
+        "DELETE FROM glucose_episodes WHERE user_id = ? AND end_epoch >= ?",
+        (user_id, start)
+    )
+    rows = conn.execute(
+        """
+        SELECT timestamp_epoch, glucose_value FROM cgm_readings
+        WHERE user_id = ? AND timestamp_epoch >= ?
+        ORDER BY timestamp_epoch, id
+        """,
+        (user_id, start)
+    )
+    _insert_episodes(conn, user_id, extract_episodes(rows))
+
+
+def episode_duration_minutes(start_epoch: int, end_epoch: int) -> int:
+    """事件时长 (分钟)"""
+    return (end_epoch - start_epoch + READING_INTERVAL_SECONDS) // 60
+
+
+def summarize_episodes(episodes: List[Dict]) -> Dict[str, Dict]:
+    """
+    按事件类型汇总次数、总时长和极值
+
+    Args:
+        episodes: get_glucose_episodes 返回的事件列表
+
+    Returns:
+        {episode_type: {count, total_minutes, longest_minutes, extreme_glucose}}
+    """
+    summary: Dict[str, Dict] = {}
+    for episode in episodes:
+        item = summary.setdefault(episode['episode_type'], {
+            'count': 0, 'total_minutes': 0, 'longest_minutes': 0, 'extreme_glucose': None
+        })
+        item['count'] += 1
+        item['total_minutes'] += episode['duration_minutes']
+        item['longest_minutes'] = max(item['longest_minutes'], episode['duration_minutes'])
+        extreme = episode['extreme_glucose']
+        if item['extreme_glucose'] is None:
+            item['extreme_glucose'] = extreme
+        elif episode['episode_type'] == 'hypo':
+            item['extreme_glucose'] = min(item['extreme_glucose'], extreme)
+        else:
+            item['extreme_glucose'] = max(item['extreme_glucose'], extreme)
+    return summary
@@ -0,0 +1,77 @@
+# events.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 进程内数据变更事件
+写入读数、活动日志、用户信息和模式识别结果的事务提交后发布 (数据库, 用户, 变更类型),
+响应缓存失效等订阅方据此只处理受影响的用户。只在当前进程内传递, 其他进程的写入不会收到
+"""
+import os
+import threading
+from typing import Any, Callable, List, NamedTuple, Optional
+
+
+# 变更类型
+#   readings:      CGM 读数 (detail: 本次写入最早读数的 timestamp_epoch)
+#   alerts:        实时警报 (detail: 新触发的警报列表)
+#   activity_logs: 活动日志 (detail: 新日志)
+#   patterns:      模式识别结果
+#   user:          用户信息
+EVENT_KINDS = ('readings', 'alerts', 'activity_logs', 'patterns', 'user')
+
+
+class DataChange(NamedTuple):
+    """一次已提交的数据变更"""
+    db_path: str        # 数据库文件绝对路径
+    user_id: str
+    kind: str
+    detail: Any = None
+
+
+Subscriber = Callable[[DataChange], None]
+
+_subscribers: List[Subscriber] = []
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(callback: Subscriber) -> Callable[[], None]:
+    """
+    订阅数据变更事件; 回调在发布方线程内同步执行, 应尽快返回
+
+    Args:
+        callback: 接收 DataChange 的函数
+
+    Returns:
+        取消订阅的函数
+    """
+    with _subscribers_lock:
+        _subscribers.append(callback)
+
+    def unsubscribe() -> None:
+        with _subscribers_lock:
+            if callback in _subscribers:
+                _subscribers.remove(callback)
+
+    return unsubscribe
+
+
+def publish(db_path: str, user_id: str, kind: str, detail: Optional[Any] = None) -> None:
+    """
+    发布数据变更 (在写入事务提交之后调用); 订阅方抛出的异常只打印, 不影响写入方
+
+    Args:
+        db_path: 数据库文件路径
+        user_id: 受影响的用户ID
+        kind: 变更类型 (见 EVENT_KINDS)
+        detail: 变更内容,可选
+    """
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(EVENT_KINDS)}")
+    if not _subscribers:
+        return
+
+    event = DataChange(os.path.abspath(db_path), user_id, kind, detail)
+    for callback in list(_subscribers):
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"数据变更事件处理失败 ({kind}, {user_id}): {e}")
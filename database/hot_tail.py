@@ -0,0 +1,251 @@
+# hot_tail.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 最新读数热尾缓存
+进程内为每个用户保留最近 N 条读数的环形缓冲区, 仪表盘轮询最新值/最近读数时不再访问数据库
+"""
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+DEFAULT_TAIL_SIZE = int(os.getenv('CGM_HOT_TAIL_SIZE', '288'))       # 每个用户缓存的读数条数 (5 分钟间隔约 24 小时)
+DEFAULT_MAX_USERS = int(os.getenv('CGM_HOT_TAIL_MAX_USERS', '1024'))  # 最多缓存的用户数, 超出后淘汰最久未访问的用户
+DEFAULT_TTL = float(os.getenv('CGM_HOT_TAIL_TTL', '30'))              # 超过该秒数后读取前先核对一次读数版本号
+
+# 返回给调用方的读数字段 (与 SELECT * FROM cgm_readings 的列一致)
+READING_COLUMNS = ('id', 'user_id', 'timestamp', 'timestamp_epoch', 'glucose_value', 'created_at')
+
+
+class _UserTail:
+    """单个用户的定长环形缓冲区; 数值列使用紧凑数组, 时间字符串单独存放"""
+
+    __slots__ = ('user_id', 'capacity', 'ids', 'epochs', 'glucose', 'timestamps', 'created',
+                 'start', 'size', 'complete', 'synced_at', 'version')
+
+    def __init__(self, user_id: str, capacity: int, version: Optional[int] = None):
+        self.user_id = user_id
+        self.capacity = capacity
+        self.ids = array('q', bytes(8 * capacity))
+        self.epochs = array('q', bytes(8 * capacity))
+        self.glucose = array('i', bytes(4 * capacity))
+        self.timestamps: List[Optional[str]] = [None] * capacity
+        self.created: List[Optional[str]] = [None] * capacity
+        self.start = 0          # 最旧读数所在槽位
+        self.size = 0
+        self.complete = True    # 缓冲区是否包含该用户的全部读数 (从未发生淘汰)
+        self.synced_at = time.monotonic()
+        self.version = version  # 加载时用户的读数版本号 (database.versions)
+
+    def push(self, row: Dict) -> None:
+        """追加一条比现有读数都新的读数, 缓冲区满时覆盖最旧的一条"""
+        if self.size < self.capacity:
+            slot = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+            self.complete = False
+        self.ids[slot] = row['id']
+        self.epochs[slot] = row['timestamp_epoch']
+        self.glucose[slot] = row['glucose_value']
+        self.timestamps[slot] = row['timestamp']
+        self.created[slot] = row['created_at']
+
+    def last_epoch(self) -> Optional[int]:
+        if not self.size:
+            return None
+        return self.epochs[(self.start + self.size - 1) % self.capacity]
+
+    def ids_at_epoch(self, epoch: int) -> set:
+        """最新一秒内已缓存的读数ID (同一秒内可能有多条读数)"""
+        ids = set()
+        for offset in range(self.size - 1, -1, -1):
+            slot = (self.start + offset) % self.capacity
+            if self.epochs[slot] != epoch:
+                break
+            ids.add(self.ids[slot])
+        return ids
+
+    def newest(self, limit: int) -> List[Dict]:
+        """按时间从新到旧返回最近 limit 条读数"""
+        readings = []
+        for offset in range(self.size - 1, max(self.size - limit, 0) - 1, -1):
+            slot = (self.start + offset) % self.capacity
+            readings.append({
+                'id': self.ids[slot],
+                'user_id': self.user_id,
+                'timestamp': self.timestamps[slot],
+                'timestamp_epoch': self.epochs[slot],
+                'glucose_value': self.glucose[slot],
+                'created_at': self.created[slot],
+            })
+        return readings
+
+
+class HotTailCache:
+    """按用户的最新读数缓存, 内存上限为 max_users * capacity 条读数"""
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_TAIL_SIZE,
+        max_users: int = DEFAULT_MAX_USERS,
+        ttl: float = DEFAULT_TTL,
+    ):
+        """
+        初始化缓存
+
+        Args:
+            capacity: 每个用户缓存的读数条数
+            max_users: 最多缓存的用户数
+            ttl: 缓存同步有效期 (秒), 到期后核对读数版本号, 用于发现其他进程写入的读数
+        """
+        self.capacity = capacity
+        self.max_users = max_users
+        self.ttl = ttl
+        self._tails: "OrderedDict[str, _UserTail]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._tails
+
+    def is_stale(self, user_id: str) -> bool:
+        """用户未缓存或距上次同步已超过 ttl"""
+        tail = self._tails.get(user_id)
+        return tail is None or time.monotonic() - tail.synced_at > self.ttl
+
+    def get(self, user_id: str, limit: int) -> Optional[List[Dict]]:
+        """
+        读取最近 limit 条读数
+
+        Returns:
+            从新到旧的读数列表; 缓存无法完整回答时返回 None (调用方应回退到数据库)
+        """
+        with self._lock:
+            tail = self._tails.get(user_id)
+            if tail is None or (limit > tail.size and not tail.complete):
+                self.misses += 1
+                return None
+            self._tails.move_to_end(user_id)
+            self.hits += 1
+            return tail.newest(limit)
+
+    def revalidate(self, user_id: str, version: int) -> bool:
+        """
+        核对用户当前的读数版本号与加载时记录的是否一致; 一致时刷新同步时间
+
+        版本号变化可能是其他进程追加、补传历史数据或覆盖了已有读数, 增量追加无法区分,
+        返回 False 时调用方应重新 load
+
+        Args:
+            user_id: 用户ID
+            version: 数据库中用户当前的读数版本号
+
+        Returns:
+            缓存仍然有效时返回 True
+        """
+        with self._lock:
+            tail = self._tails.get(user_id)
+            if tail is None or tail.version != version:
+                return False
+            tail.synced_at = time.monotonic()
+            return True
+
+    def load(self, user_id: str, rows: Iterable[Dict], version: Optional[int] = None) -> None:
+        """
+        用数据库中最近的读数 (从新到旧, 最多 capacity 条) 重建用户缓存
+
+        Args:
+            user_id: 用户ID
+            rows: 从新到旧排列的读数
+            version: 读取读数之前用户的读数版本号, 供 revalidate 核对
+        """
+        rows = list(rows)
+        tail = _UserTail(user_id, self.capacity, version)
+        for row in reversed(rows):
+            tail.push(row)
+        # 取满 capacity 条说明数据库中可能还有更早的读数
+        tail.complete = len(rows) < self.capacity
+        with self._lock:
+            self._tails[user_id] = tail
+            self._tails.move_to_end(user_id)
+            while len(self._tails) > self.max_users:
+                self._tails.popitem(last=False)
+
+    def extend(self, user_id: str, rows: Iterable[Dict]) -> None:
+        """
+        追加比缓存中更新的读数 (从旧到新), 并刷新同步时间
+
+        不更新记录的版本号: 追加期间其他进程的写入不一定包含在 rows 中,
+        下次到期核对时会重新加载一次
+
+        Args:
+            user_id: 用户ID
+            rows: 从旧到新排列的读数; 已缓存的读数会被跳过
+        """
+        with self._lock:
+            tail = self._tails.get(user_id)
+            if tail is None:
+                return
+            last_epoch = tail.last_epoch()
+            seen = tail.ids_at_epoch(last_epoch) if last_epoch is not None else set()
+            for row in rows:
+                if last_epoch is not None and row['timestamp_epoch'] <= last_epoch and (
+                        row['timestamp_epoch'] < last_epoch or row['id'] in seen):
+                    continue
+                tail.push(row)
+            tail.synced_at = time.monotonic()
+
+    def last_epoch(self, user_id: str) -> Optional[int]:
+        """已缓存的最新读数时间; 用户未缓存或没有读数时返回 None"""
+        tail = self._tails.get(user_id)
+        return tail.last_epoch() if tail else None
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """丢弃某个用户 (或全部用户) 的缓存, 下次读取时从数据库重新加载"""
+        with self._lock:
+            if user_id is None:
+                self._tails.clear()
+            else:
+                self._tails.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        """缓存命中统计"""
+        return {
+            'users': len(self._tails),
+            'capacity': self.capacity,
+            'max_users': self.max_users,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# ============================================================
+# 进程级缓存注册表
+# ============================================================
+
+_caches: Dict[str, HotTailCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_hot_tail(db_path: str) -> HotTailCache:
+    """
+    获取数据库文件对应的进程级热尾缓存
+
+    Args:
+        db_path: 数据库文件路径
+
+    Returns:
+        缓存实例
+    """
+    key = os.path.abspath(db_path)
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(key, HotTailCache())
+    return cache
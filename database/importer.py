@@ -0,0 +1,253 @@
+# importer.py
+# -*- coding: utf-8 -*-
+"""
+CGM 设备导出文件导入工具
+流式解析 combined_*.json 这类 [{"value": float, "utc": str}, ...] 数组,
+无论文件多大内存占用都保持恒定, 校验后交给批量写入接口
+
+用法:
+    python -m database.importer combined_2025-10-24_to_2025-10-26.json --user-id user_001
+"""
+import argparse
+import json
+import math
+import re
+import sys
+import io
+import time
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+from .cgm_database import CGMDatabase, INGEST_CHUNK_SIZE, normalise_reading_timestamp
+
+# 设置 Windows 控制台输出编码
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+
+# 传感器可报告的血糖范围 (mg/dL), 超出的读数钳制到边界 (设备显示为 LOW / HIGH)
+SENSOR_GLUCOSE_RANGE = (40, 400)
+
+# 每次从文件读取的字符数
+READ_SIZE = 64 * 1024
+
+# 可能被缓冲区截断的记号尾部 (数字或 true/false/null 的一部分), 须延伸到缓冲区末尾
+_TOKEN_TAIL = re.compile(r'[\w.+-]*')
+
+
+def _may_be_truncated(error: json.JSONDecodeError, buffer: str) -> bool:
+    """解析错误是否可能只是元素被缓冲区截断 (读入更多后可能成功); 否则输入确实有误, 无需继续读取"""
+    if error.msg.startswith('Unterminated string'):
+        return True
+    if error.msg.startswith('Invalid \\uXXXX escape'):
+        return len(buffer) - error.pos < 6
+    return _TOKEN_TAIL.fullmatch(buffer, error.pos) is not None
+
+
+def iter_json_array(fp: TextIO, read_size: int = READ_SIZE) -> Iterator[Any]:
+    """
+    增量解析顶层 JSON 数组, 逐个产出数组元素
+
+    Args:
+        fp: 以文本模式打开的文件对象
+        read_size: 每次读取的字符数
+
+    Yields:
+        数组中的每个元素
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = fp.read(read_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("expected a JSON array")
+    pos += 1
+
+    expect_element = True
+    after_comma = False
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("unexpected end of JSON array")
+
+        char = buffer[pos]
+        if char == ']':
+            if after_comma:
+                raise ValueError(f"trailing comma in JSON array near position {pos}")
+            return
+        if char == ',' and not expect_element:
+            pos += 1
+            expect_element = True
+            after_comma = True
+            continue
+
+        # 只在元素或其后的分隔符到达缓冲区末尾时读入更多; 格式错误立即报错,
+        # 不会为报告一个错误把文件余下部分全部读入内存
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as error:
+                if eof or not _may_be_truncated(error, buffer) or not fill():
+                    raise
+                continue
+            # 元素之后必须紧跟 ',' 或 ']'; 到达缓冲区末尾的数字可能被截断, 读入更多后重新解析
+            delimiter = end
+            while delimiter < len(buffer) and buffer[delimiter].isspace():
+                delimiter += 1
+            if delimiter < len(buffer):
+                if buffer[delimiter] in ',]':
+                    break
+                number = isinstance(element, (int, float)) and not isinstance(element, bool)
+                if not number or _TOKEN_TAIL.fullmatch(buffer, end) is None:
+                    raise ValueError(f"malformed JSON array near position {end}")
+            if eof or not fill():
+                raise ValueError(f"malformed JSON array near position {end}")
+
+        pos = end
+        expect_element = False
+        after_comma = False
+        yield element
+
+
+def _clamp_glucose(value: Any) -> Optional[float]:
+    """将读数钳制到传感器范围; 非数值返回 None"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if math.isnan(value):
+        return None
+    low, high = SENSOR_GLUCOSE_RANGE
+    return min(max(value, low), high)
+
+
+def iter_export_readings(
+    fp: TextIO,
+    stats: Dict[str, int],
+    chunk_size: int = INGEST_CHUNK_SIZE
+) -> Iterator[Dict]:
+    """
+    将设备导出记录按块校验、钳制并转换为读数字典
+
+    Args:
+        fp: 导出文件
+        stats: 统计字典, 累加 parsed / clamped / rejected
+        chunk_size: 每块处理的记录数
+
+    Yields:
+        {'timestamp': 存储格式时间, 'glucose_value': 整数血糖值}
+    """
+    records = iter_json_array(fp)
+    while True:
+        chunk: List[Any] = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        stats['parsed'] += len(chunk)
+
+        for record in chunk:
+            if not isinstance(record, dict):
+                stats['rejected'] += 1
+                continue
+            raw_value = record.get('value')
+            value = _clamp_glucose(raw_value)
+            try:
+                timestamp = normalise_reading_timestamp(record.get('utc'))
+            except (TypeError, ValueError):
+                value = None
+            if value is None:
+                stats['rejected'] += 1
+                continue
+            if value != raw_value:
+                stats['clamped'] += 1
+            yield {'timestamp': timestamp, 'glucose_value': int(round(value))}
+
+
+def import_export_file(
+    path: str,
+    user_id: str,
+    db_path: Optional[str] = None,
+    chunk_size: int = INGEST_CHUNK_SIZE,
+    on_conflict: str = 'ignore'
+) -> Dict:
+    """
+    导入一个设备导出文件
+
+    Args:
+        path: 导出文件路径
+        user_id: 读数所属用户ID
+        db_path: 数据库文件路径
+        chunk_size: 每块处理/写入的记录数
+        on_conflict: 同一时间戳已有读数时的处理方式 ('ignore' 或 'update')
+
+    Returns:
+        导入统计 (解析/写入/重复/钳制/拒绝条数, 耗时和吞吐量)
+    """
+    stats = {'parsed': 0, 'clamped': 0, 'rejected': 0}
+    started = time.perf_counter()
+
+    with open(path, 'r', encoding='utf-8') as fp, CGMDatabase(db_path) as db:
+        result = db.add_cgm_readings_batch(
+            iter_export_readings(fp, stats, chunk_size),
+            user_id=user_id,
+            chunk_size=chunk_size,
+            on_conflict=on_conflict
+        )
+
+    elapsed = time.perf_counter() - started
+    return {
+        'user_id': user_id,
+        'parsed': stats['parsed'],
+        'inserted': result['inserted'],
+        'duplicates': result['duplicates'],
+        'clamped': stats['clamped'],
+        'rejected': stats['rejected'] + result['rejected'],
+        'elapsed_seconds': round(elapsed, 3),
+        'readings_per_second': round(stats['parsed'] / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='导入 CGM 设备导出的 JSON 文件')
+    parser.add_argument('files', nargs='+', help='导出文件路径')
+    parser.add_argument('--user-id', required=True, help='读数所属用户ID')
+    parser.add_argument('--db', dest='db_path', default=None, help='数据库文件路径 (默认使用 CGM_DB_PATH)')
+    parser.add_argument('--chunk-size', type=int, default=INGEST_CHUNK_SIZE, help='每块处理的记录数')
+    parser.add_argument('--on-conflict', choices=['ignore', 'update'], default='ignore',
+                        help='同一时间戳已有读数时忽略或覆盖')
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        print(f"正在导入: {path}")
+        summary = import_export_file(
+            path,
+            args.user_id,
+            db_path=args.db_path,
+            chunk_size=args.chunk_size,
+            on_conflict=args.on_conflict
+        )
+        print(f"  解析: {summary['parsed']} 条, 写入: {summary['inserted']} 条, "
+              f"重复: {summary['duplicates']} 条, 钳制: {summary['clamped']} 条, 拒绝: {summary['rejected']} 条")
+        print(f"  耗时: {summary['elapsed_seconds']:.3f} 秒, 吞吐量: {summary['readings_per_second']} 条/秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
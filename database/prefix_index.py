@@ -0,0 +1,293 @@
+# prefix_index.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 血糖前缀和索引
+按用户、按时间顺序保存读数的累计计数/和/平方和/各范围计数, 任意 [start, end) 窗口的
+均值、标准差、CV 和 TIR 由窗口两端的两次二分查找相减得到, 与窗口长度无关。
+持久化在 cgm_prefix_index 表 (写入读数时在同一事务内增量维护),
+查询时按用户加载到进程内缓存
+"""
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+
+DEFAULT_MAX_USERS = int(os.getenv('CGM_PREFIX_INDEX_MAX_USERS', '256'))  # 最多缓存的用户数, 超出后淘汰最久未访问的用户
+DEFAULT_TTL = float(os.getenv('CGM_PREFIX_INDEX_TTL', '30'))             # 超过该秒数后查询前先向数据库增量同步一次
+
+# 累计列及其对单条读数的取值表达式 ({g} 为血糖值)
+PREFIX_SUM_COLUMNS = {
+    'reading_count': '1',
+    'glucose_sum': '{g}',
+    'glucose_sum_sq': '{g} * {g}',
+    'below_70': '({g} < 70)',
+    'in_70_140': '({g} BETWEEN 70 AND 140)',
+    'in_70_180': '({g} BETWEEN 70 AND 180)',
+    'above_180': '({g} > 180)',
+}
+
+# 读数在索引中的顺序: 同一秒内的多条读数按ID排列
+_WINDOW = 'ORDER BY timestamp_epoch, id ROWS UNBOUNDED PRECEDING'
+
+
+def _cumulative_select(offsets: bool) -> str:
+    """按 _WINDOW 顺序计算累计列的 SELECT 列表; offsets 为 True 时每列加上一个起始值参数"""
+    prefix = '? + ' if offsets else ''
+    return ', '.join(
+        f"{prefix}SUM({expr.format(g='glucose_value')}) OVER w"
+        for expr in PREFIX_SUM_COLUMNS.values()
+    )
+
+
+def rebuild_prefix_index(conn: sqlite3.Connection) -> None:
+    """按原始读数重建所有用户的前缀和索引 (建表时回填), 一条窗口函数语句完成"""
+    conn.execute("DELETE FROM cgm_prefix_index")
+    conn.execute(
+        f"""
+        INSERT INTO cgm_prefix_index (user_id, timestamp_epoch, reading_id, {', '.join(PREFIX_SUM_COLUMNS)})
+        SELECT user_id, timestamp_epoch, id, {_cumulative_select(offsets=False)}
+        FROM cgm_readings
+        WHERE timestamp_epoch IS NOT NULL
+        WINDOW w AS (PARTITION BY user_id {_WINDOW})
+        """
+    )
+
+
+def prefix_before(conn: sqlite3.Connection, user_id: str, epoch: Optional[int]) -> Tuple[int, ...]:
+    """
+    早于 epoch 的全部读数的累计值 (一次主键查找)
+
+    Args:
+        conn: 数据库连接
+        user_id: 用户ID
+        epoch: 时间上限 (不含); None 表示全部读数
+
+    Returns:
+        与 PREFIX_SUM_COLUMNS 顺序一致的累计值, 没有读数时全为 0
+    """
+    query = f"SELECT {', '.join(PREFIX_SUM_COLUMNS)} FROM cgm_prefix_index WHERE user_id = ?"
+    params: list = [user_id]
+    if epoch is not None:
+        query += " AND timestamp_epoch < ?"
+        params.append(epoch)
+    query += " ORDER BY timestamp_epoch DESC, reading_id DESC LIMIT 1"
+    row = conn.execute(query, params).fetchone()
+    return tuple(row) if row else (0,) * len(PREFIX_SUM_COLUMNS)
+
+
+def window_totals(
+    conn: sqlite3.Connection,
+    user_id: str,
+    start_epoch: Optional[int],
+    end_epoch: Optional[int]
+) -> Dict[str, int]:
+    """
+    直接在持久化索引上计算 [start_epoch, end_epoch) 窗口内的计数与求和 (两次主键查找)
+
+    Returns:
+        PREFIX_SUM_COLUMNS 各列在窗口内的合计
+    """
+    hi = prefix_before(conn, user_id, end_epoch)
+    lo = prefix_before(conn, user_id, start_epoch) if start_epoch is not None else (0,) * len(hi)
+    return {name: max(h - l, 0) for name, h, l in zip(PREFIX_SUM_COLUMNS, hi, lo)}
+
+
+def refresh_prefix_index(conn: sqlite3.Connection, user_id: str, since_epoch: int) -> None:
+    """
+    写入读数后重算用户自 since_epoch 起的累计值 (在写入读数的同一事务内调用)
+
+    since_epoch 之前的条目不受影响; 按时间顺序追加读数时只需写入新读数的条目,
+    补传历史数据时重写其后的全部条目
+
+    Args:
+        conn: 数据库连接
+        user_id: 用户ID
+        since_epoch: 本次写入的最早读数时间
+    """
+    base = prefix_before(conn, user_id, since_epoch)
+    conn.execute(
+        "DELETE FROM cgm_prefix_index WHERE user_id = ? AND timestamp_epoch >= ?",
+        (user_id, since_epoch)
+    )
+    conn.execute(
+        f"""
+        INSERT INTO cgm_prefix_index (user_id, timestamp_epoch, reading_id, {', '.join(PREFIX_SUM_COLUMNS)})
+        SELECT user_id, timestamp_epoch, id, {_cumulative_select(offsets=True)}
+        FROM cgm_readings
+        WHERE user_id = ? AND timestamp_epoch >= ?
+        WINDOW w AS ({_WINDOW})
+        """,
+        base + (user_id, since_epoch)
+    )
+
+
+# ============================================================
+# 进程内缓存
+# ============================================================
+
+class _UserPrefix:
+    """单个用户的前缀和数组; 第 i 项为前 i+1 条读数的累计值"""
+
+    __slots__ = ('epochs', 'ids', 'columns', 'synced_at')
+
+    def __init__(self):
+        self.epochs = array('q')
+        self.ids = array('q')
+        self.columns = [array('q') for _ in PREFIX_SUM_COLUMNS]
+        self.synced_at = time.monotonic()
+
+    def append(self, row: Sequence[int]) -> None:
+        """追加一个索引条目 (timestamp_epoch, reading_id, 累计值...)"""
+        self.epochs.append(row[0])
+        self.ids.append(row[1])
+        for column, value in zip(self.columns, row[2:]):
+            column.append(value)
+
+    def last(self) -> Optional[Tuple[int, ...]]:
+        if not self.epochs:
+            return None
+        return (self.epochs[-1], self.ids[-1]) + tuple(column[-1] for column in self.columns)
+
+    def totals(self, start_epoch: Optional[int], end_epoch: Optional[int]) -> Dict[str, int]:
+        # lo / hi: 早于窗口开始 / 结束的读数条数
+        lo = 0 if start_epoch is None else bisect_left(self.epochs, start_epoch)
+        hi = len(self.epochs) if end_epoch is None else max(bisect_left(self.epochs, end_epoch), lo)
+        return {
+            name: (column[hi - 1] if hi else 0) - (column[lo - 1] if lo else 0)
+            for name, column in zip(PREFIX_SUM_COLUMNS, self.columns)
+        }
+
+
+class PrefixIndexCache:
+    """按用户的前缀和索引缓存, 每条读数占用 (2 + 累计列数) * 8 字节"""
+
+    def __init__(self, max_users: int = DEFAULT_MAX_USERS, ttl: float = DEFAULT_TTL):
+        """
+        初始化缓存
+
+        Args:
+            max_users: 最多缓存的用户数
+            ttl: 缓存同步有效期 (秒), 用于发现其他进程写入的读数
+        """
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users: "OrderedDict[str, _UserPrefix]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def is_stale(self, user_id: str) -> bool:
+        """用户未缓存或距上次同步已超过 ttl"""
+        entry = self._users.get(user_id)
+        return entry is None or time.monotonic() - entry.synced_at > self.ttl
+
+    def totals(
+        self,
+        user_id: str,
+        start_epoch: Optional[int] = None,
+        end_epoch: Optional[int] = None
+    ) -> Optional[Dict[str, int]]:
+        """
+        [start_epoch, end_epoch) 窗口内的计数与求和
+
+        Returns:
+            PREFIX_SUM_COLUMNS 各列在窗口内的合计; 用户未缓存时返回 None
+        """
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return entry.totals(start_epoch, end_epoch)
+
+    def load(self, user_id: str, rows: Iterable[Sequence[int]]) -> None:
+        """
+        用数据库中该用户的全部索引条目 (按时间升序) 重建缓存
+
+        Args:
+            user_id: 用户ID
+            rows: (timestamp_epoch, reading_id, 累计值...) 按时间升序
+        """
+        entry = _UserPrefix()
+        for row in rows:
+            entry.append(row)
+        with self._lock:
+            self._users[user_id] = entry
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def extend(self, user_id: str, rows: Iterable[Sequence[int]]) -> None:
+        """
+        追加晚于缓存中最后一条的索引条目, 并刷新同步时间
+
+        Args:
+            user_id: 用户ID
+            rows: (timestamp_epoch, reading_id, 累计值...) 按时间升序
+        """
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            for row in rows:
+                entry.append(row)
+            entry.synced_at = time.monotonic()
+
+    def last(self, user_id: str) -> Optional[Tuple[int, ...]]:
+        """已缓存的最后一个索引条目; 用户未缓存或没有读数时返回 None"""
+        entry = self._users.get(user_id)
+        return entry.last() if entry else None
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """丢弃某个用户 (或全部用户) 的缓存, 下次查询时从数据库重新加载"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        """缓存命中统计"""
+        return {
+            'users': len(self._users),
+            'readings': sum(len(entry.epochs) for entry in self._users.values()),
+            'max_users': self.max_users,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# ============================================================
+# 进程级缓存注册表
+# ============================================================
+
+_caches: Dict[str, PrefixIndexCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_prefix_cache(db_path: str) -> PrefixIndexCache:
+    """
+    获取数据库文件对应的进程级前缀和索引缓存
+
+    Args:
+        db_path: 数据库文件路径
+
+    Returns:
+        缓存实例
+    """
+    key = os.path.abspath(db_path)
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(key, PrefixIndexCache())
+    return cache
@@ -0,0 +1,704 @@
+# schema.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 数据库结构引导
+所有幂等的建表/迁移步骤集中在这里, 由连接池在进程内首次打开某个数据库时执行一次,
+不再在每次建立连接时重复执行 DDL; 整个引导在一个 BEGIN IMMEDIATE 事务内完成,
+多个进程同时启动时只有第一个执行回填和 ALTER
+"""
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from .derived import set_readings_mark
+from .episodes import rebuild_all_episodes, refresh_episodes
+from .prefix_index import PREFIX_SUM_COLUMNS, rebuild_prefix_index, refresh_prefix_index
+from .versions import bump_data_versions
+
+
+def _table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
+    """检查表是否存在"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (table_name,)
+    ).fetchone()
+    return row is not None
+
+
+def _index_exists(conn: sqlite3.Connection, index_name: str) -> bool:
+    """检查索引是否存在"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+        (index_name,)
+    ).fetchone()
+    return row is not None
+
+
+def _column_exists(conn: sqlite3.Connection, table_name: str, column_name: str) -> bool:
+    """检查表中是否存在某列"""
+    return any(row[1] == column_name for row in conn.execute(f"PRAGMA table_info({table_name})"))
+
+
+def ensure_activity_logs_table(conn: sqlite3.Connection) -> None:
+    """创建活动日志表(如不存在)"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS activity_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            title TEXT NOT NULL,
+            note TEXT,
+            timestamp_utc TEXT NOT NULL,
+            day_utc TEXT NOT NULL,
+            minutes_of_day_utc INTEGER NOT NULL,
+            medication_name TEXT,
+            dose TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_activity_logs_user_day
+        ON activity_logs (user_id, day_utc, timestamp_utc DESC)
+        """
+    )
+
+
+def ensure_user_patterns_table(conn: sqlite3.Connection) -> None:
+    """
+    创建模式识别结果表(如不存在)
+    每行是某用户某种模式的一个持续出现区间: detected_at 为最近一次检出时间,
+    连续运行中再次检出时更新同一行, 未再检出时区间结束 (is_active = 0);
+    occurrence_count 为区间内的出现次数, 只在距上次检出超过 PATTERN_RECURRENCE_GAP_HOURS 后再次检出时增加
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_patterns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            pattern_type TEXT NOT NULL,
+            pattern_name TEXT NOT NULL,
+            description TEXT,
+            severity TEXT,
+            confidence REAL,
+            details TEXT,
+            detected_at TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            first_detected_at TEXT,
+            occurrence_count INTEGER NOT NULL DEFAULT 1,
+            is_active INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+        """
+    )
+    if not _column_exists(conn, 'user_patterns', 'occurrence_count'):
+        compacted = compact_user_patterns(conn)
+        if compacted:
+            print(f"[迁移] 已将 {compacted} 条重复模式记录合并为持续出现区间")
+    # 每个用户每种模式最多一个进行中的区间, 识别结果按该索引 UPSERT
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_user_patterns_active
+        ON user_patterns (user_id, pattern_type) WHERE is_active = 1
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_patterns_user_detected
+        ON user_patterns (user_id, detected_at DESC)
+        """
+    )
+
+
+# 模式严重程度由低到高; 合并区间时保留最高的严重程度
+SEVERITY_LEVELS = ('low', 'medium', 'high')
+
+# 同一模式两次检出间隔超过该小时数视为新的一次出现 (全量扫描每 4 小时运行一次);
+# 迁移旧记录时据此划分区间
+PATTERN_RECURRENCE_GAP_HOURS = 6
+
+# 迁移旧记录时, 与用户最近一次检出相差不超过该秒数视为同一次运行 (区间仍在进行中)
+LEGACY_RUN_TOLERANCE_SECONDS = 60
+
+
+def severity_rank_sql(column: str) -> str:
+    """严重程度的可比较数值 (SQL 表达式), 未知取值为 0"""
+    cases = ' '.join(f"WHEN '{level}' THEN {rank}" for rank, level in enumerate(SEVERITY_LEVELS, 1))
+    return f"(CASE {column} {cases} ELSE 0 END)"
+
+
+def severity_level_sql(rank_expression: str) -> str:
+    """severity_rank_sql 的逆映射 (SQL 表达式), 例如用于 MAX(排名) 取回严重程度"""
+    cases = ' '.join(f"WHEN {rank} THEN '{level}'" for rank, level in enumerate(SEVERITY_LEVELS, 1))
+    return f"(CASE {rank_expression} {cases} END)"
+
+
+def _severity_rank(level: str) -> int:
+    """严重程度的可比较数值, 与 severity_rank_sql 一致"""
+    return SEVERITY_LEVELS.index(level) + 1 if level in SEVERITY_LEVELS else 0
+
+
+def compact_user_patterns(conn: sqlite3.Connection) -> int:
+    """
+    为 user_patterns 增加区间列, 并把旧版本每次运行插入一行的历史记录合并为持续出现区间:
+    同一用户同一模式连续检出的记录合并为一行 (保留最后一次检出的内容,
+    记录首次检出时间和最高严重程度, 出现次数为 1), 只有出现在用户最近一次运行中的区间保持进行中
+
+    Returns:
+        合并删除的记录数
+    """
+    conn.execute("ALTER TABLE user_patterns ADD COLUMN first_detected_at TEXT")
+    conn.execute("ALTER TABLE user_patterns ADD COLUMN occurrence_count INTEGER NOT NULL DEFAULT 1")
+    conn.execute("ALTER TABLE user_patterns ADD COLUMN is_active INTEGER NOT NULL DEFAULT 1")
+
+    rows = conn.execute(
+        """
+        SELECT id, user_id, pattern_type, severity, detected_at
+        FROM user_patterns
+        ORDER BY user_id, pattern_type, detected_at, id
+        """
+    ).fetchall()
+
+    latest_run: Dict[str, datetime] = {}
+    episodes: List[Dict] = []
+    for row_id, user_id, pattern_type, severity, detected_at in rows:
+        detected = datetime.fromisoformat(detected_at)
+        latest_run[user_id] = max(latest_run.get(user_id, detected), detected)
+        episode = episodes[-1] if episodes else None
+        if (episode is None or episode['key'] != (user_id, pattern_type)
+                or detected - episode['last'] > timedelta(hours=PATTERN_RECURRENCE_GAP_HOURS)):
+            episode = {'key': (user_id, pattern_type), 'first': detected, 'first_text': detected_at,
+                       'ids': [], 'severities': []}
+            episodes.append(episode)
+        episode['ids'].append(row_id)
+        episode['severities'].append(severity)
+        episode['last'] = detected
+
+    updates = []
+    merged_ids = []
+    for episode in episodes:
+        user_id = episode['key'][0]
+        active = latest_run[user_id] - episode['last'] <= timedelta(seconds=LEGACY_RUN_TOLERANCE_SECONDS)
+        severity = max(episode['severities'], key=_severity_rank)
+        # 同一模式最近一个区间之后不会再有区间, 因此每个用户每种模式至多一个进行中
+        updates.append((episode['first_text'], 1, severity, int(active), episode['ids'][-1]))
+        merged_ids.extend((row_id,) for row_id in episode['ids'][:-1])
+
+    conn.executemany(
+        """
+        UPDATE user_patterns
+        SET first_detected_at = ?, occurrence_count = ?, severity = ?, is_active = ?
+        WHERE id = ?
+        """,
+        updates
+    )
+    conn.executemany("DELETE FROM user_patterns WHERE id = ?", merged_ids)
+    return len(merged_ids)
+
+
+def ensure_pattern_detector_state_table(conn: sqlite3.Connection) -> None:
+    """创建增量模式识别的每用户检测器状态表(如不存在); state 为 JSON"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pattern_detector_state (
+            user_id TEXT PRIMARY KEY,
+            window_hours INTEGER NOT NULL,
+            last_epoch INTEGER,
+            reading_count INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+        """
+    )
+
+
+def ensure_pattern_dirty_users_table(conn: sqlite3.Connection) -> None:
+    """创建待重新识别模式的用户队列表(如不存在); 写入读数时标记, 由事件驱动调度器消费"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pattern_dirty_users (
+            user_id TEXT PRIMARY KEY,
+            first_marked_at INTEGER NOT NULL,
+            last_marked_at INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def ensure_detector_metrics_table(conn: sqlite3.Connection) -> None:
+    """创建模式检测器运行指标表(如不存在); 每次调度运行每个检测器一行"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS detector_metrics (
+            run_at TEXT NOT NULL,
+            detector TEXT NOT NULL,
+            engine TEXT NOT NULL,
+            calls INTEGER NOT NULL,
+            skipped INTEGER NOT NULL,
+            hits INTEGER NOT NULL,
+            errors INTEGER NOT NULL,
+            total_seconds REAL NOT NULL,
+            max_seconds REAL NOT NULL,
+            input_readings INTEGER NOT NULL,
+            last_error TEXT,
+            PRIMARY KEY (run_at, detector)
+        )
+        """
+    )
+
+
+def ensure_alerts_table(conn: sqlite3.Connection) -> None:
+    """创建实时血糖警报表(如不存在); 由 CGMDatabase 写入读数时在同一事务内写入 (见 alerts.AlertEngine)"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            alert_type TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            reading_epoch INTEGER NOT NULL,
+            glucose_value INTEGER NOT NULL,
+            rate_per_minute REAL,
+            predicted_glucose INTEGER,
+            nocturnal INTEGER NOT NULL DEFAULT 0,
+            message TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            UNIQUE (user_id, alert_type, reading_epoch)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_alerts_user_reading
+        ON alerts (user_id, reading_epoch)
+        """
+    )
+
+
+def ensure_data_versions_table(conn: sqlite3.Connection) -> None:
+    """
+    创建用户数据版本号表(如不存在); 由写入方在同一事务内更新 (见 versions.bump_data_versions)
+
+    全局的 Pattern-Action 映射表没有统一的写入入口, 由触发器维护其版本号
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS user_data_versions (
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind)
+        ) WITHOUT ROWID
+        """
+    )
+    if not _table_exists(conn, 'cgm_pattern_actions'):
+        return
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_pattern_actions_version_{event.lower()}
+            AFTER {event} ON cgm_pattern_actions
+            BEGIN
+                INSERT INTO user_data_versions (user_id, kind, version)
+                VALUES ('', 'pattern_actions', CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))
+                ON CONFLICT (user_id, kind) DO UPDATE SET version = MAX(version + 1, excluded.version);
+            END
+            """
+        )
+
+
+def ensure_glucose_episodes_table(conn: sqlite3.Connection) -> bool:
+    """
+    创建低血糖/高血糖事件表(如不存在), 首次创建时从原始读数回填
+    由 CGMDatabase 写入读数时在同一事务内增量维护 (见 episodes.refresh_episodes),
+    其他写入方插入的读数按高水位补齐 (见 derived.py)
+
+    Returns:
+        本次是否新建并回填
+    """
+    if not _table_exists(conn, 'cgm_readings'):
+        return False
+
+    created = not _table_exists(conn, 'glucose_episodes')
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS glucose_episodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            episode_type TEXT NOT NULL,
+            start_epoch INTEGER NOT NULL,
+            end_epoch INTEGER NOT NULL,
+            extreme_glucose INTEGER NOT NULL,
+            reading_count INTEGER NOT NULL,
+            glucose_sum INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_glucose_episodes_user_end
+        ON glucose_episodes (user_id, end_epoch)
+        """
+    )
+    if created:
+        rebuild_all_episodes(conn)
+    return created
+
+
+def ensure_prefix_index_table(conn: sqlite3.Connection) -> bool:
+    """
+    创建血糖前缀和索引表(如不存在), 首次创建时从原始读数回填
+    由 CGMDatabase 写入读数时在同一事务内增量维护 (见 prefix_index.refresh_prefix_index),
+    其他写入方插入的读数按高水位补齐 (见 derived.py)
+
+    Returns:
+        本次是否新建并回填
+    """
+    if not _table_exists(conn, 'cgm_readings'):
+        return False
+
+    created = not _table_exists(conn, 'cgm_prefix_index')
+    columns = ',\n            '.join(f"{column} INTEGER NOT NULL" for column in PREFIX_SUM_COLUMNS)
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS cgm_prefix_index (
+            user_id TEXT NOT NULL,
+            timestamp_epoch INTEGER NOT NULL,
+            reading_id INTEGER NOT NULL,
+            {columns},
+            PRIMARY KEY (user_id, timestamp_epoch, reading_id)
+        ) WITHOUT ROWID
+        """
+    )
+    if created:
+        rebuild_prefix_index(conn)
+    return created
+
+
+def ensure_derived_sync_table(conn: sqlite3.Connection, backfilled: bool) -> None:
+    """
+    创建派生表高水位表(如不存在)
+    新建时派生表覆盖到哪条读数未知 (旧版本只在 CGMDatabase 写入时维护), 未刚刚回填时重建一次
+
+    Args:
+        conn: 数据库连接
+        backfilled: 事件表和前缀和索引本次都已按全部读数回填
+    """
+    if not _table_exists(conn, 'cgm_readings'):
+        return
+
+    created = not _table_exists(conn, 'derived_sync_state')
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS derived_sync_state (
+            name TEXT PRIMARY KEY,
+            reading_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    if created:
+        if not backfilled:
+            rebuild_all_episodes(conn)
+            rebuild_prefix_index(conn)
+        set_readings_mark(conn)
+
+
+def _index_is_unique(conn: sqlite3.Connection, table_name: str, index_name: str) -> bool:
+    """检查表上的索引是否存在且为唯一索引"""
+    return any(
+        row[1] == index_name and row[2]
+        for row in conn.execute(f"PRAGMA index_list({table_name})")
+    )
+
+
+def ensure_unique_reading_key(conn: sqlite3.Connection) -> int:
+    """
+    将 cgm_readings 的 (user_id, timestamp_epoch) 索引改为唯一索引
+    旧数据的 timestamp 保存的是调用方传入的原始字符串 ('...Z'、'+00:00'、毫秒等写法),
+    同一时刻的读数字符串不同, 只能按整数时间判重: 建索引前删除重复读数 (每组保留 id 最小的一条),
+    重算受影响用户的派生表, 并删除旧的 (user_id, timestamp) 索引
+    (需在 ensure_timestamp_epoch_column 之后调用)
+
+    Returns:
+        删除的重复读数条数
+    """
+    if not _table_exists(conn, 'cgm_readings') or _index_is_unique(conn, 'cgm_readings', 'idx_cgm_readings_user_epoch'):
+        return 0
+
+    affected = conn.execute(
+        """
+        SELECT user_id, MIN(timestamp_epoch) FROM (
+            SELECT user_id, timestamp_epoch FROM cgm_readings
+            WHERE timestamp_epoch IS NOT NULL
+            GROUP BY user_id, timestamp_epoch HAVING COUNT(*) > 1
+        )
+        GROUP BY user_id
+        """
+    ).fetchall()
+    cursor = conn.execute(
+        """
+        DELETE FROM cgm_readings
+        WHERE timestamp_epoch IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM cgm_readings
+            WHERE timestamp_epoch IS NOT NULL
+            GROUP BY user_id, timestamp_epoch
+        )
+        """
+    )
+    removed = cursor.rowcount
+    conn.execute("DROP INDEX IF EXISTS idx_cgm_readings_user_epoch")
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX idx_cgm_readings_user_epoch
+        ON cgm_readings (user_id, timestamp_epoch)
+        """
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_cgm_readings_user_timestamp")
+    conn.execute("DROP INDEX IF EXISTS idx_user_timestamp")
+
+    # 汇总表由删除触发器维护; 已存在的事件表和前缀和索引从最早的重复读数起重算
+    for user_id, since_epoch in affected:
+        if _table_exists(conn, 'glucose_episodes'):
+            refresh_episodes(conn, user_id, since_epoch)
+        if _table_exists(conn, 'cgm_prefix_index'):
+            refresh_prefix_index(conn, user_id, since_epoch)
+    if affected:
+        bump_data_versions(conn, [user_id for user_id, _ in affected], 'readings')
+    return removed
+
+
+def ensure_timestamp_epoch_column(conn: sqlite3.Connection) -> None:
+    """
+    为 cgm_readings 增加整数时间列 timestamp_epoch (无时区时间按 UTC 解释的 Unix 秒)
+    范围查询比较整数而不是 ISO 字符串; 新增列时回填已有读数,
+    并用触发器兜底保证其他写入方 (未显式写入该列) 也能保持同步
+    """
+    if not _table_exists(conn, 'cgm_readings'):
+        return
+
+    if not _column_exists(conn, 'cgm_readings', 'timestamp_epoch'):
+        conn.execute("ALTER TABLE cgm_readings ADD COLUMN timestamp_epoch INTEGER")
+        conn.execute(
+            """
+            UPDATE cgm_readings
+            SET timestamp_epoch = CAST(strftime('%s', timestamp) AS INTEGER)
+            WHERE timestamp_epoch IS NULL
+            """
+        )
+
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_cgm_readings_user_epoch
+        ON cgm_readings (user_id, timestamp_epoch)
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_cgm_readings_epoch_insert
+        AFTER INSERT ON cgm_readings
+        WHEN NEW.timestamp_epoch IS NULL
+        BEGIN
+            UPDATE cgm_readings
+            SET timestamp_epoch = CAST(strftime('%s', NEW.timestamp) AS INTEGER)
+            WHERE id = NEW.id;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_cgm_readings_epoch_update
+        AFTER UPDATE OF timestamp ON cgm_readings
+        BEGIN
+            UPDATE cgm_readings
+            SET timestamp_epoch = CAST(strftime('%s', NEW.timestamp) AS INTEGER)
+            WHERE id = NEW.id;
+        END
+        """
+    )
+
+
+# 汇总表及其桶宽 (秒); 桶以 timestamp_epoch 对齐 (与读数时间的整点/零点一致)
+ROLLUP_TABLES = {
+    'cgm_rollups_hourly': 3600,
+    'cgm_rollups_daily': 86400,
+}
+
+# 汇总表中的计数/求和列及其对单条读数的取值表达式 ({g} 为血糖值)
+ROLLUP_SUM_COLUMNS = {
+    'reading_count': '1',
+    'glucose_sum': '{g}',
+    'glucose_sum_sq': '{g} * {g}',
+    'below_54': '({g} < 54)',
+    'below_70': '({g} < 70)',
+    'in_70_140': '({g} BETWEEN 70 AND 140)',
+    'in_70_180': '({g} BETWEEN 70 AND 180)',
+    'above_180': '({g} > 180)',
+    'above_250': '({g} > 250)',
+}
+
+
+def _rollup_add_sql(table: str, bucket_size: int) -> str:
+    """触发器语句: 把 NEW 读数累加进汇总桶"""
+    columns = list(ROLLUP_SUM_COLUMNS)
+    values = [expr.format(g='NEW.glucose_value') for expr in ROLLUP_SUM_COLUMNS.values()]
+    updates = [f"{column} = {column} + excluded.{column}" for column in columns]
+    return f"""
+            INSERT INTO {table} (user_id, bucket_epoch, {', '.join(columns)}, glucose_min, glucose_max)
+            VALUES (
+                NEW.user_id,
+                NEW.timestamp_epoch - (NEW.timestamp_epoch % {bucket_size}),
+                {', '.join(values)},
+                NEW.glucose_value,
+                NEW.glucose_value
+            )
+            ON CONFLICT (user_id, bucket_epoch) DO UPDATE SET
+                {', '.join(updates)},
+                glucose_min = MIN(glucose_min, excluded.glucose_min),
+                glucose_max = MAX(glucose_max, excluded.glucose_max);"""
+
+
+def _rollup_remove_sql(table: str, bucket_size: int) -> str:
+    """触发器语句: 从汇总桶中扣除 OLD 读数, 并按原始读数重算该桶的最值"""
+    bucket = f"OLD.timestamp_epoch - (OLD.timestamp_epoch % {bucket_size})"
+    updates = [
+        f"{column} = {column} - {expr.format(g='OLD.glucose_value')}"
+        for column, expr in ROLLUP_SUM_COLUMNS.items()
+    ]
+    raw_range = (
+        f"FROM cgm_readings WHERE user_id = OLD.user_id "
+        f"AND timestamp_epoch >= {table}.bucket_epoch AND timestamp_epoch < {table}.bucket_epoch + {bucket_size}"
+    )
+    return f"""
+            UPDATE {table} SET
+                {', '.join(updates)}
+            WHERE user_id = OLD.user_id AND bucket_epoch = {bucket};
+            DELETE FROM {table}
+            WHERE user_id = OLD.user_id AND bucket_epoch = {bucket} AND reading_count <= 0;
+            UPDATE {table} SET
+                glucose_min = (SELECT MIN(glucose_value) {raw_range}),
+                glucose_max = (SELECT MAX(glucose_value) {raw_range})
+            WHERE user_id = OLD.user_id AND bucket_epoch = {bucket};"""
+
+
+def ensure_rollup_tables(conn: sqlite3.Connection) -> None:
+    """
+    创建按用户的小时/日汇总表 (计数、和、平方和、最值及各阈值计数)
+    由 cgm_readings 上的触发器在写入读数的同一事务内增量维护;
+    首次创建时从原始读数回填
+    """
+    if not _table_exists(conn, 'cgm_readings'):
+        return
+
+    sum_columns = ',\n                '.join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in ROLLUP_SUM_COLUMNS)
+    for table, bucket_size in ROLLUP_TABLES.items():
+        created = not _table_exists(conn, table)
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id TEXT NOT NULL,
+                bucket_epoch INTEGER NOT NULL,
+                {sum_columns},
+                glucose_min INTEGER,
+                glucose_max INTEGER,
+                PRIMARY KEY (user_id, bucket_epoch)
+            ) WITHOUT ROWID
+            """
+        )
+        if created:
+            sums = ', '.join(f"SUM({expr.format(g='glucose_value')})" for expr in ROLLUP_SUM_COLUMNS.values())
+            conn.execute(
+                f"""
+                INSERT INTO {table} (user_id, bucket_epoch, {', '.join(ROLLUP_SUM_COLUMNS)}, glucose_min, glucose_max)
+                SELECT
+                    user_id,
+                    timestamp_epoch - (timestamp_epoch % {bucket_size}) AS bucket,
+                    {sums},
+                    MIN(glucose_value),
+                    MAX(glucose_value)
+                FROM cgm_readings
+                WHERE timestamp_epoch IS NOT NULL
+                GROUP BY user_id, bucket
+                """
+            )
+
+    add_statements = ''.join(_rollup_add_sql(table, size) for table, size in ROLLUP_TABLES.items())
+    remove_statements = ''.join(_rollup_remove_sql(table, size) for table, size in ROLLUP_TABLES.items())
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cgm_readings_rollup_insert
+        AFTER INSERT ON cgm_readings
+        WHEN NEW.timestamp_epoch IS NOT NULL
+        BEGIN{add_statements}
+        END
+        """
+    )
+    # timestamp_epoch 由触发器回填 (OLD 为 NULL) 或读数被覆盖更新时, 先扣除旧值再累加新值
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cgm_readings_rollup_update
+        AFTER UPDATE OF timestamp_epoch, glucose_value ON cgm_readings
+        WHEN NEW.timestamp_epoch IS NOT NULL
+        BEGIN{remove_statements}{add_statements}
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cgm_readings_rollup_delete
+        AFTER DELETE ON cgm_readings
+        BEGIN{remove_statements}
+        END
+        """
+    )
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """
+    执行所有幂等的建表/迁移步骤
+
+    Args:
+        conn: 可写的数据库连接
+    """
+    # 先取得写锁再检查结构: 并发引导的其他进程在此等待, 之后看到的是已迁移的结构
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        _ensure_schema(conn)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    ensure_activity_logs_table(conn)
+    ensure_user_patterns_table(conn)
+    ensure_pattern_detector_state_table(conn)
+    ensure_pattern_dirty_users_table(conn)
+    ensure_detector_metrics_table(conn)
+    ensure_alerts_table(conn)
+    ensure_data_versions_table(conn)
+    ensure_timestamp_epoch_column(conn)
+    removed = ensure_unique_reading_key(conn)
+    if removed:
+        print(f"[迁移] 已删除 {removed} 条重复 CGM 读数")
+    ensure_rollup_tables(conn)
+    episodes_backfilled = ensure_glucose_episodes_table(conn)
+    prefix_backfilled = ensure_prefix_index_table(conn)
+    ensure_derived_sync_table(conn, episodes_backfilled and prefix_backfilled)
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), 'cgm_butler.db')
+    connection = sqlite3.connect(db_path)
+    try:
+        ensure_schema(connection)
+        print(f"[完成] 数据库结构已更新: {db_path}")
+    finally:
+        connection.close()
@@ -2,21 +2,20 @@
 # -*- coding: utf-8 -*-
 import sqlite3
 from datetime import datetime, timedelta
-import random
 import sys
 import io
 
+try:
+    from .synthetic import generate_readings
+except ImportError:  # 作为脚本运行: python database/setup_database.py
+    from synthetic import generate_readings
+
 # 设置 Windows 控制台输出编码
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-def create_database():
-    """创建 CGM Butler 数据库并填充初始数据"""
-    conn = sqlite3.connect('cgm_butler.db')
-    cursor = conn.cursor()
-    
-    print("正在创建数据库表...")
-    
+def create_tables(cursor: sqlite3.Cursor) -> None:
+    """创建用户、CGM 读数和 Pattern-Action 映射表 (如不存在)"""
     # 1. 创建用户表
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
@@ -39,16 +38,18 @@ def create_database():
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_id TEXT NOT NULL,
         timestamp TEXT NOT NULL,
+        timestamp_epoch INTEGER,
         glucose_value INTEGER NOT NULL,
         created_at TEXT DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (user_id) REFERENCES users(user_id)
     )
     ''')
     
-    # 为 CGM 读数表创建索引以提高查询性能
+    # 整数时间列唯一索引: 范围查询比较整数而不是 ISO 字符串,
+    # 同时保证重复同步不会产生重复读数 (同一时刻的不同时间字符串写法也视为重复)
     cursor.execute('''
-    CREATE INDEX IF NOT EXISTS idx_user_timestamp 
-    ON cgm_readings(user_id, timestamp)
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_cgm_readings_user_epoch 
+    ON cgm_readings(user_id, timestamp_epoch)
     ''')
     
     # 3. 创建 CGM Pattern 和 Action 映射表
@@ -64,6 +65,16 @@ def create_database():
         created_at TEXT DEFAULT CURRENT_TIMESTAMP
     )
     ''')
+
+
+def create_database(db_path: str = 'cgm_butler.db'):
+    """创建 CGM Butler 数据库并填充初始数据"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    print("正在创建数据库表...")
+    
+    create_tables(cursor)
     
     print("[完成] 数据库表创建完成")
     print("\n正在插入测试数据...")
@@ -92,44 +103,14 @@ def create_database():
     # 生成模拟 CGM 数据（最近 7 天）
     print("\n正在生成 CGM 读数数据...")
     base_time = datetime.now() - timedelta(days=7)
-    cgm_data = []
-    
-    for day in range(7):
-        for hour in range(24):
-            for minute in range(0, 60, 5):  # 每5分钟一个读数
-                timestamp = base_time + timedelta(days=day, hours=hour, minutes=minute)
-                
-                # 模拟血糖波动
-                base_glucose = 100
-                
-                # 早餐后波动 (7-9点)
-                if 7 <= hour <= 9:
-                    base_glucose = 130 + (hour - 7) * 10
-                # 午餐后波动 (12-14点)
-                elif 12 <= hour <= 14:
-                    base_glucose = 140 + (hour - 12) * 5
-                # 晚餐后波动 (18-20点)
-                elif 18 <= hour <= 20:
-                    base_glucose = 135 + (hour - 18) * 8
-                # 夜间 (22-6点)
-                elif hour >= 22 or hour <= 6:
-                    base_glucose = 95
-                
-                # 添加随机波动
-                glucose = base_glucose + random.randint(-15, 20)
-                
-                # 确保血糖值在合理范围内
-                glucose = max(70, min(200, glucose))
-                
-                cgm_data.append((
-                    'user_001', 
-                    timestamp.isoformat(), 
-                    glucose,
-                    datetime.now().isoformat()
-                ))
+    created_at = datetime.now().isoformat()
+    cgm_data = [
+        reading + (created_at,)
+        for reading in generate_readings('user_001', base_time, days=7)
+    ]
     
     cursor.executemany(
-        'INSERT INTO cgm_readings (user_id, timestamp, glucose_value, created_at) VALUES (?, ?, ?, ?)',
+        'INSERT INTO cgm_readings (user_id, timestamp, timestamp_epoch, glucose_value, created_at) VALUES (?, ?, ?, ?, ?)',
         cgm_data
     )
     
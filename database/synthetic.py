@@ -0,0 +1,96 @@
+# synthetic.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 模拟血糖数据生成
+三餐后升高、夜间平稳的日内曲线加随机波动; setup_database.py 的测试数据和 benchmarks/ 的
+大规模数据集共用这里的生成逻辑
+"""
+import calendar
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+
+# 血糖曲线配置
+#   offset: 在日内基础曲线上整体平移 (mg/dL)
+#   noise:  每条读数叠加的随机波动范围 (含两端)
+#   range:  截断范围
+PROFILES: Dict[str, Dict] = {
+    # 与 setup_database.py 原有测试数据一致
+    'default': {'offset': 0, 'noise': (-15, 20), 'range': (70, 200)},
+    # 控制不佳的 2 型糖尿病: 整体偏高, 餐后常超过 180
+    'type2': {'offset': 45, 'noise': (-25, 40), 'range': (60, 350)},
+    # 易发低血糖: 整体偏低
+    'hypo_prone': {'offset': -30, 'noise': (-25, 20), 'range': (40, 220)},
+    # 波动大
+    'variable': {'offset': 10, 'noise': (-60, 80), 'range': (40, 400)},
+}
+
+
+def base_glucose(hour: int) -> int:
+    """日内基础血糖曲线 (mg/dL): 三餐后升高, 夜间平稳"""
+    # 早餐后波动 (7-9点)
+    if 7 <= hour <= 9:
+        return 130 + (hour - 7) * 10
+    # 午餐后波动 (12-14点)
+    if 12 <= hour <= 14:
+        return 140 + (hour - 12) * 5
+    # 晚餐后波动 (18-20点)
+    if 18 <= hour <= 20:
+        return 135 + (hour - 18) * 8
+    # 夜间 (22-6点)
+    if hour >= 22 or hour <= 6:
+        return 95
+    return 100
+
+
+def generate_readings(
+    user_id: str,
+    start: datetime,
+    days: int,
+    profile: str = 'default',
+    interval_minutes: int = 5,
+    gap_probability: float = 0.0,
+    gap_minutes: Tuple[int, int] = (30, 180),
+    rng: Optional[random.Random] = None
+) -> Iterator[Tuple[str, str, int, int]]:
+    """
+    生成一个用户的模拟读数
+
+    Args:
+        user_id: 用户ID
+        start: 第一条读数时间
+        days: 天数
+        profile: 血糖曲线配置 (见 PROFILES)
+        interval_minutes: 读数间隔 (分钟)
+        gap_probability: 每条读数之后出现传感器断连的概率
+        gap_minutes: 断连时长范围 (分钟)
+        rng: 随机数生成器, 传入带种子的实例可复现数据
+
+    Yields:
+        (user_id, timestamp, timestamp_epoch, glucose_value), 按时间升序
+    """
+    settings = PROFILES[profile]
+    offset = settings['offset']
+    noise_low, noise_high = settings['noise']
+    low, high = settings['range']
+    rng = rng or random.Random()
+    randint = rng.randint
+
+    end = start + timedelta(days=days)
+    step = timedelta(minutes=interval_minutes)
+    timestamp = start
+    # 整数秒单独累加, 避免每条读数都做一次时间转换
+    epoch = calendar.timegm(start.timetuple())
+    step_seconds = interval_minutes * 60
+
+    while timestamp < end:
+        glucose = base_glucose(timestamp.hour) + offset + randint(noise_low, noise_high)
+        yield user_id, timestamp.isoformat(), epoch, max(low, min(high, glucose))
+
+        if gap_probability and rng.random() < gap_probability:
+            skipped = randint(*gap_minutes) // interval_minutes + 1
+        else:
+            skipped = 1
+        timestamp += step * skipped
+        epoch += step_seconds * skipped
@@ -0,0 +1,59 @@
+# versions.py
+# -*- coding: utf-8 -*-
+"""
+CGM Butler 用户数据版本号
+每个用户每类数据一个单调递增的版本号, 在写入数据的同一事务内更新;
+仪表板据此生成 ETag, 数据未变时不必执行查询即可返回 304。
+版本号存于数据库 (而非进程内), 其他进程 (调度器、导入脚本) 的写入同样可见
+"""
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional
+
+
+# 数据类型 (与 events.EVENT_KINDS 对应), pattern_actions 为全局数据 (user_id 为空字符串, 由触发器维护)
+DATA_KINDS = ('readings', 'alerts', 'activity_logs', 'patterns', 'user', 'pattern_actions')
+
+# 全局数据使用的 user_id
+GLOBAL_USER_ID = ''
+
+
+def bump_data_versions(conn: sqlite3.Connection, user_ids: Iterable[str], kind: str) -> None:
+    """
+    更新用户某类数据的版本号 (在写入数据的同一事务内调用, 由调用方提交)
+
+    新版本号取 "旧版本 + 1" 与当前毫秒时间戳中的较大者, 数据库重建后也不会与旧版本重复
+
+    Args:
+        conn: 数据库连接
+        user_ids: 数据发生变化的用户ID
+        kind: 数据类型 (见 DATA_KINDS)
+    """
+    if kind not in DATA_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(DATA_KINDS)}")
+    now_ms = time.time_ns() // 1_000_000
+    conn.executemany(
+        """
+        INSERT INTO user_data_versions (user_id, kind, version) VALUES (?, ?, ?)
+        ON CONFLICT (user_id, kind) DO UPDATE SET version = MAX(version + 1, excluded.version)
+        """,
+        [(user_id, kind, now_ms) for user_id in set(user_ids)]
+    )
+
+
+def get_data_versions(conn: sqlite3.Connection, user_id: Optional[str]) -> Dict[str, int]:
+    """
+    读取用户各类数据的当前版本号 (一次主键范围查找)
+
+    Args:
+        conn: 数据库连接
+        user_id: 用户ID; None 表示全局数据
+
+    Returns:
+        {kind: version}; 从未写入过的数据类型不在结果中
+    """
+    rows = conn.execute(
+        "SELECT kind, version FROM user_data_versions WHERE user_id = ?",
+        (GLOBAL_USER_ID if user_id is None else user_id,)
+    )
+    return {kind: version for kind, version in rows}
@@ -96,13 +96,8 @@ class CGMTools:
             end_time = datetime.now()
             start_time = end_time - timedelta(hours=hours)
             
-            stats = db.get_glucose_statistics(
-                user_id,
-                start_time=start_time.isoformat(),
-                end_time=end_time.isoformat()
-            )
-            
-            tir = db.get_time_in_range(
+            # Prefix-sum index: constant cost for any look-back
+            stats = db.get_window_statistics(
                 user_id,
                 start_time=start_time.isoformat(),
                 end_time=end_time.isoformat()
@@ -114,12 +109,16 @@ class CGMTools:
                     "message": f"No data available for the last {hours} hours"
                 }
             
+            tir = stats['time_in_range_70_140']
+            
             return {
                 "success": True,
                 "time_period": f"Last {hours} hours",
                 "average_glucose": round(stats['avg_glucose'], 1),
                 "min_glucose": stats['min_glucose'],
                 "max_glucose": stats['max_glucose'],
+                "std_dev": round(stats['std_dev'], 1) if stats['std_dev'] is not None else None,
+                "cv": round(stats['cv'], 1) if stats['cv'] is not None else None,
                 "time_in_range": round(tir, 1),
                 "reading_count": stats['count'],
                 "message": f"In the last {hours} hours: Average {stats['avg_glucose']:.1f} mg/dL, Time in Range {tir:.1f}%"
@@ -303,7 +302,7 @@ FUNCTION_DEFINITIONS = [
     },
     {
         "name": "get_glucose_statistics",
-        "description": "Get glucose statistics for a time period (average, min, max, time in range)",
+        "description": "Get glucose statistics for a time period (average, min, max, standard deviation, CV, time in range)",
         "parameters": {
             "type": "object",
             "properties": {
@@ -7,6 +7,7 @@ such as conversational agents, dashboards, and analytics tools.
 
 Main Components:
 - CGMPatternIdentifier: Core pattern detection class
+- DetectorSpec / register_detector: Detector registry
 - Scheduler: Automated pattern identification scheduler
 
 Usage:
@@ -14,11 +15,22 @@ Usage:
     
     identifier = CGMPatternIdentifier()
     patterns = identifier.identify_patterns('user_001')
+    
+    # Vectorized detectors (requires NumPy)
+    identifier = CGMPatternIdentifier(engine='numpy')
+    
+    # Sliding-window detectors on a gap-aware 5-minute time grid (requires NumPy)
+    identifier = CGMPatternIdentifier(engine='grid')
+    
+    # Additional detectors
+    register_detector(DetectorSpec('detect_my_pattern', 'my_pattern', min_readings=50,
+                                   python=detect_my_pattern, info={...}))
 """
 
 from .identifier import CGMPatternIdentifier
+from .registry import DetectorSpec, register_detector
 
-__all__ = ['CGMPatternIdentifier']
+__all__ = ['CGMPatternIdentifier', 'DetectorSpec', 'register_detector']
 __version__ = '1.0.0'
 
 
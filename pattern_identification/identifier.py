@@ -5,12 +5,48 @@ This module identifies common glucose patterns from CGM data and provides
 actionable recommendations for each detected pattern.
 """
 
-import sqlite3
+import math
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import groupby
+from operator import itemgetter
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 import statistics
 
+from database.cgm_database import CGMDatabase, timestamp_to_epoch
+from database.episodes import episode_duration_minutes, summarize_episodes
+from database.events import publish
+from database.connection_pool import get_pool
+from database.schema import PATTERN_RECURRENCE_GAP_HOURS, severity_rank_sql
+from database.versions import bump_data_versions
+
+from . import registry, resample, vectorized
+from .incremental import DetectorState, IncrementalStateError
+from .registry import DetectorMetrics, DetectorSpec
+
+
+# Reference point for decoding the integer timestamp_epoch column
+_EPOCH = datetime(1970, 1, 1)
+
+# Detection engines: 'python' iterates reading dicts, 'numpy' uses pattern_identification.vectorized,
+# 'grid' additionally runs the sliding-window detectors on a 5-minute time grid (pattern_identification.resample)
+ENGINES = ('python', 'numpy', 'grid')
+
+# Batches queued per worker process in parallel runs
+PARALLEL_BATCHES_PER_WORKER = 4
+
+# Patterns annotated with the matching glucose_episodes: pattern type -> (episode type, hours of day or None)
+EPISODE_PATTERNS = {
+    'nocturnal_hypoglycemia': ('hypo', range(0, 6)),
+    'frequent_hypoglycemia': ('hypo', None),
+    'sustained_hyperglycemia': ('hyper', None),
+}
+
+# Users per query when bulk loading readings for a list of users (stays below SQLite's variable limit)
+BULK_LOAD_CHUNK_SIZE = 500
+
 
 class CGMPatternIdentifier:
     """Identifies common glucose patterns from CGM readings."""
@@ -79,22 +115,74 @@ class CGMPatternIdentifier:
         }
     }
     
-    def __init__(self, db_path: str = None):
+    def __init__(
+        self,
+        db_path: str = None,
+        engine: str = 'python',
+        read_only: bool = False,
+        incremental: bool = False
+    ):
         """
         Initialize the pattern identifier with database connection.
         
         Args:
             db_path: Path to the database file. If None, uses default path.
+            engine: Detection engine, 'python' (default), 'numpy' or 'grid' (both require NumPy).
+                    'grid' evaluates sliding windows in wall-clock time across sensor gaps,
+                    so its window counts can differ from the other engines; it stays opt-in
+                    until incremental mode, which keeps index-based windows, supports it.
+            read_only: Open the database read-only (used by parallel workers; saving fails)
+            incremental: Keep per-user detector state in pattern_detector_state and only
+                         process readings that entered or left the window since the last run
         """
         if db_path is None:
             # Default to database/cgm_butler.db relative to project root
             project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
             db_path = os.path.join(project_root, 'database', 'cgm_butler.db')
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {', '.join(ENGINES)}")
+        if engine in ('numpy', 'grid') and not vectorized.is_available():
+            raise ImportError(f"engine='{engine}' requires NumPy (pip install numpy)")
+        if engine == 'grid' and incremental:
+            raise ValueError("incremental mode keeps index-based windows and cannot be combined with engine='grid'")
         self.db_path = db_path
+        self.engine = engine
+        self.read_only = read_only
+        self.incremental = incremental
+        # Detector state rows computed while read-only, saved later by a writer process
+        self._pending_states: List[tuple] = []
+        # Per-detector timing and hit counts, written to detector_metrics after each run
+        self.metrics = DetectorMetrics()
+    
+    def _connection(self):
+        """Borrow a connection from the process-wide pool shared with CGMDatabase."""
+        return get_pool(self.db_path, read_only=self.read_only).connection()
     
-    def _get_connection(self):
-        """Get database connection."""
-        return sqlite3.connect(self.db_path)
+    def _sync_derived_tables(self) -> None:
+        """Catch glucose_episodes up with readings written outside CGMDatabase (read-only: no-op)."""
+        if not self.read_only:
+            with CGMDatabase(self.db_path) as db:
+                db.sync_derived_tables()
+    
+    @staticmethod
+    def _window_cutoff(hours: int) -> int:
+        """Oldest timestamp_epoch inside a look-back window ending now."""
+        return timestamp_to_epoch(datetime.now() - timedelta(hours=hours))
+    
+    def _fetch_reading_rows(self, user_id: str, hours: int, cutoff_epoch: Optional[int] = None) -> List:
+        """Fetch (timestamp_epoch, glucose_value) rows for the look-back window, oldest first."""
+        if cutoff_epoch is None:
+            cutoff_epoch = self._window_cutoff(hours)
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT timestamp_epoch, glucose_value
+                FROM cgm_readings
+                WHERE user_id = ? AND timestamp_epoch >= ?
+                ORDER BY timestamp_epoch ASC, id ASC
+            ''', (user_id, cutoff_epoch))
+            return cursor.fetchall()
     
     def get_user_readings(self, user_id: str, hours: int = 168) -> List[Dict]:
         """
@@ -107,26 +195,90 @@ class CGMPatternIdentifier:
         Returns:
             List of reading dictionaries with timestamp and glucose_value
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        
-        cursor.execute('''
-            SELECT timestamp, glucose_value
-            FROM cgm_readings
-            WHERE user_id = ? AND timestamp >= ?
-            ORDER BY timestamp ASC
-        ''', (user_id, cutoff_time.isoformat()))
-        
+        return self._readings_from_rows(self._fetch_reading_rows(user_id, hours))
+    
+    @staticmethod
+    def _readings_from_rows(rows: List) -> List[Dict]:
+        """Convert (timestamp_epoch, glucose_value) rows to the reading dicts used by the detectors."""
+        # Integer arithmetic instead of parsing an ISO string per row
         readings = [
-            {'timestamp': datetime.fromisoformat(row[0]), 'glucose_value': row[1]}
-            for row in cursor.fetchall()
+            {'timestamp': _EPOCH + timedelta(seconds=row[0]), 'glucose_value': row[1]}
+            for row in rows
         ]
         
-        conn.close()
         return readings
     
+    def get_user_arrays(self, user_id: str, hours: int = 168) -> 'vectorized.ReadingArrays':
+        """
+        Get CGM readings for a user as contiguous arrays (numpy engine).
+        
+        Args:
+            user_id: User identifier
+            hours: Number of hours to look back (default: 168 = 7 days)
+        
+        Returns:
+            ReadingArrays with epoch seconds, glucose values and hour of day
+        """
+        return vectorized.ReadingArrays.from_rows(self._fetch_reading_rows(user_id, hours))
+    
+    def iter_user_reading_rows(
+        self,
+        user_ids: List[str],
+        hours: int = 168,
+        scan_all: bool = False
+    ) -> Iterator[Tuple[str, List]]:
+        """
+        Load the look-back window for many users in one ordered read instead of
+        one connection and query per user, grouping rows by user as they stream in.
+        
+        Args:
+            user_ids: Users to load
+            hours: Number of hours to look back (default: 168 = 7 days)
+            scan_all: Read the window of every user in a single scan (for runs that
+                      cover all users) instead of filtering by user_ids in chunks
+        
+        Yields:
+            (user_id, rows) for every user in user_ids, sorted by user_id, where rows are
+            (timestamp_epoch, glucose_value) oldest first; users without readings get []
+        """
+        wanted = sorted(set(user_ids))
+        cutoff_epoch = self._window_cutoff(hours)
+        
+        with self._connection() as conn:
+            if scan_all:
+                batches = [conn.execute('''
+                    SELECT user_id, timestamp_epoch, glucose_value
+                    FROM cgm_readings
+                    WHERE timestamp_epoch >= ?
+                    ORDER BY user_id, timestamp_epoch, id
+                ''', (cutoff_epoch,))]
+            else:
+                batches = (
+                    conn.execute(f'''
+                        SELECT user_id, timestamp_epoch, glucose_value
+                        FROM cgm_readings
+                        WHERE user_id IN ({', '.join('?' for _ in chunk)}) AND timestamp_epoch >= ?
+                        ORDER BY user_id, timestamp_epoch, id
+                    ''', chunk + [cutoff_epoch])
+                    for chunk in (
+                        wanted[i:i + BULK_LOAD_CHUNK_SIZE]
+                        for i in range(0, len(wanted), BULK_LOAD_CHUNK_SIZE)
+                    )
+                )
+            
+            # Merge the user-ordered stream with the sorted user list
+            position = 0
+            for cursor in batches:
+                for user_id, group in groupby(cursor, key=itemgetter(0)):
+                    while position < len(wanted) and wanted[position] < user_id:
+                        yield wanted[position], []
+                        position += 1
+                    if position < len(wanted) and wanted[position] == user_id:
+                        yield user_id, [(row[1], row[2]) for row in group]
+                        position += 1
+            for user_id in wanted[position:]:
+                yield user_id, []
+    
     def detect_post_meal_spike(self, readings: List[Dict]) -> Optional[Dict]:
         """
         Detect post-meal glucose spikes.
@@ -390,93 +542,319 @@ class CGMPatternIdentifier:
             }
         return None
     
-    def identify_patterns(self, user_id: str) -> List[Dict]:
+    def identify_patterns(self, user_id: str, rows: Optional[List] = None) -> List[Dict]:
         """
         Identify all patterns for a given user.
         
         Args:
             user_id: User identifier
+            rows: Already loaded (timestamp_epoch, glucose_value) rows of the last 7 days,
+                  oldest first (see iter_user_reading_rows); fetched if None. Ignored in
+                  incremental mode, which reads only the readings it has not processed.
         
         Returns:
             List of detected patterns with details
         """
-        readings = self.get_user_readings(user_id, hours=168)  # Last 7 days
+        if self.incremental and registry.supports_incremental():
+            try:
+                return [
+                    self._add_pattern_metadata(user_id, result)
+                    for result in self._detect_incremental(user_id, hours=168)
+                ]
+            except IncrementalStateError as e:
+                print(f"Incremental detection unavailable for {user_id} ({e}), running full scan")
+        
+        if rows is None:
+            rows = self._fetch_reading_rows(user_id, hours=168)  # Last 7 days
         
-        if not readings:
+        if not rows:
             return []
         
+        arrays = vectorized.ReadingArrays.from_rows(rows) if self.engine != 'python' else None
+        grid = None      # Time grid, built when the first sliding-window detector needs it
+        readings = None  # Reading dicts, built when the first detector needs them
         detected_patterns = []
         
-        # Run all pattern detection methods
-        detection_methods = [
-            self.detect_post_meal_spike,
-            self.detect_dawn_phenomenon,
-            self.detect_nocturnal_hypoglycemia,
-            self.detect_afternoon_dip,
-            self.detect_high_variability,
-            self.detect_sustained_hyperglycemia,
-            self.detect_frequent_hypoglycemia,
-            self.detect_post_exercise_drop,
-            self.detect_stress_hyperglycemia,
-            self.detect_roller_coaster
+        # Run all registered detectors
+        for spec in registry.get_detectors():
+            if len(rows) < spec.min_readings:
+                self.metrics.skip(spec.name)
+                continue
+            
+            function, data_kind = self._detector_function(spec)
+            if data_kind == 'grid':
+                if grid is None:
+                    grid = resample.resample(arrays)
+                data = grid
+            elif data_kind == 'arrays':
+                data = arrays
+            else:
+                if readings is None:
+                    readings = self._readings_from_rows(rows)
+                data = readings
+            
+            result = self.metrics.run(spec.name, function, data, len(rows))
+            if result:
+                detected_patterns.append(self._add_pattern_metadata(user_id, result))
+        
+        return detected_patterns
+    
+    def _detector_function(self, spec: DetectorSpec):
+        """
+        Resolve a detector's implementation for this identifier's engine.
+        
+        Returns:
+            (function, data_kind): data_kind is 'grid' if the function takes
+            resample.GridArrays, 'arrays' for vectorized.ReadingArrays and
+            'readings' for reading dicts
+        """
+        if self.engine == 'grid' and 'sequence' in spec.inputs:
+            function = getattr(resample, spec.name, None)
+            if function is not None:
+                return function, 'grid'
+        if self.engine != 'python':
+            function = spec.numpy or getattr(vectorized, spec.name, None)
+            if function is not None:
+                return function, 'arrays'
+        return spec.python or getattr(self, spec.name), 'readings'
+    
+    def _add_pattern_metadata(self, user_id: str, result: Dict) -> Dict:
+        """Attach the pattern definition, detection time and user to a detector result."""
+        pattern_type = result['pattern_type']
+        result.update(self.PATTERNS.get(pattern_type) or registry.pattern_info(pattern_type))
+        result['detected_at'] = datetime.now().isoformat()
+        result['user_id'] = user_id
+        if pattern_type in EPISODE_PATTERNS:
+            result['episodes'] = self.get_episode_summary(user_id, *EPISODE_PATTERNS[pattern_type])
+        return result
+    
+    def get_episode_summary(
+        self,
+        user_id: str,
+        episode_type: str,
+        hours_of_day: Optional[range] = None,
+        hours: int = 168
+    ) -> Dict:
+        """
+        Summarize the user's hypo/hyper episodes in the look-back window from the
+        glucose_episodes table, which ingestion keeps up to date (readings written
+        by other code are caught up first).
+        
+        Args:
+            user_id: User identifier
+            episode_type: 'hypo' or 'hyper'
+            hours_of_day: Only episodes starting in these hours (UTC), e.g. range(0, 6)
+            hours: Number of hours to look back (default: 168 = 7 days)
+        
+        Returns:
+            Dict with count, total_minutes, longest_minutes and extreme_glucose
+        """
+        self._sync_derived_tables()
+        with self._connection() as conn:
+            rows = conn.execute('''
+                SELECT episode_type, start_epoch, end_epoch, extreme_glucose
+                FROM glucose_episodes
+                WHERE user_id = ? AND episode_type = ? AND end_epoch >= ?
+            ''', (user_id, episode_type, self._window_cutoff(hours))).fetchall()
+        
+        episodes = [
+            {
+                'episode_type': row[0],
+                'duration_minutes': episode_duration_minutes(row[1], row[2]),
+                'extreme_glucose': row[3]
+            }
+            for row in rows
+            if hours_of_day is None or (row[1] // 3600) % 24 in hours_of_day
         ]
+        empty = {'count': 0, 'total_minutes': 0, 'longest_minutes': 0, 'extreme_glucose': None}
+        return summarize_episodes(episodes).get(episode_type, empty)
+    
+    # ============================================================
+    # Incremental detection
+    # ============================================================
+    
+    def _detect_incremental(self, user_id: str, hours: int = 168, cutoff: Optional[int] = None) -> List[Dict]:
+        """
+        Run the detectors from persisted per-user state, advancing it by the readings
+        that entered or left the window since the previous run. Rebuilds the state
+        from the full window when it is missing or cannot be advanced.
+        
+        Raises:
+            IncrementalStateError: The window holds data the state cannot represent
+        """
+        if cutoff is None:
+            cutoff = self._window_cutoff(hours)
         
-        for method in detection_methods:
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT state FROM pattern_detector_state WHERE user_id = ? AND window_hours = ?',
+                (user_id, hours)
+            ).fetchone()
             try:
-                result = method(readings)
+                if row is None:
+                    raise IncrementalStateError('no saved state')
+                state = self._advance_detector_state(conn, user_id, DetectorState.from_json(row[0]), cutoff)
+            except (IncrementalStateError, ValueError, KeyError, TypeError):
+                # Full recompute fallback
+                state = self._advance_detector_state(conn, user_id, DetectorState(hours, cutoff), cutoff)
+        
+        self._save_detector_state(user_id, state)
+        return state.detect()
+    
+    def _advance_detector_state(self, conn, user_id: str, state: DetectorState, cutoff: int) -> DetectorState:
+        """Apply expiring and new readings to the state, then verify it against cgm_readings."""
+        if state.last_epoch is None:
+            state.expire([], cutoff)
+            new_rows = conn.execute('''
+                SELECT timestamp_epoch, glucose_value FROM cgm_readings
+                WHERE user_id = ? AND timestamp_epoch >= ?
+                ORDER BY timestamp_epoch ASC, id ASC
+            ''', (user_id, cutoff)).fetchall()
+        else:
+            expired_rows = conn.execute('''
+                SELECT timestamp_epoch, glucose_value FROM cgm_readings
+                WHERE user_id = ? AND timestamp_epoch >= ? AND timestamp_epoch < ? AND timestamp_epoch <= ?
+            ''', (user_id, state.cutoff, cutoff, state.last_epoch)).fetchall()
+            state.expire([tuple(row) for row in expired_rows], cutoff)
+            new_rows = conn.execute('''
+                SELECT timestamp_epoch, glucose_value FROM cgm_readings
+                WHERE user_id = ? AND timestamp_epoch > ? AND timestamp_epoch >= ?
+                ORDER BY timestamp_epoch ASC, id ASC
+            ''', (user_id, state.last_epoch, cutoff)).fetchall()
+        state.extend([tuple(row) for row in new_rows])
+        
+        # Out-of-order inserts, deletions and overwritten values show up as a count/sum mismatch
+        count, total = conn.execute('''
+            SELECT COUNT(*), TOTAL(glucose_value) FROM cgm_readings
+            WHERE user_id = ? AND timestamp_epoch >= ?
+        ''', (user_id, cutoff)).fetchone()
+        if count != state.count or total != state.total:
+            raise IncrementalStateError('detector state out of sync with cgm_readings')
+        return state
+    
+    def _save_detector_state(self, user_id: str, state: DetectorState) -> None:
+        """Persist detector state; read-only identifiers queue it for the writer process."""
+        row = (user_id, state.window_hours, state.last_epoch, state.count,
+               state.to_json(), datetime.now().isoformat())
+        if self.read_only:
+            self._pending_states.append(row)
+        else:
+            self._write_detector_states([row])
+    
+    def _write_detector_states(self, rows: List[tuple]) -> None:
+        """Upsert detector state rows."""
+        if not rows:
+            return
+        with self._connection() as conn:
+            conn.executemany('''
+                INSERT INTO pattern_detector_state
+                (user_id, window_hours, last_epoch, reading_count, state, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    window_hours = excluded.window_hours,
+                    last_epoch = excluded.last_epoch,
+                    reading_count = excluded.reading_count,
+                    state = excluded.state,
+                    updated_at = excluded.updated_at
+            ''', rows)
+            conn.commit()
+    
+    def check_incremental_consistency(self, user_id: str, hours: int = 168) -> Dict:
+        """
+        Compare incremental detection with a full batch scan of the same window.
+        
+        Args:
+            user_id: User identifier
+            hours: Look-back window in hours
+        
+        Returns:
+            Dict with 'consistent' and the per-pattern differences between the
+            incremental and batch results
+        """
+        cutoff = self._window_cutoff(hours)
+        incremental = {r['pattern_type']: r for r in self._detect_incremental(user_id, hours, cutoff)}
+        
+        readings = self._readings_from_rows(self._fetch_reading_rows(user_id, hours, cutoff))
+        batch = {}
+        if readings:
+            for spec in registry.get_detectors():
+                if not spec.incremental:
+                    continue
+                result = getattr(self, spec.name)(readings)
                 if result:
-                    # Add pattern metadata
-                    pattern_type = result['pattern_type']
-                    result.update(self.PATTERNS[pattern_type])
-                    result['detected_at'] = datetime.now().isoformat()
-                    result['user_id'] = user_id
-                    detected_patterns.append(result)
-            except Exception as e:
-                print(f"Error detecting pattern with {method.__name__}: {e}")
+                    batch[result['pattern_type']] = result
         
-        return detected_patterns
+        differences = []
+        for pattern_type in sorted(set(incremental) | set(batch)):
+            inc, full = incremental.get(pattern_type), batch.get(pattern_type)
+            same = (
+                inc is not None and full is not None
+                and inc['details'] == full['details']
+                and inc['severity'] == full['severity']
+                and math.isclose(inc['confidence'], full['confidence'], rel_tol=1e-9)
+            )
+            if not same:
+                differences.append({'pattern_type': pattern_type, 'incremental': inc, 'batch': full})
+        
+        return {
+            'user_id': user_id,
+            'consistent': not differences,
+            'patterns_checked': len(batch),
+            'differences': differences
+        }
     
-    def save_patterns_to_db(self, patterns: List[Dict]) -> int:
+    def save_patterns_to_db(self, patterns: List[Dict], user_id: Optional[str] = None) -> int:
         """
         Save detected patterns to the database.
         
+        Each user_patterns row is an episode of one pattern for one user. A pattern
+        that is still active is updated in place (latest details and detection time,
+        highest severity) instead of inserting a new row. Re-running detection does
+        not count as a new occurrence: occurrence_count only grows when the pattern
+        is detected again more than PATTERN_RECURRENCE_GAP_HOURS after its last
+        detection.
+        
         Args:
             patterns: List of detected patterns
+            user_id: If given, patterns is the complete result of a run for this user
+                     and active episodes of patterns not detected again are closed
         
         Returns:
             Number of patterns saved
         """
-        if not patterns:
+        if not patterns and user_id is None:
             return 0
         
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        # Create user_patterns table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_patterns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                pattern_type TEXT NOT NULL,
-                pattern_name TEXT NOT NULL,
-                description TEXT,
-                severity TEXT,
-                confidence REAL,
-                details TEXT,
-                detected_at TEXT NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        ''')
-        
-        saved_count = 0
-        for pattern in patterns:
-            try:
-                cursor.execute('''
-                    INSERT INTO user_patterns 
-                    (user_id, pattern_type, pattern_name, description, severity, confidence, details, detected_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
+        severity_rank = severity_rank_sql('excluded.severity')
+        current_rank = severity_rank_sql('severity')
+        recurrence_days = PATTERN_RECURRENCE_GAP_HOURS / 24
+        with self._connection() as conn:
+            if user_id is not None:
+                detected_types = [pattern['pattern_type'] for pattern in patterns]
+                placeholders = ', '.join('?' for _ in detected_types)
+                conn.execute(f'''
+                    UPDATE user_patterns SET is_active = 0
+                    WHERE user_id = ? AND is_active = 1
+                    AND pattern_type NOT IN ({placeholders})
+                ''', [user_id] + detected_types)
+            
+            conn.executemany(f'''
+                INSERT INTO user_patterns 
+                (user_id, pattern_type, pattern_name, description, severity, confidence, details,
+                 detected_at, first_detected_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, pattern_type) WHERE is_active = 1 DO UPDATE SET
+                    pattern_name = excluded.pattern_name,
+                    description = excluded.description,
+                    severity = CASE WHEN {severity_rank} > {current_rank}
+                               THEN excluded.severity ELSE severity END,
+                    confidence = excluded.confidence,
+                    details = excluded.details,
+                    detected_at = excluded.detected_at,
+                    occurrence_count = occurrence_count + (
+                        julianday(excluded.detected_at) - julianday(detected_at) > {recurrence_days})
+            ''', [
+                (
                     pattern['user_id'],
                     pattern['pattern_type'],
                     pattern['name'],
@@ -484,16 +862,18 @@ class CGMPatternIdentifier:
                     pattern['severity'],
                     pattern['confidence'],
                     pattern['details'],
+                    pattern['detected_at'],
                     pattern['detected_at']
-                ))
-                saved_count += 1
-            except Exception as e:
-                print(f"Error saving pattern: {e}")
-        
-        conn.commit()
-        conn.close()
+                )
+                for pattern in patterns
+            ])
+            changed_users = {user_id} if user_id is not None else {pattern['user_id'] for pattern in patterns}
+            bump_data_versions(conn, changed_users, 'patterns')
+            conn.commit()
         
-        return saved_count
+        for changed_user in changed_users:
+            publish(self.db_path, changed_user, 'patterns')
+        return len(patterns)
     
     def run_pattern_identification_for_user(self, user_id: str) -> Dict:
         """
@@ -508,7 +888,11 @@ class CGMPatternIdentifier:
         print(f"Running pattern identification for user: {user_id}")
         
         patterns = self.identify_patterns(user_id)
-        saved_count = self.save_patterns_to_db(patterns)
+        return self._save_user_result(user_id, patterns)
+    
+    def _save_user_result(self, user_id: str, patterns: List[Dict]) -> Dict:
+        """Save a user's detected patterns and build the per-user summary."""
+        saved_count = self.save_patterns_to_db(patterns, user_id=user_id)
         
         result = {
             'user_id': user_id,
@@ -523,28 +907,35 @@ class CGMPatternIdentifier:
         
         return result
     
-    def run_pattern_identification_for_all_users(self) -> List[Dict]:
+    def run_pattern_identification_for_all_users(self, workers: int = 1) -> List[Dict]:
         """
         Run pattern identification for all users in the database.
         
+        Args:
+            workers: Number of worker processes. With more than one, users are
+                     partitioned across a process pool whose workers only read the
+                     database; this process saves all patterns.
+        
         Returns:
             List of results for each user
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT user_id FROM users')
-        user_ids = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        started_at = int(time.time())
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id FROM users ORDER BY user_id')
+            user_ids = [row[0] for row in cursor.fetchall()]
         
         print(f"\n{'='*60}")
         print(f"Starting pattern identification for {len(user_ids)} users")
         print(f"{'='*60}\n")
         
-        results = []
-        for user_id in user_ids:
-            result = self.run_pattern_identification_for_user(user_id)
-            results.append(result)
+        results = self._run_users(user_ids, workers, scan_all=True)
+        self._save_detector_metrics()
+        
+        # Users whose readings arrived before this sweep started are up to date
+        with self._connection() as conn:
+            conn.execute('DELETE FROM pattern_dirty_users WHERE last_marked_at < ?', (started_at,))
+            conn.commit()
         
         print(f"\n{'='*60}")
         print(f"Pattern identification complete!")
@@ -552,6 +943,175 @@ class CGMPatternIdentifier:
         print(f"{'='*60}\n")
         
         return results
+    
+    def run_pattern_identification_for_dirty_users(
+        self,
+        debounce_seconds: int = 600,
+        max_delay_seconds: int = 3600,
+        workers: int = 1
+    ) -> List[Dict]:
+        """
+        Run pattern identification only for users with new readings.
+        
+        Ingestion marks users in pattern_dirty_users. A user is processed once no
+        reading has arrived for debounce_seconds, or max_delay_seconds after the
+        first unprocessed reading so a continuous stream is not postponed forever.
+        
+        Args:
+            debounce_seconds: Quiet period after the last ingested reading
+            max_delay_seconds: Longest time a dirty user waits for processing
+            workers: Number of worker processes (see run_pattern_identification_for_all_users)
+        
+        Returns:
+            List of results for each processed user
+        """
+        now = int(time.time())
+        with self._connection() as conn:
+            rows = conn.execute('''
+                SELECT user_id, last_marked_at FROM pattern_dirty_users
+                WHERE last_marked_at <= ? OR first_marked_at <= ?
+                ORDER BY first_marked_at
+            ''', (now - debounce_seconds, now - max_delay_seconds)).fetchall()
+        
+        if not rows:
+            return []
+        
+        print(f"\nRunning pattern identification for {len(rows)} users with new readings")
+        results = self._run_users([row[0] for row in rows], workers)
+        self._save_detector_metrics()
+        
+        # Keep the marker if more readings arrived while the user was processed
+        with self._connection() as conn:
+            conn.executemany(
+                'DELETE FROM pattern_dirty_users WHERE user_id = ? AND last_marked_at = ?',
+                [(row[0], row[1]) for row in rows]
+            )
+            conn.commit()
+        
+        return results
+    
+    def _save_detector_metrics(self) -> None:
+        """Write the per-detector metrics of the finished run to detector_metrics and reset them."""
+        rows = self.metrics.rows()
+        if not rows:
+            return
+        
+        run_at = datetime.now().isoformat()
+        with self._connection() as conn:
+            conn.executemany('''
+                INSERT INTO detector_metrics
+                (run_at, detector, engine, calls, skipped, hits, errors,
+                 total_seconds, max_seconds, input_readings, last_error)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (
+                    run_at, row['detector'], self.engine, row['calls'], row['skipped'], row['hits'],
+                    row['errors'], row['total_seconds'], row['max_seconds'], row['input_readings'],
+                    row['last_error']
+                )
+                for row in rows
+            ])
+            conn.commit()
+        
+        print("\nDetector timings (slowest first):")
+        for row in rows:
+            print(f"  - {row['detector']}: {row['total_seconds'] * 1000:.1f} ms in {row['calls']} calls, "
+                  f"hit rate {row['hit_rate']:.0%}, {row['skipped']} skipped, {row['errors']} errors")
+        self.metrics.reset()
+    
+    def _run_users(self, user_ids: List[str], workers: int, scan_all: bool = False) -> List[Dict]:
+        """Run identification for the given users, sequentially or in a process pool."""
+        # Read-only workers cannot catch the episode table up themselves
+        self._sync_derived_tables()
+        if workers > 1 and len(user_ids) > 1:
+            return self._run_parallel(user_ids, workers)
+        
+        results = []
+        for user_id, patterns in self._identify_users(user_ids, scan_all=scan_all):
+            print(f"Running pattern identification for user: {user_id}")
+            results.append(self._save_user_result(user_id, patterns))
+        return results
+    
+    def _identify_users(self, user_ids: List[str], scan_all: bool = False) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        Detect patterns for many users, feeding the detectors from the bulk loader.
+        
+        Yields:
+            (user_id, patterns) sorted by user_id
+        """
+        if self.incremental:
+            # Incremental state already limits reads to the readings that changed
+            for user_id in sorted(set(user_ids)):
+                yield user_id, self.identify_patterns(user_id)
+            return
+        
+        for user_id, rows in self.iter_user_reading_rows(user_ids, hours=168, scan_all=scan_all):
+            yield user_id, self.identify_patterns(user_id, rows=rows)
+    
+    def _run_parallel(self, user_ids: List[str], workers: int) -> List[Dict]:
+        """
+        Detect patterns in a process pool and save them from this process.
+        
+        Args:
+            user_ids: Users to process
+            workers: Number of worker processes
+        
+        Returns:
+            Per-user results in the same order as user_ids
+        """
+        # Several small batches per worker so a slow batch does not leave other workers idle
+        batch_size = max(1, -(-len(user_ids) // (workers * PARALLEL_BATCHES_PER_WORKER)))
+        batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+        
+        results_by_user = {}
+        worker_stats = {}
+        started = time.perf_counter()
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_identify_user_batch, self.db_path, self.engine, self.incremental, batch)
+                for batch in batches
+            ]
+            for future in as_completed(futures):
+                batch = future.result()
+                # Single writer: all pattern and detector state writes happen in the parent process
+                self._write_detector_states(batch['states'])
+                self.metrics.merge(batch['metrics'])
+                for user_id, patterns in batch['patterns'].items():
+                    print(f"Running pattern identification for user: {user_id}")
+                    results_by_user[user_id] = self._save_user_result(user_id, patterns)
+                
+                stats = worker_stats.setdefault(batch['worker'], {'users': 0, 'seconds': 0.0})
+                stats['users'] += len(batch['patterns'])
+                stats['seconds'] += batch['elapsed']
+        
+        elapsed = time.perf_counter() - started
+        print(f"\nParallel run: {len(user_ids)} users, {workers} workers, {elapsed:.2f}s wall time")
+        for worker, stats in sorted(worker_stats.items()):
+            rate = stats['users'] / stats['seconds'] if stats['seconds'] > 0 else float('inf')
+            print(f"  - Worker {worker}: {stats['users']} users in {stats['seconds']:.2f}s ({rate:.1f} users/s)")
+        
+        return [results_by_user[user_id] for user_id in user_ids]
+
+
+def _identify_user_batch(db_path: str, engine: str, incremental: bool, user_ids: List[str]) -> Dict:
+    """
+    Worker-process entry point: detect patterns for a batch of users without writing.
+    
+    Returns:
+        Dict with the worker pid, detected patterns per user, detector state rows
+        to save (incremental mode), detector metrics and elapsed seconds
+    """
+    identifier = CGMPatternIdentifier(db_path=db_path, engine=engine, read_only=True, incremental=incremental)
+    started = time.perf_counter()
+    patterns = dict(identifier._identify_users(user_ids))
+    return {
+        'worker': os.getpid(),
+        'patterns': patterns,
+        'states': identifier._pending_states,
+        'metrics': identifier.metrics.snapshot(),
+        'elapsed': time.perf_counter() - started
+    }
 
 
 if __name__ == '__main__':
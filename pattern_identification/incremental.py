@@ -0,0 +1,334 @@
+"""
+Incremental CGM Pattern Detection State
+
+Per-user detector state that can be advanced by applying only the readings that
+entered or left the look-back window since the previous run, instead of
+re-scanning the whole window:
+
+- value histograms per hour of day (count/mean/stdev, hour-of-day and
+  threshold detectors, overall range)
+- hits of the sliding-window detectors keyed by window start time, which stay
+  valid until the start reading expires
+- the last readings processed, to evaluate windows that span old and new data
+
+Results match the batch detectors in identifier.py; only the standard
+deviation may differ from statistics.stdev in the last bit. Integer glucose
+values are required (all ingestion paths store integers).
+"""
+
+import json
+import math
+from fractions import Fraction
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class IncrementalStateError(Exception):
+    """The state cannot be advanced with the given readings; recompute from scratch."""
+
+
+def _post_meal_hit(window: Sequence[int]) -> Optional[int]:
+    peak = max(window)
+    spike = peak - window[0]
+    return spike if spike > 50 and peak > 140 else None
+
+
+def _post_exercise_hit(window: Sequence[int]) -> Optional[int]:
+    trough = min(window)
+    return 0 if window[0] - trough > 30 and trough < 100 else None
+
+
+def _stress_hit(window: Sequence[int]) -> Optional[int]:
+    return 0 if max(window) - window[0] > 40 and window[0] > 120 else None
+
+
+def _roller_coaster_hit(window: Sequence[int]) -> Optional[int]:
+    return 0 if min(window) < 80 and max(window) > 160 else None
+
+
+# Sliding-window detectors: pattern type -> (window width, hit function returning a value or None)
+WINDOW_HITS = {
+    'post_meal_spike': (24, _post_meal_hit),
+    'post_exercise_drop': (12, _post_exercise_hit),
+    'stress_hyperglycemia': (6, _stress_hit),
+    'roller_coaster': (24, _roller_coaster_hit),
+}
+
+# Readings kept to evaluate windows that start before the newest batch
+TAIL_SIZE = max(width for width, _ in WINDOW_HITS.values())
+
+STATE_VERSION = 1
+
+
+def _hour_of(epoch: int) -> int:
+    return (epoch // 3600) % 24
+
+
+class DetectorState:
+    """Aggregates of one user's look-back window, sufficient to run all ten detectors."""
+
+    def __init__(self, window_hours: int, cutoff: int):
+        """
+        Args:
+            window_hours: Look-back window length in hours
+            cutoff: Oldest timestamp_epoch included in the window
+        """
+        self.window_hours = window_hours
+        self.cutoff = cutoff
+        self.last_epoch: Optional[int] = None
+        self.count = 0
+        self.total = 0
+        self.hours: List[Dict[int, int]] = [{} for _ in range(24)]
+        self.hits: Dict[str, List[List[int]]] = {name: [] for name in WINDOW_HITS}
+        self.tail: List[Tuple[int, int]] = []
+
+    # ------------------------------------------------------------
+    # Serialisation
+    # ------------------------------------------------------------
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'version': STATE_VERSION,
+            'window_hours': self.window_hours,
+            'cutoff': self.cutoff,
+            'last_epoch': self.last_epoch,
+            'count': self.count,
+            'total': self.total,
+            'hours': [sorted(bucket.items()) for bucket in self.hours],
+            'hits': self.hits,
+            'tail': self.tail,
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text: str) -> 'DetectorState':
+        data = json.loads(text)
+        if data.get('version') != STATE_VERSION:
+            raise IncrementalStateError('unsupported detector state version')
+        state = cls(data['window_hours'], data['cutoff'])
+        state.last_epoch = data['last_epoch']
+        state.count = data['count']
+        state.total = data['total']
+        state.hours = [{value: count for value, count in bucket} for bucket in data['hours']]
+        state.hits = {name: data['hits'].get(name, []) for name in WINDOW_HITS}
+        state.tail = [tuple(reading) for reading in data['tail']]
+        return state
+
+    # ------------------------------------------------------------
+    # Advancing the window
+    # ------------------------------------------------------------
+
+    def expire(self, rows: Sequence[Tuple[int, int]], cutoff: int) -> None:
+        """
+        Move the window start forward, removing readings that fell out of it.
+
+        Args:
+            rows: (timestamp_epoch, glucose_value) of previously processed readings older than cutoff
+            cutoff: New oldest timestamp_epoch included in the window
+        """
+        if cutoff < self.cutoff:
+            raise IncrementalStateError('window start moved backwards')
+
+        for epoch, glucose in rows:
+            bucket = self.hours[_hour_of(epoch)]
+            remaining = bucket.get(glucose, 0) - 1
+            if remaining < 0:
+                raise IncrementalStateError('expired reading was never counted')
+            if remaining:
+                bucket[glucose] = remaining
+            else:
+                del bucket[glucose]
+            self.count -= 1
+            self.total -= glucose
+
+        # Hits are appended in window start order, so expired ones are a prefix
+        for hits in self.hits.values():
+            expired = 0
+            while expired < len(hits) and hits[expired][0] < cutoff:
+                expired += 1
+            del hits[:expired]
+
+        self.cutoff = cutoff
+
+    def extend(self, rows: Sequence[Tuple[int, int]]) -> None:
+        """
+        Add readings newer than everything processed so far.
+
+        Args:
+            rows: (timestamp_epoch, glucose_value) in ascending time order
+        """
+        if not rows:
+            return
+
+        for epoch, glucose in rows:
+            if not isinstance(glucose, int):
+                raise IncrementalStateError('incremental state requires integer glucose values')
+            bucket = self.hours[_hour_of(epoch)]
+            bucket[glucose] = bucket.get(glucose, 0) + 1
+            self.count += 1
+            self.total += glucose
+
+        # A window becomes countable once at least `width` readings follow its start
+        # (the batch detectors iterate range(len(readings) - width)). Windows starting
+        # in the tail that already had enough followers were counted on earlier runs.
+        stream = self.tail + [tuple(row) for row in rows]
+        values = [glucose for _, glucose in stream]
+        for name, (width, hit) in WINDOW_HITS.items():
+            for start in range(max(0, len(self.tail) - width), len(stream) - width):
+                start_epoch = stream[start][0]
+                if start_epoch < self.cutoff:
+                    continue
+                value = hit(values[start:start + width])
+                if value is not None:
+                    self.hits[name].append([start_epoch, value])
+
+        self.tail = stream[-TAIL_SIZE:]
+        self.last_epoch = stream[-1][0]
+
+    # ------------------------------------------------------------
+    # Detection
+    # ------------------------------------------------------------
+
+    def _values(self, hours: range, below: Optional[int] = None) -> Tuple[int, int, Optional[int]]:
+        """(count, sum, min) of values in the given hours of day, optionally below a threshold."""
+        count = total = 0
+        lowest = None
+        for hour in hours:
+            for value, n in self.hours[hour].items():
+                if below is not None and value >= below:
+                    continue
+                count += n
+                total += value * n
+                lowest = value if lowest is None else min(lowest, value)
+        return count, total, lowest
+
+    def detect(self) -> List[Dict]:
+        """
+        Run all ten detectors on the aggregated window.
+
+        Returns:
+            Detector results (without pattern metadata) in registry order
+        """
+        n = self.count
+        histogram: Dict[int, int] = {}
+        for bucket in self.hours:
+            for value, count in bucket.items():
+                histogram[value] = histogram.get(value, 0) + count
+
+        results = []
+
+        # Post-meal spike
+        spikes = self.hits['post_meal_spike']
+        if n >= 24 and len(spikes) >= 3:
+            max_spike = max(spike for _, spike in spikes)
+            results.append({
+                'pattern_type': 'post_meal_spike',
+                'confidence': min(0.9, 0.5 + (len(spikes) * 0.1)),
+                'details': f'Detected {len(spikes)} post-meal spikes, max spike: {max_spike:.0f} mg/dL',
+                'severity': 'high' if max_spike > 80 else 'medium'
+            })
+
+        # Dawn phenomenon
+        morning_count, morning_total, _ = self._values(range(4, 8))
+        overnight_count, overnight_total, _ = self._values(range(0, 4))
+        if morning_count >= 10 and overnight_count:
+            rise = morning_total / morning_count - overnight_total / overnight_count
+            if rise > 20:
+                results.append({
+                    'pattern_type': 'dawn_phenomenon',
+                    'confidence': min(0.9, 0.6 + (rise / 100)),
+                    'details': f'Average glucose rise of {rise:.0f} mg/dL in early morning',
+                    'severity': 'high' if rise > 40 else 'medium'
+                })
+
+        # Nocturnal hypoglycemia
+        night_lows, _, min_glucose = self._values(range(0, 6), below=70)
+        if night_lows >= 3:
+            results.append({
+                'pattern_type': 'nocturnal_hypoglycemia',
+                'confidence': 0.9,
+                'details': f'Detected {night_lows} low glucose episodes at night, lowest: {min_glucose} mg/dL',
+                'severity': 'high'
+            })
+
+        # Afternoon dip
+        dips, dip_total, _ = self._values(range(14, 17), below=80)
+        if dips >= 5:
+            avg_dip = dip_total / dips
+            results.append({
+                'pattern_type': 'afternoon_dip',
+                'confidence': 0.7,
+                'details': f'Detected {dips} afternoon dips, average: {avg_dip:.0f} mg/dL',
+                'severity': 'low' if avg_dip > 70 else 'medium'
+            })
+
+        # High variability (exact integer sums; only the final square root is rounded)
+        if n >= 50:
+            total_sq = sum(value * value * count for value, count in histogram.items())
+            mean_glucose = self.total / n
+            std_glucose = math.sqrt(Fraction(n * total_sq - self.total * self.total, n * (n - 1)))
+            cv = (std_glucose / mean_glucose) * 100
+            if cv > 36:
+                results.append({
+                    'pattern_type': 'high_variability',
+                    'confidence': min(0.9, 0.5 + (cv / 100)),
+                    'details': f'Glucose variability (CV): {cv:.1f}%, std dev: {std_glucose:.0f} mg/dL',
+                    'severity': 'high' if cv > 50 else 'medium'
+                })
+
+        # Sustained hyperglycemia / frequent hypoglycemia
+        if n >= 50:
+            high = [(value, count) for value, count in histogram.items() if value > 180]
+            high_count = sum(count for _, count in high)
+            percentage = (high_count / n) * 100
+            if percentage > 70:
+                avg_high = sum(value * count for value, count in high) / high_count
+                results.append({
+                    'pattern_type': 'sustained_hyperglycemia',
+                    'confidence': 0.9,
+                    'details': f'{percentage:.0f}% of readings above 180 mg/dL, average: {avg_high:.0f} mg/dL',
+                    'severity': 'high'
+                })
+
+            low = [(value, count) for value, count in histogram.items() if value < 70]
+            low_count = sum(count for _, count in low)
+            percentage = (low_count / n) * 100
+            if percentage > 5:
+                avg_low = sum(value * count for value, count in low) / low_count
+                results.append({
+                    'pattern_type': 'frequent_hypoglycemia',
+                    'confidence': 0.9,
+                    'details': f'{percentage:.1f}% of readings below 70 mg/dL, average: {avg_low:.0f} mg/dL',
+                    'severity': 'high'
+                })
+
+        # Post-exercise drop
+        rapid_drops = len(self.hits['post_exercise_drop'])
+        if n >= 12 and rapid_drops >= 3:
+            results.append({
+                'pattern_type': 'post_exercise_drop',
+                'confidence': 0.6,  # Lower confidence without exercise data
+                'details': f'Detected {rapid_drops} rapid glucose drops (possibly after exercise)',
+                'severity': 'medium'
+            })
+
+        # Stress hyperglycemia
+        sudden_spikes = len(self.hits['stress_hyperglycemia'])
+        if n >= 24 and sudden_spikes >= 5:
+            results.append({
+                'pattern_type': 'stress_hyperglycemia',
+                'confidence': 0.5,  # Lower confidence without stress data
+                'details': f'Detected {sudden_spikes} sudden glucose spikes (possibly stress-related)',
+                'severity': 'medium'
+            })
+
+        # Roller coaster
+        swings = len(self.hits['roller_coaster'])
+        if n >= 50 and swings >= 5:
+            range_glucose = max(histogram) - min(histogram)
+            results.append({
+                'pattern_type': 'roller_coaster',
+                'confidence': 0.8,
+                'details': f'Detected {swings} glucose swings, range: {range_glucose:.0f} mg/dL',
+                'severity': 'high'
+            })
+
+        return results
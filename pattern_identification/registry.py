@@ -0,0 +1,210 @@
+"""
+CGM Pattern Detector Registry
+
+Each detector declares the pattern it reports, the minimum number of readings
+it needs and the inputs it reads. CGMPatternIdentifier runs the registered
+detectors in registration order and records per-detector wall time, input
+size, hit rate and exceptions in a DetectorMetrics collector.
+
+The ten built-in detectors are implemented as CGMPatternIdentifier methods
+(engine='python') and as functions of the same name in
+pattern_identification.vectorized (engine='numpy'). Additional detectors can
+be added with register_detector(); register them at import time so parallel
+worker processes see them too.
+"""
+
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Inputs a detector can declare
+#   glucose:     glucose values
+#   hour_of_day: hour of day of each reading
+#   sequence:    consecutive readings in time order (sliding windows)
+INPUTS = ('glucose', 'hour_of_day', 'sequence')
+
+
+class DetectorSpec:
+    """Declaration of one pattern detector."""
+
+    __slots__ = ('name', 'pattern_type', 'min_readings', 'inputs', 'python', 'numpy', 'incremental', 'info')
+
+    def __init__(
+        self,
+        name: str,
+        pattern_type: str,
+        min_readings: int = 0,
+        inputs: Tuple[str, ...] = ('glucose',),
+        python: Optional[Callable] = None,
+        numpy: Optional[Callable] = None,
+        incremental: bool = False,
+        info: Optional[Dict] = None
+    ):
+        """
+        Args:
+            name: Detector name, unique within the registry
+            pattern_type: Pattern type reported in the detector result
+            min_readings: Readings in the window below which the detector is skipped
+            inputs: Inputs read by the detector (see INPUTS)
+            python: Function taking the reading dicts and returning a result dict or None.
+                    If None, the CGMPatternIdentifier method called `name` is used.
+            numpy: Function taking vectorized.ReadingArrays. If None, the vectorized
+                   function called `name` is used, or `python` when there is none.
+            incremental: The detector is covered by incremental.DetectorState
+            info: Pattern metadata (name, description, severity, category) for pattern
+                  types not in CGMPatternIdentifier.PATTERNS
+        """
+        unknown = set(inputs) - set(INPUTS)
+        if unknown:
+            raise ValueError(f"unknown detector inputs: {', '.join(sorted(unknown))}")
+        self.name = name
+        self.pattern_type = pattern_type
+        self.min_readings = min_readings
+        self.inputs = tuple(inputs)
+        self.python = python
+        self.numpy = numpy
+        self.incremental = incremental
+        self.info = info
+
+    def __repr__(self) -> str:
+        return f"DetectorSpec({self.name!r}, pattern_type={self.pattern_type!r}, min_readings={self.min_readings})"
+
+
+_BUILTIN_DETECTORS = [
+    DetectorSpec('detect_post_meal_spike', 'post_meal_spike', 24, ('glucose', 'sequence'), incremental=True),
+    DetectorSpec('detect_dawn_phenomenon', 'dawn_phenomenon', 10, ('glucose', 'hour_of_day'), incremental=True),
+    DetectorSpec('detect_nocturnal_hypoglycemia', 'nocturnal_hypoglycemia', 3, ('glucose', 'hour_of_day'), incremental=True),
+    DetectorSpec('detect_afternoon_dip', 'afternoon_dip', 5, ('glucose', 'hour_of_day'), incremental=True),
+    DetectorSpec('detect_high_variability', 'high_variability', 50, ('glucose',), incremental=True),
+    DetectorSpec('detect_sustained_hyperglycemia', 'sustained_hyperglycemia', 50, ('glucose',), incremental=True),
+    DetectorSpec('detect_frequent_hypoglycemia', 'frequent_hypoglycemia', 50, ('glucose',), incremental=True),
+    DetectorSpec('detect_post_exercise_drop', 'post_exercise_drop', 12, ('glucose', 'sequence'), incremental=True),
+    DetectorSpec('detect_stress_hyperglycemia', 'stress_hyperglycemia', 24, ('glucose', 'sequence'), incremental=True),
+    DetectorSpec('detect_roller_coaster', 'roller_coaster', 50, ('glucose', 'sequence'), incremental=True),
+]
+
+_registry: Dict[str, DetectorSpec] = {spec.name: spec for spec in _BUILTIN_DETECTORS}
+
+
+def register_detector(spec: DetectorSpec) -> DetectorSpec:
+    """
+    Add a detector to the registry.
+
+    Args:
+        spec: Detector declaration; python and info are required for new detectors
+
+    Returns:
+        The registered spec
+    """
+    if spec.name in _registry:
+        raise ValueError(f"detector already registered: {spec.name}")
+    if not callable(spec.python):
+        raise ValueError(f"detector {spec.name} needs a python implementation")
+    if spec.info is None:
+        raise ValueError(f"detector {spec.name} needs pattern info (name, description, severity, category)")
+    _registry[spec.name] = spec
+    return spec
+
+
+def get_detectors() -> List[DetectorSpec]:
+    """Registered detectors in the order they are run."""
+    return list(_registry.values())
+
+
+def get_detector(name: str) -> DetectorSpec:
+    """Look up a registered detector by name."""
+    return _registry[name]
+
+
+def pattern_info(pattern_type: str) -> Optional[Dict]:
+    """Metadata declared by the detector reporting pattern_type, if any."""
+    for spec in _registry.values():
+        if spec.pattern_type == pattern_type and spec.info is not None:
+            return spec.info
+    return None
+
+
+def supports_incremental() -> bool:
+    """True if incremental.DetectorState covers every registered detector."""
+    return all(spec.incremental for spec in _registry.values())
+
+
+class DetectorMetrics:
+    """Per-detector counters accumulated over one scheduler run."""
+
+    FIELDS = ('calls', 'skipped', 'hits', 'errors', 'total_seconds', 'max_seconds', 'input_readings')
+
+    def __init__(self):
+        self._detectors: Dict[str, Dict] = {}
+
+    def _entry(self, name: str) -> Dict:
+        entry = self._detectors.get(name)
+        if entry is None:
+            entry = self._detectors[name] = dict.fromkeys(self.FIELDS, 0)
+            entry['last_error'] = None
+        return entry
+
+    def __bool__(self) -> bool:
+        return bool(self._detectors)
+
+    def skip(self, name: str) -> None:
+        """Record a detector skipped for having fewer than min_readings readings."""
+        self._entry(name)['skipped'] += 1
+
+    def run(self, name: str, function: Callable, data, size: int) -> Optional[Dict]:
+        """
+        Call a detector and record its wall time, input size and outcome.
+
+        Args:
+            name: Detector name
+            function: Detector implementation
+            data: Readings passed to the detector
+            size: Number of readings in data
+
+        Returns:
+            The detector result, or None if it found nothing or raised
+        """
+        entry = self._entry(name)
+        started = time.perf_counter()
+        try:
+            result = function(data)
+        except Exception as e:
+            entry['errors'] += 1
+            entry['last_error'] = f"{type(e).__name__}: {e}"
+            result = None
+            print(f"Error detecting pattern with {name}: {e}")
+        elapsed = time.perf_counter() - started
+        entry['calls'] += 1
+        entry['total_seconds'] += elapsed
+        entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+        entry['input_readings'] += size
+        if result:
+            entry['hits'] += 1
+        return result
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Picklable copy of the counters (returned by parallel workers)."""
+        return {name: dict(entry) for name, entry in self._detectors.items()}
+
+    def merge(self, snapshot: Dict[str, Dict]) -> None:
+        """Add counters from another collector's snapshot."""
+        for name, other in snapshot.items():
+            entry = self._entry(name)
+            for field in self.FIELDS:
+                if field == 'max_seconds':
+                    entry[field] = max(entry[field], other[field])
+                else:
+                    entry[field] += other[field]
+            entry['last_error'] = other['last_error'] or entry['last_error']
+
+    def rows(self) -> List[Dict]:
+        """Counters per detector with hit rate, slowest detector first."""
+        rows = []
+        for name, entry in self._detectors.items():
+            row = dict(entry, detector=name)
+            row['hit_rate'] = entry['hits'] / entry['calls'] if entry['calls'] else 0.0
+            rows.append(row)
+        return sorted(rows, key=lambda row: row['total_seconds'], reverse=True)
+
+    def reset(self) -> None:
+        self._detectors.clear()
@@ -0,0 +1,189 @@
+"""
+Time-Grid Resampling for Sliding-Window Detectors
+
+The sliding-window detectors treat ``readings[i:i + 24]`` as two hours, which
+only holds for an uninterrupted 5-minute sensor stream. This module maps a
+user's readings onto a fixed 5-minute grid so a window of 24 slots is always
+two hours of wall time:
+
+- readings are assigned to the nearest grid slot (slots with several readings
+  take their mean)
+- short gaps (up to MAX_INTERPOLATION_GAP_SECONDS between readings) are filled
+  by linear interpolation
+- longer gaps stay masked and windows touching a masked slot are not evaluated
+
+Used by CGMPatternIdentifier(engine='grid') for detectors that declare the
+'sequence' input; the other detectors run on the raw readings (vectorized).
+Requires NumPy.
+"""
+
+from typing import Dict, Optional
+
+from .vectorized import ReadingArrays, _windows
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+# Grid spacing (matches the CGM sampling interval)
+GRID_STEP_SECONDS = 300
+
+# Longest gap between two readings that is bridged by interpolation (two missed readings)
+MAX_INTERPOLATION_GAP_SECONDS = 900
+
+
+class GridArrays:
+    """Readings on a fixed time grid; ``valid`` is False for slots inside long gaps."""
+
+    __slots__ = ('origin', 'step', 'values', 'valid', 'readings')
+
+    def __init__(self, origin: int, step: int, values, valid, readings: ReadingArrays):
+        self.origin = origin
+        self.step = step
+        self.values = values
+        self.valid = valid
+        self.readings = readings  # The raw readings the grid was built from
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def resample(
+    data: ReadingArrays,
+    step: int = GRID_STEP_SECONDS,
+    max_gap: int = MAX_INTERPOLATION_GAP_SECONDS
+) -> GridArrays:
+    """
+    Map readings onto a grid of `step` seconds aligned to multiples of `step`.
+
+    Args:
+        data: Readings sorted by time
+        step: Grid spacing in seconds
+        max_gap: Longest gap between consecutive readings (seconds) that is interpolated
+
+    Returns:
+        GridArrays covering the first to the last reading
+    """
+    if not len(data):
+        return GridArrays(0, step, np.empty(0), np.empty(0, dtype=bool), data)
+
+    # Nearest grid slot of each reading, counted from the first reading's slot
+    slots = (data.epochs + step // 2) // step
+    first_slot = int(slots[0])
+    slots -= first_slot
+    origin = first_slot * step
+    size = int(slots[-1]) + 1
+
+    counts = np.bincount(slots, minlength=size)
+    sums = np.bincount(slots, weights=data.glucose.astype(np.float64), minlength=size)
+    occupied = counts > 0
+    positions = np.flatnonzero(occupied)
+    observed = sums[occupied] / counts[occupied]
+
+    # Interpolate every slot, then mask slots whose neighbouring readings are too far apart
+    values = np.interp(np.arange(size), positions, observed)
+    index = np.arange(size)
+    previous = np.maximum.accumulate(np.where(occupied, index, -1))
+    following = np.minimum.accumulate(np.where(occupied, index, size)[::-1])[::-1]
+    valid = occupied | ((following - previous) * step <= max_gap)
+    values[~valid] = np.nan
+    return GridArrays(origin, step, values, valid, data)
+
+
+def _valid_windows(grid: GridArrays, width: int):
+    """
+    Windows of `width` slots (same start positions as vectorized._windows) and
+    a mask of those lying entirely outside long gaps.
+    """
+    windows = _windows(grid.values, width)
+    count = len(windows)
+    if not count:
+        return windows, np.zeros(0, dtype=bool)
+    complete = sliding_window_view(grid.valid, width)[:count].all(axis=1)
+    return windows, complete
+
+
+def detect_post_meal_spike(grid: GridArrays) -> Optional[Dict]:
+    """Increase of >50 mg/dL within 2 hours (24 slots), reaching >140 mg/dL."""
+    windows, complete = _valid_windows(grid, 24)
+    if not complete.any():
+        return None
+
+    windows = windows[complete]
+    peak = windows.max(axis=1)
+    spikes = peak - windows[:, 0]
+    hits = (spikes > 50) & (peak > 140)
+    spike_count = int(hits.sum())
+
+    if spike_count >= 3:
+        max_spike = spikes[hits].max().item()
+        return {
+            'pattern_type': 'post_meal_spike',
+            'confidence': min(0.9, 0.5 + (spike_count * 0.1)),
+            'details': f'Detected {spike_count} post-meal spikes, max spike: {max_spike:.0f} mg/dL',
+            'severity': 'high' if max_spike > 80 else 'medium'
+        }
+    return None
+
+
+def detect_post_exercise_drop(grid: GridArrays) -> Optional[Dict]:
+    """Rapid drop of >30 mg/dL within 1 hour (12 slots), bottoming out below 100 mg/dL."""
+    windows, complete = _valid_windows(grid, 12)
+    if not complete.any():
+        return None
+
+    windows = windows[complete]
+    trough = windows.min(axis=1)
+    rapid_drops = int(((windows[:, 0] - trough > 30) & (trough < 100)).sum())
+
+    if rapid_drops >= 3:
+        return {
+            'pattern_type': 'post_exercise_drop',
+            'confidence': 0.6,  # Lower confidence without exercise data
+            'details': f'Detected {rapid_drops} rapid glucose drops (possibly after exercise)',
+            'severity': 'medium'
+        }
+    return None
+
+
+def detect_stress_hyperglycemia(grid: GridArrays) -> Optional[Dict]:
+    """Spike of >40 mg/dL within 30 minutes (6 slots) from an already elevated level (>120 mg/dL)."""
+    windows, complete = _valid_windows(grid, 6)
+    if not complete.any():
+        return None
+
+    windows = windows[complete]
+    start = windows[:, 0]
+    sudden_spikes = int(((windows.max(axis=1) - start > 40) & (start > 120)).sum())
+
+    if sudden_spikes >= 5:
+        return {
+            'pattern_type': 'stress_hyperglycemia',
+            'confidence': 0.5,  # Lower confidence without stress data
+            'details': f'Detected {sudden_spikes} sudden glucose spikes (possibly stress-related)',
+            'severity': 'medium'
+        }
+    return None
+
+
+def detect_roller_coaster(grid: GridArrays) -> Optional[Dict]:
+    """2-hour windows (24 slots) swinging between <80 and >160 mg/dL."""
+    windows, complete = _valid_windows(grid, 24)
+    if not complete.any():
+        return None
+
+    windows = windows[complete]
+    swings = int(((windows.min(axis=1) < 80) & (windows.max(axis=1) > 160)).sum())
+
+    if swings >= 5:
+        glucose = grid.readings.glucose
+        range_glucose = (glucose.max() - glucose.min()).item()
+        return {
+            'pattern_type': 'roller_coaster',
+            'confidence': 0.8,
+            'details': f'Detected {swings} glucose swings, range: {range_glucose:.0f} mg/dL',
+            'severity': 'high'
+        }
+    return None
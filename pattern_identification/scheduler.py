@@ -1,9 +1,12 @@
 """
 Pattern Identification Scheduler
 
-This module runs pattern identification for all users every 4 hours.
+This module runs pattern identification for users with new readings shortly
+after ingestion (debounced), plus a low-frequency sweep over all users as a
+safety net for readings written outside the ingestion API.
 """
 
+import os
 import schedule
 import time
 from datetime import datetime
@@ -15,6 +18,29 @@ import io
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
+# Detection engine: 'python' (default), 'numpy' or 'grid' (gap-aware 5-minute time grid;
+# cannot be combined with CGM_PATTERN_INCREMENTAL)
+PATTERN_ENGINE = os.getenv('CGM_PATTERN_ENGINE', 'python')
+
+# Worker processes for the all-users run (1 = sequential)
+PATTERN_WORKERS = int(os.getenv('CGM_PATTERN_WORKERS', '1'))
+
+# Incremental detection from persisted per-user state (1 = enabled)
+PATTERN_INCREMENTAL = os.getenv('CGM_PATTERN_INCREMENTAL', '0') == '1'
+
+# A user with new readings is processed after this many quiet minutes...
+PATTERN_DEBOUNCE_MINUTES = int(os.getenv('CGM_PATTERN_DEBOUNCE_MINUTES', '10'))
+
+# ...or at the latest this many minutes after the first unprocessed reading
+PATTERN_MAX_DELAY_MINUTES = int(os.getenv('CGM_PATTERN_MAX_DELAY_MINUTES', '60'))
+
+# Hours between full sweeps over all users
+PATTERN_SWEEP_HOURS = int(os.getenv('CGM_PATTERN_SWEEP_HOURS', '24'))
+
+
+def _create_identifier() -> CGMPatternIdentifier:
+    return CGMPatternIdentifier(engine=PATTERN_ENGINE, incremental=PATTERN_INCREMENTAL)
+
 
 def run_pattern_identification():
     """Run pattern identification for all users."""
@@ -23,8 +49,8 @@ def run_pattern_identification():
     print(f"{'='*60}")
     
     try:
-        identifier = CGMPatternIdentifier()
-        results = identifier.run_pattern_identification_for_all_users()
+        identifier = _create_identifier()
+        results = identifier.run_pattern_identification_for_all_users(workers=PATTERN_WORKERS)
         
         # Print summary
         total_patterns = sum(r['patterns_detected'] for r in results)
@@ -38,23 +64,47 @@ def run_pattern_identification():
         traceback.print_exc()
 
 
+def run_dirty_pattern_identification():
+    """Run pattern identification for users whose new readings have settled."""
+    try:
+        identifier = _create_identifier()
+        results = identifier.run_pattern_identification_for_dirty_users(
+            debounce_seconds=PATTERN_DEBOUNCE_MINUTES * 60,
+            max_delay_seconds=PATTERN_MAX_DELAY_MINUTES * 60,
+            workers=PATTERN_WORKERS
+        )
+        
+        if results:
+            total_patterns = sum(r['patterns_detected'] for r in results)
+            print(f"\n✓ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - "
+                  f"{len(results)} users with new readings, {total_patterns} patterns detected")
+        
+    except Exception as e:
+        print(f"\n✗ Error during pattern identification for new readings: {e}")
+        import traceback
+        traceback.print_exc()
+
+
 def start_scheduler():
     """Start the pattern identification scheduler."""
     print("="*60)
     print("CGM Pattern Identification Scheduler")
     print("="*60)
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("Schedule: Every 4 hours")
+    print(f"Schedule: New readings after {PATTERN_DEBOUNCE_MINUTES} quiet minutes "
+          f"(max delay {PATTERN_MAX_DELAY_MINUTES} minutes)")
+    print(f"          Full sweep every {PATTERN_SWEEP_HOURS} hours")
     print("="*60)
     
-    # Schedule the job to run every 4 hours
-    schedule.every(4).hours.do(run_pattern_identification)
+    # Users with new readings are checked every minute; the full sweep is a safety net
+    schedule.every(1).minutes.do(run_dirty_pattern_identification)
+    schedule.every(PATTERN_SWEEP_HOURS).hours.do(run_pattern_identification)
     
     # Run immediately on startup
     print("\nRunning initial pattern identification...")
     run_pattern_identification()
     
-    print(f"\nScheduler is now running. Next run in 4 hours.")
+    print(f"\nScheduler is now running. Next full sweep in {PATTERN_SWEEP_HOURS} hours.")
     print("Press Ctrl+C to stop.\n")
     
     # Keep the scheduler running
@@ -0,0 +1,21 @@
+# conftest.py
+# -*- coding: utf-8 -*-
+"""pytest 公共配置: 把项目根目录加入导入路径, 提供临时数据库"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.data import build_database  # noqa: E402
+from database import close_all_pools  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """两个用户、各两天合成读数的临时数据库 (bench_00000, bench_00001)"""
+    path = str(tmp_path / 'cgm_test.db')
+    build_database(path, users=2, days=2, profiles=['default'], gap_probability=0, seed=7)
+    yield path
+    close_all_pools()
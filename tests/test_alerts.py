@@ -0,0 +1,53 @@
+# test_alerts.py
+# -*- coding: utf-8 -*-
+"""写入读数时的实时警报"""
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from database import CGMDatabase
+from database.cgm_database import timestamp_to_epoch
+
+
+def _alert_types(db, user_id):
+    rows = db.conn.execute(
+        "SELECT alert_type FROM alerts WHERE user_id = ? ORDER BY reading_epoch, alert_type", (user_id,)
+    )
+    return [row[0] for row in rows]
+
+
+def test_alert_raised_by_another_process_suppresses_duplicate(db_path):
+    start = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=30)
+    with CGMDatabase(db_path) as db:
+        for i, glucose in enumerate([120, 118, 117]):
+            db.add_cgm_reading('a', (start + timedelta(minutes=5 * i)).isoformat(), glucose)
+        assert _alert_types(db, 'a') == []
+
+        # 另一个进程写入了下一条读数并触发了紧急低血糖警报 (本进程未参与)
+        epoch = timestamp_to_epoch(start + timedelta(minutes=15))
+        other = sqlite3.connect(db_path)
+        with other:
+            other.execute(
+                "INSERT INTO cgm_readings (user_id, timestamp, timestamp_epoch, glucose_value) "
+                "VALUES ('a', datetime(?, 'unixepoch'), ?, 50)", (epoch, epoch)
+            )
+            other.execute(
+                "INSERT INTO alerts (user_id, alert_type, severity, reading_epoch, glucose_value, message, created_at) "
+                "VALUES ('a', 'urgent_low', 'high', ?, 50, 'Urgent low: 50 mg/dL', ?)", (epoch, int(time.time()))
+            )
+        other.close()
+
+        # 抑制窗口内的下一条紧急低血糖读数不重复报警
+        raised_before = len(_alert_types(db, 'a'))
+        db.add_cgm_reading('a', (start + timedelta(minutes=20)).isoformat(), 48)
+        assert 'urgent_low' not in _alert_types(db, 'a')[raised_before:]
+
+
+def test_late_reading_older_than_existing_does_not_alert(db_path):
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    with CGMDatabase(db_path) as db:
+        db.add_cgm_reading('b', (now - timedelta(minutes=5)).isoformat(), 110)
+        db.add_cgm_reading('b', (now - timedelta(minutes=10)).isoformat(), 45)
+        assert _alert_types(db, 'b') == []
+        db.add_cgm_reading('b', now.isoformat(), 45)
+        assert _alert_types(db, 'b') == ['urgent_low']
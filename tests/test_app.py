@@ -0,0 +1,92 @@
+# test_app.py
+# -*- coding: utf-8 -*-
+"""仪表板 API"""
+import contextlib
+import importlib
+import io
+import sqlite3
+import time
+
+import pytest
+
+
+@pytest.fixture
+def client(db_path, monkeypatch):
+    monkeypatch.setenv('CGM_DB_PATH', db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import dashboard.app as app_module
+        app_module = importlib.reload(app_module)
+    app_module.app.testing = True
+    return app_module.app.test_client()
+
+
+def test_daily_summary_rejects_malformed_date(client):
+    response = client.get('/api/daily_summary/bench_00000/not-a-date')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_cached_response_follows_versions_bumped_by_another_process(client, db_path):
+    first = client.get('/api/user/bench_00000')
+    assert first.status_code == 200
+
+    # 另一个进程更新用户并在同一事务内更新版本号 (本进程收不到变更事件)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE users SET name = 'Renamed Elsewhere' WHERE user_id = 'bench_00000'")
+        conn.execute(
+            "INSERT INTO user_data_versions (user_id, kind, version) VALUES ('bench_00000', 'user', 1) "
+            "ON CONFLICT (user_id, kind) DO UPDATE SET version = version + 1"
+        )
+    conn.close()
+
+    second = client.get('/api/user/bench_00000', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.get_json()['name'] == 'Renamed Elsewhere'
+    assert second.headers['ETag'] != first.headers['ETag']
+
+
+def test_dashboard_cache_follows_pattern_actions(client, db_path):
+    first = client.get('/api/dashboard/bench_00000?fields=actions')
+    assert first.status_code == 200
+
+    # Pattern-Action 映射是全局数据, 由触发器更新版本号
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO cgm_pattern_actions (pattern_name, action_title, priority) "
+            "VALUES ('Test Pattern', 'Test Action', 5)"
+        )
+    conn.close()
+
+    second = client.get('/api/dashboard/bench_00000?fields=actions',
+                        headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert second.get_data() != first.get_data()
+
+
+def test_dashboard_alerts_age_out_of_window(client, db_path):
+    now_epoch = int(time.time())
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO alerts (user_id, alert_type, severity, reading_epoch, glucose_value, message, created_at) "
+            "VALUES ('bench_00000', 'urgent_low', 'urgent', ?, 50, 'test', ?)",
+            (now_epoch - 3600 + 5, now_epoch)
+        )
+    conn.close()
+
+    first = client.get('/api/dashboard/bench_00000?fields=alerts&alert_hours=1')
+    assert len(first.get_json()['alerts']) == 1
+
+    # 警报移出滚动窗口 (没有任何写入, 版本号不变)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE alerts SET reading_epoch = reading_epoch - 60 WHERE user_id = 'bench_00000'")
+    conn.close()
+
+    second = client.get('/api/dashboard/bench_00000?fields=alerts&alert_hours=1',
+                        headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.get_json()['alerts'] == []
@@ -0,0 +1,29 @@
+# test_connection_pool.py
+# -*- coding: utf-8 -*-
+"""数据库连接池"""
+import sqlite3
+
+import pytest
+
+from database.connection_pool import ConnectionPool
+
+
+def test_failed_initialization_closes_connection_and_retries(tmp_path):
+    opened = []
+
+    def initializer(conn):
+        opened.append(conn)
+        if len(opened) == 1:
+            raise sqlite3.OperationalError('database is locked')
+
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, acquire_timeout=1, initializer=initializer)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.acquire()
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute('SELECT 1')
+
+    # 连接槽已归还, 下次获取重新初始化
+    conn = pool.acquire()
+    assert len(opened) == 2
+    pool.release(conn)
+    pool.close()
@@ -0,0 +1,80 @@
+# test_derived.py
+# -*- coding: utf-8 -*-
+"""事件表/前缀和索引对直接写入 SQL 的读数的补齐"""
+import sqlite3
+
+from database import CGMDatabase
+from database.episodes import extract_episodes
+from database.schema import ensure_schema
+
+
+def _insert_directly(db_path, user_id, epochs, glucose):
+    """模拟初始化脚本/旧代码: 绕过 CGMDatabase 直接插入读数"""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO cgm_readings (user_id, timestamp, timestamp_epoch, glucose_value) "
+            "VALUES (?, datetime(?, 'unixepoch'), ?, ?)",
+            [(user_id, epoch, epoch, glucose) for epoch in epochs]
+        )
+    conn.close()
+
+
+def _stored_episodes(db, user_id):
+    rows = db.conn.execute(
+        "SELECT episode_type, start_epoch, end_epoch, extreme_glucose, reading_count, glucose_sum "
+        "FROM glucose_episodes WHERE user_id = ? ORDER BY start_epoch",
+        (user_id,)
+    )
+    return [tuple(row) for row in rows]
+
+
+def _expected_episodes(db, user_id):
+    rows = db.conn.execute(
+        "SELECT timestamp_epoch, glucose_value FROM cgm_readings WHERE user_id = ? ORDER BY timestamp_epoch, id",
+        (user_id,)
+    )
+    return list(extract_episodes(tuple(row) for row in rows))
+
+
+def test_direct_backfill_is_caught_up_on_read(db_path):
+    with CGMDatabase(db_path) as db:
+        first = db.conn.execute(
+            "SELECT MIN(timestamp_epoch) FROM cgm_readings WHERE user_id = 'bench_00001'"
+        ).fetchone()[0]
+
+    # 早于已有读数的一段低血糖 (补传历史数据)
+    _insert_directly(db_path, 'bench_00001', [first - 3600 + 300 * i for i in range(6)], 50)
+
+    with CGMDatabase(db_path) as db:
+        episodes = db.get_glucose_episodes('bench_00001')
+        assert _stored_episodes(db, 'bench_00001') == _expected_episodes(db, 'bench_00001')
+        assert episodes[0]['episode_type'] == 'hypo' and episodes[0]['reading_count'] == 6
+
+        count, = db.conn.execute(
+            "SELECT reading_count FROM cgm_prefix_index WHERE user_id = 'bench_00001' "
+            "ORDER BY timestamp_epoch DESC, reading_id DESC LIMIT 1"
+        ).fetchone()
+        total, = db.conn.execute("SELECT COUNT(*) FROM cgm_readings WHERE user_id = 'bench_00001'").fetchone()
+        assert count == total
+        assert db.sync_derived_tables() == {}
+
+
+def test_write_through_database_catches_up_other_users(db_path):
+    with CGMDatabase(db_path) as db:
+        last = db.conn.execute("SELECT MAX(timestamp_epoch) FROM cgm_readings").fetchone()[0]
+    _insert_directly(db_path, 'bench_00001', [last + 300 * i for i in range(1, 4)], 45)
+
+    with CGMDatabase(db_path) as db:
+        db.add_cgm_reading('bench_00000', '2030-01-01T00:00:00', 120)
+        # 写入路径在同一事务内补齐了 bench_00001, 之后的读取无需再补
+        assert db.sync_derived_tables() == {}
+        assert _stored_episodes(db, 'bench_00001') == _expected_episodes(db, 'bench_00001')
+
+
+def test_ensure_schema_is_idempotent_and_leaves_no_transaction(db_path):
+    conn = sqlite3.connect(db_path)
+    ensure_schema(conn)
+    ensure_schema(conn)
+    assert not conn.in_transaction
+    conn.close()
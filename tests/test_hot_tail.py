@@ -0,0 +1,43 @@
+# test_hot_tail.py
+# -*- coding: utf-8 -*-
+"""最新读数热尾缓存与其他进程写入"""
+import sqlite3
+
+from database import CGMDatabase, get_hot_tail
+from database.versions import bump_data_versions
+
+
+def _write_elsewhere(db_path, statement, params=()):
+    """模拟其他进程: 独立连接直接写入并更新读数版本号"""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(statement, params)
+        bump_data_versions(conn, ['bench_00000'], 'readings')
+    conn.close()
+
+
+def test_ttl_expiry_reloads_when_other_process_overwrites_reading(db_path):
+    with CGMDatabase(db_path) as db:
+        latest = db.get_latest_reading('bench_00000')
+        get_hot_tail(db_path).ttl = 0
+
+        _write_elsewhere(db_path, 'UPDATE cgm_readings SET glucose_value = 399 WHERE id = ?', (latest['id'],))
+        assert db.get_latest_reading('bench_00000')['glucose_value'] == 399
+
+
+def test_ttl_expiry_reloads_when_other_process_backfills(db_path):
+    with CGMDatabase(db_path) as db:
+        recent = db.get_recent_readings('bench_00000', limit=3)
+        get_hot_tail(db_path).ttl = 0
+
+        # 补传一条早于缓存中最新读数的读数
+        epoch = recent[0]['timestamp_epoch'] - 1
+        _write_elsewhere(
+            db_path,
+            "INSERT INTO cgm_readings (user_id, timestamp, timestamp_epoch, glucose_value) "
+            "VALUES ('bench_00000', datetime(?, 'unixepoch'), ?, 55)",
+            (epoch, epoch)
+        )
+        refreshed = db.get_recent_readings('bench_00000', limit=3)
+    assert [r['glucose_value'] for r in refreshed][:2] == [recent[0]['glucose_value'], 55]
+
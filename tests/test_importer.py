@@ -0,0 +1,54 @@
+# test_importer.py
+# -*- coding: utf-8 -*-
+"""流式 JSON 数组解析"""
+import io
+import json
+
+import pytest
+
+from database.importer import iter_json_array
+
+
+RECORDS = [{'value': 100.5 + i, 'utc': f'2024-01-01T00:{i:02d}:00Z'} for i in range(20)]
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 7, 64, 4096])
+def test_elements_split_across_chunk_boundaries(read_size):
+    text = json.dumps(RECORDS, indent=1)
+    assert list(iter_json_array(io.StringIO(text), read_size=read_size)) == RECORDS
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 4096])
+def test_numbers_split_across_chunk_boundaries(read_size):
+    assert list(iter_json_array(io.StringIO('[12345, 6.789e2 ,-0.5]'), read_size=read_size)) == [12345, 678.9, -0.5]
+
+
+@pytest.mark.parametrize('text', ['[]', ' [ ] ', '[\n]'])
+def test_empty_array(text):
+    assert list(iter_json_array(io.StringIO(text), read_size=1)) == []
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 4096])
+@pytest.mark.parametrize('text', ['[1,]', '[1, ]', '[{"a": 1},\n]', '[,]', '[,1]', '[1,,2]', '[1 2]', '[1', '{"a": 1}'])
+def test_malformed_arrays_raise(text, read_size):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), read_size=read_size))
+
+
+class CountingReader(io.StringIO):
+    """记录 read 调用次数"""
+
+    reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+@pytest.mark.parametrize('prefix', ['[}', '[{"value": 1}{"value": 2}', '[{"value": 1} x', '[1 2', '[{"value": tru}'])
+def test_malformed_input_fails_without_reading_rest_of_file(prefix):
+    text = prefix + ',' + json.dumps(RECORDS * 1000)[1:]
+    fp = CountingReader(text)
+    with pytest.raises(ValueError):
+        list(iter_json_array(fp, read_size=4096))
+    assert fp.reads <= 2
@@ -0,0 +1,62 @@
+# test_ingest.py
+# -*- coding: utf-8 -*-
+"""批量写入 CGM 读数"""
+import sqlite3
+
+from database import CGMDatabase
+
+
+def test_batch_rejects_readings_for_other_users(db_path):
+    with CGMDatabase(db_path) as db:
+        result = db.add_cgm_readings_batch([
+            {'timestamp': '2030-01-01T00:00:00', 'glucose_value': 100},
+            {'timestamp': '2030-01-01T00:05:00', 'glucose_value': 101, 'user_id': 'bench_00000'},
+            {'timestamp': '2030-01-01T00:10:00', 'glucose_value': 102, 'user_id': 'bench_00001'},
+        ], user_id='bench_00000')
+        assert result['inserted'] == 2
+        assert result['rejected'] == 1
+        rows = db.conn.execute(
+            "SELECT user_id FROM cgm_readings WHERE timestamp >= '2030-01-01'"
+        ).fetchall()
+    assert [row[0] for row in rows] == ['bench_00000', 'bench_00000']
+
+
+def test_batch_without_user_id_requires_per_reading_user(db_path):
+    with CGMDatabase(db_path) as db:
+        result = db.add_cgm_readings_batch([
+            {'timestamp': '2030-01-01T00:00:00', 'glucose_value': 100, 'user_id': 'bench_00001'},
+            {'timestamp': '2030-01-01T00:05:00', 'glucose_value': 101},
+        ])
+    assert result['inserted'] == 1
+    assert result['rejected'] == 1
+
+
+def test_legacy_timestamp_variants_are_deduplicated(tmp_path):
+    # 旧版本结构: 读数时间按调用方传入的原始字符串保存, 只有普通索引
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE users (user_id TEXT PRIMARY KEY, name TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE cgm_readings (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+            "timestamp TEXT NOT NULL, glucose_value INTEGER NOT NULL, created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.execute("CREATE INDEX idx_user_timestamp ON cgm_readings(user_id, timestamp)")
+        conn.execute("INSERT INTO users VALUES ('legacy', 'Legacy')")
+        conn.executemany(
+            "INSERT INTO cgm_readings (user_id, timestamp, glucose_value) VALUES ('legacy', ?, ?)",
+            [('2025-10-24T10:00:00Z', 100), ('2025-10-24T10:00:00+00:00', 100), ('2025-10-24T10:05:00.000Z', 105)]
+        )
+    conn.close()
+
+    export = [
+        {'timestamp': '2025-10-24T10:00:00Z', 'glucose_value': 100},
+        {'timestamp': '2025-10-24T10:00:00+00:00', 'glucose_value': 100},
+        {'timestamp': '2025-10-24T10:05:00.000Z', 'glucose_value': 105},
+    ]
+    with CGMDatabase(path) as db:
+        assert db.conn.execute("SELECT COUNT(*) FROM cgm_readings").fetchone()[0] == 2
+        result = db.add_cgm_readings_batch(export, user_id='legacy')
+        assert result['inserted'] == 0
+        assert result['duplicates'] == 3
+        assert db.conn.execute("SELECT COUNT(*) FROM cgm_readings").fetchone()[0] == 2
@@ -0,0 +1,62 @@
+# test_patterns.py
+# -*- coding: utf-8 -*-
+"""Pattern episodes in user_patterns."""
+import contextlib
+import io
+import sqlite3
+from datetime import datetime, timedelta
+
+from database.schema import PATTERN_RECURRENCE_GAP_HOURS
+from pattern_identification import CGMPatternIdentifier
+
+
+def _counts(db_path, user_id):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT pattern_type, occurrence_count FROM user_patterns WHERE user_id = ? AND is_active = 1",
+        (user_id,)
+    ).fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def _run(identifier, user_id):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return identifier.run_pattern_identification_for_user(user_id)
+
+
+def test_rerunning_detection_on_unchanged_data_keeps_occurrence_count(db_path):
+    identifier = CGMPatternIdentifier(db_path)
+    assert _run(identifier, 'bench_00000')['patterns_detected'] > 0
+    first = _counts(db_path, 'bench_00000')
+    _run(identifier, 'bench_00000')
+    assert first and _counts(db_path, 'bench_00000') == first == {name: 1 for name in first}
+
+
+def test_detection_after_gap_counts_as_new_occurrence(db_path):
+    identifier = CGMPatternIdentifier(db_path)
+    patterns = identifier.identify_patterns('bench_00000')
+    identifier.save_patterns_to_db(patterns, user_id='bench_00000')
+
+    later = datetime.now() + timedelta(hours=PATTERN_RECURRENCE_GAP_HOURS + 1)
+    for pattern in patterns:
+        pattern['detected_at'] = later.isoformat()
+    identifier.save_patterns_to_db(patterns, user_id='bench_00000')
+    assert set(_counts(db_path, 'bench_00000').values()) == {2}
+
+
+def test_default_batch_and_incremental_detection_agree(db_path):
+    # Sensor dropouts: index-based and wall-clock windows differ across the gaps
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM cgm_readings WHERE user_id = 'bench_00000' AND id % 7 = 0")
+    conn.close()
+
+    batch = CGMPatternIdentifier(db_path)
+    incremental = CGMPatternIdentifier(db_path, incremental=True)
+    assert batch.engine == incremental.engine
+    with contextlib.redirect_stdout(io.StringIO()):
+        batch_types = {p['pattern_type'] for p in batch.identify_patterns('bench_00000')}
+        incremental_types = {p['pattern_type'] for p in incremental.identify_patterns('bench_00000')}
+        assert incremental.check_incremental_consistency('bench_00000')['consistent']
+    assert batch_types == incremental_types